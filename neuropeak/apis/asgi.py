@@ -0,0 +1,84 @@
+"""
+ASGI handler that runs sync code on a bounded set of threads.
+
+Django's ASGIHandler gives every request a thread-sensitive context of its
+own, so the first sync call a request makes (the request_started
+receivers, an ORM query, a DRF view) starts a thread, and a database
+connection, that lives until the request ends. A thousand concurrent
+chatbot requests then mean a thousand threads, although they all spend
+their time awaiting the inference worker.
+
+Here each request is handed one of SYNC_THREADS long-lived contexts
+instead; Django's own context nests inside it and does nothing, so a
+process never runs sync code on more than that many threads.
+
+The price is that requests sharing a context share its thread: a sync
+call waits for the one already running there, however long it takes,
+even while other threads are idle. Awaiting (the inference worker, a
+client reading a stream) holds no thread, so only slow sync sections
+block, and only their own context. A request therefore goes to a
+context whose thread has no sync work pending, and among those to the
+one with the fewest requests in flight. Requests stay on their context
+so that its thread, and its database connection, serve them throughout.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import django
+from asgiref.sync import SyncToAsync, ThreadSensitiveContext
+from django.conf import settings
+from django.core.handlers import asgi
+
+
+class _SlotExecutor(ThreadPoolExecutor):
+    """A context's single thread, counting the sync calls submitted to it and not yet finished."""
+
+    def __init__(self):
+        super().__init__(max_workers=1, thread_name_prefix='asgi-sync')
+        self.lock = threading.Lock()
+        self.pending = 0
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self.lock:
+            self.pending += 1
+        try:
+            future = super().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._finished(None)
+            raise
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future):
+        with self.lock:
+            self.pending -= 1
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    def __init__(self, sync_threads=32):
+        super().__init__()
+        self.contexts = [ThreadSensitiveContext() for _ in range(sync_threads)]
+        self.executors = [_SlotExecutor() for _ in range(sync_threads)]
+        # SyncToAsync runs a context's sync calls on the executor registered for it
+        for context, executor in zip(self.contexts, self.executors):
+            SyncToAsync.context_to_thread_executor[context] = executor
+        self.in_flight = [0] * sync_threads
+
+    def pick_slot(self):
+        return min(range(len(self.in_flight)), key=lambda slot: (self.executors[slot].pending, self.in_flight[slot]))
+
+    async def __call__(self, scope, receive, send):
+        # Only ever touched from the event loop's thread, so no lock
+        slot = self.pick_slot()
+        self.in_flight[slot] += 1
+        token = SyncToAsync.thread_sensitive_context.set(self.contexts[slot])
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            SyncToAsync.thread_sensitive_context.reset(token)
+            self.in_flight[slot] -= 1
+
+
+def get_asgi_application():
+    """django.core.asgi.get_asgi_application() with the bounded handler."""
+    django.setup(set_prefix=False)
+    return ASGIHandler(settings.ASGI_SYNC_THREADS)
@@ -0,0 +1,82 @@
+"""
+Plumbing for the async views served under ASGI (settings.ASYNC_VIEWS).
+
+DRF views are synchronous, so under ASGI every request to one holds a
+thread from the sync_to_async pool for its whole duration. The hot I/O
+bound endpoints are therefore also written as plain Django coroutine
+views; `async_api_view` gives them the API's JWT authentication, JSON
+parsing and error format, and hands the methods they do not implement to
+the DRF view they stand in for.
+"""
+import json
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException, MethodNotAllowed, NotAuthenticated, NotFound, ParseError
+from users.authentication import CachedJWTAuthentication
+from .renderers import FastJSONRenderer
+
+_authentication = CachedJWTAuthentication()
+
+
+def json_response(data, status=status.HTTP_200_OK, headers=None):
+    return HttpResponse(FastJSONRenderer().render(data), status=status, headers=headers,
+                        content_type='application/json')
+
+
+def error_response(exc):
+    """The response DRF's exception handler would give for an APIException."""
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    headers = {}
+    if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+        headers['WWW-Authenticate'] = _authentication.authenticate_header(None)
+    return json_response(data, status=exc.status_code, headers=headers)
+
+
+async def authenticate(request):
+    """The user a request's bearer token belongs to; raises NotAuthenticated without one."""
+    auth = await _authentication.aauthenticate(request)
+    if auth is None:
+        raise NotAuthenticated()
+    return auth[0]
+
+
+def json_body(request):
+    """The request body parsed as a JSON object; ParseError otherwise."""
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError as exc:
+        raise ParseError(f"JSON parse error - {exc}")
+    if not isinstance(data, dict):
+        raise ParseError("Expected a JSON object.")
+    return data
+
+
+def async_api_view(methods, fallback=None, authenticated=True):
+    """
+    Serve `methods` with the decorated coroutine, called with the
+    authenticated user as request.user (unless authenticated=False). Other
+    methods go to the synchronous `fallback` view in a thread, or get 405.
+    """
+    methods = {method.upper() for method in methods}
+
+    def decorator(handler):
+        @csrf_exempt
+        @wraps(handler)
+        async def view(request, *args, **kwargs):
+            if request.method not in methods:
+                if fallback is not None:
+                    return await sync_to_async(fallback)(request, *args, **kwargs)
+                return error_response(MethodNotAllowed(request.method))
+            try:
+                if authenticated:
+                    request.user = await authenticate(request)
+                return await handler(request, *args, **kwargs)
+            except Http404 as exc:
+                return error_response(NotFound(*exc.args))
+            except APIException as exc:
+                return error_response(exc)
+        return view
+    return decorator
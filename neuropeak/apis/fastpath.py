@@ -0,0 +1,109 @@
+"""
+Read-optimised list responses built from .values() rows.
+
+A RowPlan is compiled once per request from the view's (possibly
+sparse) serializer: each readable field becomes a values() path plus, when
+the database value is not already what DRF would emit, that field's own
+to_representation. Rows therefore keep the serializer's field contract
+without instantiating a model or a serializer per object. Serializers the
+plan cannot mirror (custom to_representation, method or nested fields)
+fall back to the regular DRF path.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import fields as drf_fields, relations, serializers
+from rest_framework.response import Response
+
+# Fields whose database value is already their JSON representation
+PASSTHROUGH = (
+    drf_fields.CharField,
+    drf_fields.IntegerField,
+    drf_fields.FloatField,
+    drf_fields.BooleanField,
+    drf_fields.ChoiceField,
+    relations.PrimaryKeyRelatedField,
+)
+
+
+class RowPlan:
+    def __init__(self, columns, pk_name):
+        self.columns = columns  # [(output name, values() path, converter or None)]
+        self.paths = [path for _, path, _ in columns]
+        self.pk_name = pk_name
+
+    def values(self, queryset, extra=()):
+        """The queryset as dicts carrying the plan's paths plus `extra` (e.g. ordering) columns."""
+        paths = list(dict.fromkeys([*self.paths, *extra]))
+        return queryset.values(*paths)
+
+    def render(self, rows):
+        columns = self.columns
+        return [
+            {
+                name: (convert(row[path]) if convert is not None and row[path] is not None else row[path])
+                for name, path, convert in columns
+            }
+            for row in rows
+        ]
+
+    def serialize(self, queryset):
+        return self.render(self.values(queryset))
+
+
+def compile_row_plan(serializer):
+    """Return a RowPlan mirroring `serializer`, or None if it cannot be expressed as values()."""
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    if not isinstance(serializer, serializers.ModelSerializer):
+        return None
+    if type(serializer).to_representation is not serializers.ModelSerializer.to_representation:
+        return None
+
+    model = serializer.Meta.model
+    columns = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, (serializers.BaseSerializer, relations.ManyRelatedField, drf_fields.SerializerMethodField)):
+            return None
+        if isinstance(field, relations.RelatedField) and not isinstance(field, relations.PrimaryKeyRelatedField):
+            return None
+        if field.source == '*' or not _is_column(model, field.source_attrs):
+            return None
+        converter = None if isinstance(field, PASSTHROUGH) else field.to_representation
+        columns.append((name, '__'.join(field.source_attrs), converter))
+    return RowPlan(columns, model._meta.pk.name)
+
+
+def _is_column(model, attrs):
+    for i, attr in enumerate(attrs):
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return False
+        if not field.concrete or field.many_to_many:
+            return False
+        if i < len(attrs) - 1:
+            if not field.is_relation:
+                return False
+            model = field.related_model
+    return True
+
+
+class FastListMixin:
+    """Serve `list` from a RowPlan whenever the view's serializer allows it."""
+
+    def list(self, request, *args, **kwargs):
+        plan = compile_row_plan(self.get_serializer())
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = getattr(self, 'ordering', None) or getattr(self.pagination_class, 'ordering', None) or ()
+        orderings = (ordering,) if isinstance(ordering, str) else ordering
+        rows = plan.values(queryset, extra=[plan.pk_name, *(name.lstrip('-') for name in orderings)])
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(plan.render(page))
+        return Response(plan.render(rows))
+
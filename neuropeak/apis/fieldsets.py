@@ -0,0 +1,64 @@
+from rest_framework import permissions, serializers
+
+
+class SparseFieldsetMixin:
+    """
+    Lets GET requests choose their fields with `?fields=id,title`.
+
+    Unrequested fields are dropped from the serializer and, when every
+    requested field maps onto a model column, from the SELECT as well.
+    Unknown names are rejected with a 400.
+    """
+    fields_param = 'fields'
+
+    def requested_fields(self):
+        if self.request is None or self.request.method not in permissions.SAFE_METHODS:
+            return None
+        raw = self.request.query_params.get(self.fields_param)
+        if not raw:
+            return None
+        return [name.strip() for name in raw.split(',') if name.strip()]
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fields = self.requested_fields()
+        if fields:
+            target = getattr(serializer, 'child', serializer)
+            unknown = sorted(set(fields) - set(target.fields))
+            if unknown:
+                raise serializers.ValidationError({self.fields_param: f"Unknown fields: {', '.join(unknown)}."})
+            for name in list(target.fields):
+                if name not in fields:
+                    target.fields.pop(name)
+        return serializer
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields = self.requested_fields()
+        if not fields:
+            return queryset
+        columns = self._columns(queryset, fields)
+        return queryset.only(*columns) if columns else queryset
+
+    def _columns(self, queryset, fields):
+        """Model paths behind the requested fields, or None if any of them is computed."""
+        model = queryset.model
+        declared = self.get_serializer_class()(context=self.get_serializer_context()).fields
+        concrete = {field.name for field in model._meta.concrete_fields}
+        related = queryset.query.select_related if isinstance(queryset.query.select_related, dict) else {}
+
+        columns = {model._meta.pk.name}
+        ordering = getattr(self, 'ordering', None) or getattr(self.pagination_class, 'ordering', None)
+        if ordering:
+            orderings = (ordering,) if isinstance(ordering, str) else ordering
+            columns.update(name.lstrip('-') for name in orderings)
+        for name in fields:
+            field = declared.get(name)
+            source = getattr(field, 'source', None)
+            if not source or source == '*':
+                return None
+            path = source.split('.')
+            if path[0] not in concrete or (len(path) > 1 and path[0] not in related):
+                return None
+            columns.add('__'.join(path))
+        return columns
@@ -0,0 +1,90 @@
+"""
+The stock middleware, with hooks that run on the event loop under ASGI.
+
+Django calls a MiddlewareMixin hook from an async request through
+sync_to_async, and the first such call gives the request a thread of its
+own until the response is sent. With the stock middleware every ASGI
+request therefore holds a thread, however long it waits for the inference
+worker, and a thousand slow chatbot requests mean a thousand threads.
+
+None of these hooks does I/O unless the request used the session or the
+messages framework, so here they run directly on the event loop and only
+fall back to a thread when one of them might reach the database. Under
+WSGI the classes behave exactly like the ones they extend.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import middleware as auth
+from django.contrib.messages import middleware as messages
+from django.contrib.sessions import middleware as sessions
+from django.middleware import clickjacking, common, csrf, security
+
+
+class EventLoopMiddlewareMixin:
+    def request_needs_thread(self, request):
+        return False
+
+    def response_needs_thread(self, request, response):
+        return False
+
+    async def _run(self, needs_thread, hook, *args):
+        if needs_thread:
+            return await sync_to_async(hook, thread_sensitive=True)(*args)
+        return hook(*args)
+
+    async def __acall__(self, request):
+        response = None
+        if hasattr(self, 'process_request'):
+            response = await self._run(self.request_needs_thread(request), self.process_request, request)
+        response = response or await self.get_response(request)
+        if hasattr(self, 'process_response'):
+            response = await self._run(
+                self.response_needs_thread(request, response), self.process_response, request, response
+            )
+        return response
+
+
+class SecurityMiddleware(EventLoopMiddlewareMixin, security.SecurityMiddleware):
+    pass
+
+
+class SessionMiddleware(EventLoopMiddlewareMixin, sessions.SessionMiddleware):
+    def response_needs_thread(self, request, response):
+        # An untouched session is neither loaded nor saved
+        session = request.session
+        return session.accessed or session.modified
+
+
+class CommonMiddleware(EventLoopMiddlewareMixin, common.CommonMiddleware):
+    pass
+
+
+class CsrfViewMiddleware(EventLoopMiddlewareMixin, csrf.CsrfViewMiddleware):
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if self.async_mode:
+            # The handler awaits process_view as it finds it on the instance
+            self.process_view = self._aprocess_view
+
+    def request_needs_thread(self, request):
+        return settings.CSRF_USE_SESSIONS
+
+    async def _aprocess_view(self, request, callback, callback_args, callback_kwargs):
+        return await self._run(
+            settings.CSRF_USE_SESSIONS, super().process_view, request, callback, callback_args, callback_kwargs
+        )
+
+
+class AuthenticationMiddleware(EventLoopMiddlewareMixin, auth.AuthenticationMiddleware):
+    pass
+
+
+class MessageMiddleware(EventLoopMiddlewareMixin, messages.MessageMiddleware):
+    def response_needs_thread(self, request, response):
+        # Only messages that were read or added are stored, possibly in the session
+        storage = getattr(request, '_messages', None)
+        return storage is not None and (storage.used or storage.added_new)
+
+
+class XFrameOptionsMiddleware(EventLoopMiddlewareMixin, clickjacking.XFrameOptionsMiddleware):
+    pass
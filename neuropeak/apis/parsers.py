@@ -0,0 +1,34 @@
+import codecs
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.settings import api_settings
+from rest_framework.utils import json
+
+
+class JSONLinesParser(BaseParser):
+    """
+    JSON Lines (NDJSON): one JSON value per line, parsed into a list.
+    Blank lines are skipped, and errors name the offending line.
+    """
+    media_type = 'application/x-ndjson'
+    strict = api_settings.STRICT_JSON
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        parse_constant = json.strict_constant if self.strict else None
+
+        items = []
+        for number, line in enumerate(codecs.getreader(encoding)(stream), start=1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line, parse_constant=parse_constant))
+            except ValueError as exc:
+                raise ParseError(f"JSON parse error on line {number} - {exc}")
+        return items
+
+
+class JSONLParser(JSONLinesParser):
+    media_type = 'application/jsonl'
@@ -0,0 +1,330 @@
+"""
+Per-endpoint request profiling.
+
+ProfilingMiddleware records, for every request, its wall time, the number
+and duration of its database queries, the time spent in DRF serializers
+and the size of its response, aggregated by DRF view and action. A sample
+of requests runs under cProfile, and those slower than SLOW_REQUEST_MS
+keep their trace. apis.views serves the aggregates as JSON and in the
+Prometheus text format.
+
+Queries are counted by a wrapper installed on every database connection,
+and serializer time by wrapping BaseSerializer.is_valid and .data; both
+report to the request in the current context, so queries an async view
+runs through sync_to_async are counted too. Serializer time includes the
+queries a serializer triggers. Metrics are kept per process.
+
+Off by default: REQUEST_PROFILING['ENABLED'], set through the
+NEUROPEAK_REQUEST_PROFILING environment variable, turns it on. While it is
+off the middleware removes itself from the stack and nothing is
+instrumented.
+"""
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+from core.utils import percentile
+
+_current = ContextVar('request_profile', default=None)
+_instrument_lock = threading.Lock()
+_instrumented = False
+
+
+class RequestProfile:
+    """What one request spent, filled in by the instrumentation while it runs."""
+
+    __slots__ = ('db_queries', 'db_seconds', 'serializer_seconds', 'in_serializer')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.in_serializer = False
+
+
+def _record_query(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.db_queries += 1
+        profile.db_seconds += time.perf_counter() - started
+
+
+def _wrap_connection(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _timed(method):
+    @wraps(method)
+    def timed(*args, **kwargs):
+        profile = _current.get()
+        # Nested serializers are part of the outermost one's time
+        if profile is None or profile.in_serializer:
+            return method(*args, **kwargs)
+        profile.in_serializer = True
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            profile.serializer_seconds += time.perf_counter() - started
+            profile.in_serializer = False
+    return timed
+
+
+def instrument():
+    """Install the query and serializer hooks, once per process."""
+    global _instrumented
+    with _instrument_lock:
+        if _instrumented:
+            return
+        from rest_framework.serializers import BaseSerializer
+
+        connection_created.connect(_wrap_connection)
+        for connection in connections.all(initialized_only=True):
+            _wrap_connection(None, connection)
+        BaseSerializer.is_valid = _timed(BaseSerializer.is_valid)
+        BaseSerializer.data = property(_timed(BaseSerializer.data.fget))
+        _instrumented = True
+
+
+class EndpointMetrics:
+    def __init__(self, window):
+        self.requests = 0
+        self.statuses = Counter()
+        self.seconds = 0.0
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.response_bytes = 0
+        self.latencies_ms = deque(maxlen=window)
+
+    def snapshot(self):
+        latencies = list(self.latencies_ms)
+        requests = self.requests or 1
+        return {
+            'requests': self.requests,
+            'statuses': dict(self.statuses),
+            'seconds': self.seconds,
+            'db_queries': self.db_queries,
+            'db_seconds': self.db_seconds,
+            'serializer_seconds': self.serializer_seconds,
+            'response_bytes': self.response_bytes,
+            'mean_db_queries': self.db_queries / requests,
+            'mean_response_bytes': self.response_bytes / requests,
+            'latency_ms': {
+                'p50': percentile(latencies, 0.50),
+                'p95': percentile(latencies, 0.95),
+                'p99': percentile(latencies, 0.99),
+                'max': max(latencies, default=None),
+            },
+        }
+
+
+class RequestMetrics:
+    """
+    Cumulative counters per (view, action), latency quantiles over each
+    endpoint's last `window` requests, and the latest slow-request traces.
+    """
+
+    def __init__(self, window=1024, max_profiles=20):
+        self.lock = threading.Lock()
+        self.window = window
+        self.endpoints = {}
+        self.profiles = deque(maxlen=max_profiles)
+
+    def record(self, view, action, status, seconds, profile, response_bytes):
+        with self.lock:
+            endpoint = self.endpoints.get((view, action))
+            if endpoint is None:
+                endpoint = self.endpoints[(view, action)] = EndpointMetrics(self.window)
+            endpoint.requests += 1
+            endpoint.statuses[f'{status // 100}xx'] += 1
+            endpoint.seconds += seconds
+            endpoint.db_queries += profile.db_queries
+            endpoint.db_seconds += profile.db_seconds
+            endpoint.serializer_seconds += profile.serializer_seconds
+            endpoint.response_bytes += response_bytes
+            endpoint.latencies_ms.append(seconds * 1000)
+
+    def add_profile(self, trace):
+        with self.lock:
+            self.profiles.append(trace)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'endpoints': [
+                    {'view': view, 'action': action, **endpoint.snapshot()}
+                    for (view, action), endpoint in sorted(self.endpoints.items())
+                ],
+                'slow_profiles': list(self.profiles),
+            }
+
+
+def _label(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def prometheus_exposition(snapshot):
+    """Render a RequestMetrics snapshot in the Prometheus text exposition format."""
+    counters = (
+        ('neuropeak_http_request_seconds_total', 'seconds', "Wall time spent serving requests."),
+        ('neuropeak_db_queries_total', 'db_queries', "Database queries run by requests."),
+        ('neuropeak_db_query_seconds_total', 'db_seconds', "Time requests spent in database queries."),
+        ('neuropeak_serializer_seconds_total', 'serializer_seconds', "Time requests spent in DRF serializers."),
+        ('neuropeak_http_response_bytes_total', 'response_bytes', "Response body bytes, streamed bodies excluded."),
+    )
+    lines = [
+        "# HELP neuropeak_http_requests_total Requests served, by view, action and status class.",
+        "# TYPE neuropeak_http_requests_total counter",
+    ]
+    for endpoint in snapshot['endpoints']:
+        labels = f'view="{_label(endpoint["view"])}",action="{_label(endpoint["action"])}"'
+        for status, count in sorted(endpoint['statuses'].items()):
+            lines.append(f'neuropeak_http_requests_total{{{labels},status="{status}"}} {count}')
+    for name, field, help_text in counters:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for endpoint in snapshot['endpoints']:
+            labels = f'view="{_label(endpoint["view"])}",action="{_label(endpoint["action"])}"'
+            lines.append(f'{name}{{{labels}}} {endpoint[field]}')
+    lines += [
+        "# HELP neuropeak_http_request_duration_seconds Request wall time; quantiles over recent requests.",
+        "# TYPE neuropeak_http_request_duration_seconds summary",
+    ]
+    for endpoint in snapshot['endpoints']:
+        labels = f'view="{_label(endpoint["view"])}",action="{_label(endpoint["action"])}"'
+        for quantile, key in (('0.5', 'p50'), ('0.95', 'p95'), ('0.99', 'p99')):
+            value = endpoint['latency_ms'][key]
+            seconds = 'NaN' if value is None else value / 1000
+            lines.append(f'neuropeak_http_request_duration_seconds{{{labels},quantile="{quantile}"}} {seconds}')
+        lines.append(f'neuropeak_http_request_duration_seconds_sum{{{labels}}} {endpoint["seconds"]}')
+        lines.append(f'neuropeak_http_request_duration_seconds_count{{{labels}}} {endpoint["requests"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def _endpoint(request):
+    """(view, action) a request was routed to: the DRF view class and action, or the view function."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved', request.method.lower()
+    func = match.func
+    method = request.method.lower()
+    view_class = getattr(func, 'cls', None)
+    if view_class is None:
+        return func.__name__, method
+    actions = getattr(func, 'actions', None) or {}
+    return view_class.__name__, actions.get(method, method)
+
+
+class ProfilingMiddleware:
+    """
+    Outermost middleware, so its wall time covers the rest of the stack.
+    cProfile traces only cover one thread, so they are only sampled when
+    the stack runs synchronously (WSGI); under ASGI a request's work is
+    spread over the event loop and the sync threads.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if request_metrics is None:
+            raise MiddlewareNotUsed
+        config = settings.REQUEST_PROFILING
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.sample_rate = config.get('PROFILE_SAMPLE_RATE', 0.01)
+        self.slow = config.get('SLOW_REQUEST_MS', 500) / 1000
+        self.profile_lines = config.get('PROFILE_LINES', 40)
+        instrument()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = _current.set(profile)
+        profiler = self._profiler()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            seconds = time.perf_counter() - started
+            if profiler is not None:
+                profiler.disable()
+            _current.reset(token)
+        self._record(request, response, seconds, profile)
+        if profiler is not None and seconds >= self.slow:
+            self._keep_trace(request, response, seconds, profile, profiler)
+        return response
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            seconds = time.perf_counter() - started
+            _current.reset(token)
+        self._record(request, response, seconds, profile)
+        return response
+
+    def _profiler(self):
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return None  # Another profiler is active
+        return profiler
+
+    def _record(self, request, response, seconds, profile):
+        view, action = _endpoint(request)
+        size = 0 if response.streaming else len(response.content)
+        request_metrics.record(view, action, response.status_code, seconds, profile, size)
+
+    def _keep_trace(self, request, response, seconds, profile, profiler):
+        view, action = _endpoint(request)
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(self.profile_lines)
+        request_metrics.add_profile({
+            'view': view,
+            'action': action,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'at': timezone.now().isoformat(),
+            'wall_ms': seconds * 1000,
+            'db_queries': profile.db_queries,
+            'db_ms': profile.db_seconds * 1000,
+            'serializer_ms': profile.serializer_seconds * 1000,
+            'stats': stream.getvalue(),
+        })
+
+
+def _build_metrics():
+    config = getattr(settings, 'REQUEST_PROFILING', {})
+    if not config.get('ENABLED', False):
+        return None
+    return RequestMetrics(window=config.get('WINDOW', 1024), max_profiles=config.get('MAX_PROFILES', 20))
+
+
+request_metrics = _build_metrics()
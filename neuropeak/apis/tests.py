@@ -1,3 +1,237 @@
-from django.test import TestCase
+import asyncio
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers import asgi
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+from core.models import Course, Quiz
+from core.serializers import QuizSerializer
+from users.models import User
+from . import profiling
+from .asgi import ASGIHandler
+from .fastpath import compile_row_plan
+from .profiling import ProfilingMiddleware, RequestMetrics, RequestProfile, prometheus_exposition
+from .renderers import FastJSONRenderer
 
-# Create your tests here.
+
+def list_users(request):
+    return HttpResponse(str(User.objects.count()))
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.metrics = RequestMetrics()
+        patcher = mock.patch.object(profiling, 'request_metrics', self.metrics)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, middleware):
+        request = RequestFactory().get('/users/')
+        request.resolver_match = SimpleNamespace(func=list_users)
+        return middleware(request)
+
+    def test_records_queries_and_response_size(self):
+        middleware = ProfilingMiddleware(lambda request: list_users(request))
+        self.request(middleware)
+        self.request(middleware)
+        [endpoint] = self.metrics.snapshot()['endpoints']
+        self.assertEqual((endpoint['view'], endpoint['action']), ('list_users', 'get'))
+        self.assertEqual(endpoint['requests'], 2)
+        self.assertEqual(endpoint['statuses'], {'2xx': 2})
+        self.assertEqual(endpoint['db_queries'], 2)
+        self.assertEqual(endpoint['response_bytes'], 2)
+
+    def test_removed_from_the_stack_when_disabled(self):
+        with mock.patch.object(profiling, 'request_metrics', None):
+            with self.assertRaises(MiddlewareNotUsed):
+                ProfilingMiddleware(list_users)
+
+
+class PrometheusExpositionTests(SimpleTestCase):
+    def test_exposition(self):
+        metrics = RequestMetrics()
+        profile = RequestProfile()
+        profile.db_queries = 3
+        metrics.record('Quiz"ViewSet', 'list', 200, 0.25, profile, 100)
+        metrics.record('Quiz"ViewSet', 'list', 404, 0.75, RequestProfile(), 10)
+        lines = prometheus_exposition(metrics.snapshot()).splitlines()
+
+        labels = 'view="Quiz\\"ViewSet",action="list"'
+        self.assertIn('# TYPE neuropeak_http_requests_total counter', lines)
+        self.assertIn(f'neuropeak_http_requests_total{{{labels},status="2xx"}} 1', lines)
+        self.assertIn(f'neuropeak_http_requests_total{{{labels},status="4xx"}} 1', lines)
+        self.assertIn(f'neuropeak_db_queries_total{{{labels}}} 3', lines)
+        self.assertIn(f'neuropeak_http_response_bytes_total{{{labels}}} 110', lines)
+        self.assertIn('# TYPE neuropeak_http_request_duration_seconds summary', lines)
+        self.assertIn(f'neuropeak_http_request_duration_seconds{{{labels},quantile="0.5"}} 0.75', lines)
+        self.assertIn(f'neuropeak_http_request_duration_seconds_sum{{{labels}}} 1.0', lines)
+        self.assertIn(f'neuropeak_http_request_duration_seconds_count{{{labels}}} 2', lines)
+
+    def test_no_endpoints(self):
+        self.assertNotIn('{', prometheus_exposition({'endpoints': [], 'slow_profiles': []}))
+
+
+class FastListTests(TestCase):
+    """values() rows must render to the same bytes as the serializer they mirror."""
+
+    @classmethod
+    def setUpTestData(cls):
+        lecturer = User.objects.create_user('lecturer@example.com', 'pw', user_type=User.UserType.LECTURER)
+        cls.lecturer = lecturer
+        course = Course.objects.create(course_code='CS101', name='Intro', lecturer=lecturer)
+        Quiz.objects.create(course=course, title='Plain', marking_key={'1': 'a'})
+        Quiz.objects.create(
+            course=course, title='Caf\u00e9 \u2028 quiz', description='line\nbreak',
+            marking_key={'1': ['a', 'b'], '2': {'points': 0.5, 'text': '\u00fcber'}, '3': None},
+        )
+
+    def render(self, data):
+        return FastJSONRenderer().render(data)
+
+    def test_rows_match_the_serializer(self):
+        queryset = Quiz.objects.order_by('pk')
+        plan = compile_row_plan(QuizSerializer())
+        self.assertIsNotNone(plan)
+        self.assertEqual(self.render(plan.serialize(queryset)), self.render(QuizSerializer(queryset, many=True).data))
+
+    def test_list_matches_the_serializer(self):
+        client = APIClient()
+        client.force_authenticate(self.lecturer)
+        for query, fields in (('', None), ('?fields=title,updated_at,marking_key', ['title', 'updated_at', 'marking_key'])):
+            response = client.get('/api/v1/test/quizzes/' + query)
+            expected = QuizSerializer(Quiz.objects.order_by('-id'), many=True).data
+            if fields:
+                expected = [{name: value for name, value in row.items() if name in fields} for row in expected]
+            page = OrderedDict([('next', None), ('previous', None), ('results', expected)])
+            self.assertEqual(response.content, self.render(page))
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.lecturer = User.objects.create_user('lecturer@example.com', 'pw', user_type=User.UserType.LECTURER)
+        cls.course = Course.objects.create(course_code='CS101', name='Intro', lecturer=cls.lecturer)
+        Quiz.objects.bulk_create([
+            Quiz(course=cls.course, title=f'Quiz {i}', marking_key={'1': 'a'}) for i in range(5)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.lecturer)
+
+    def titles(self, response):
+        return [quiz['title'] for quiz in response.json()['results']]
+
+    def test_cursor_is_stable_across_inserts(self):
+        first = self.client.get('/api/v1/test/quizzes/?page_size=2')
+        self.assertEqual(self.titles(first), ['Quiz 4', 'Quiz 3'])
+        # Newer rows sort ahead of the cursor and must not shift the next page
+        Quiz.objects.create(course=self.course, title='Quiz 5', marking_key={'1': 'a'})
+        second = self.client.get(first.json()['next'])
+        self.assertEqual(self.titles(second), ['Quiz 2', 'Quiz 1'])
+        self.assertEqual(self.titles(self.client.get(second.json()['next'])), ['Quiz 0'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/v1/test/quizzes/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_size_is_capped(self):
+        Quiz.objects.bulk_create([
+            Quiz(course=self.course, title=f'More {i}', marking_key={'1': 'a'}) for i in range(200)
+        ])
+        response = self.client.get('/api/v1/test/quizzes/?page_size=1000')
+        self.assertEqual(len(response.json()['results']), 200)
+
+
+class SparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.lecturer = User.objects.create_user('lecturer@example.com', 'pw', user_type=User.UserType.LECTURER)
+        course = Course.objects.create(course_code='CS101', name='Intro', lecturer=cls.lecturer)
+        cls.quiz = Quiz.objects.create(course=course, title='Quiz', marking_key={'1': 'a'})
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.lecturer)
+
+    def test_requested_fields_only(self):
+        response = self.client.get('/api/v1/test/quizzes/?fields=title, id')
+        self.assertEqual(response.json()['results'], [{'id': self.quiz.pk, 'title': 'Quiz'}])
+        response = self.client.get(f'/api/v1/test/quizzes/{self.quiz.pk}/?fields=title')
+        self.assertEqual(response.json(), {'title': 'Quiz'})
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get('/api/v1/test/quizzes/?fields=title,secret,answers')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'fields': 'Unknown fields: answers, secret.'})
+
+    def test_writes_ignore_the_parameter(self):
+        response = self.client.patch(
+            f'/api/v1/test/quizzes/{self.quiz.pk}/?fields=unknown', {'title': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('marking_key', response.json())
+
+
+class ASGIHandlerTests(SimpleTestCase):
+    """Requests share a bounded set of sync threads, but not one that is busy while another is idle."""
+
+    def setUp(self):
+        self.handler = ASGIHandler(sync_threads=2)
+        for executor in self.handler.executors:
+            self.addCleanup(executor.shutdown)
+
+        async def serve(handler, scope, receive, send):
+            await scope['work']()
+        patcher = mock.patch.object(asgi.ASGIHandler, '__call__', serve)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, work):
+        return asyncio.ensure_future(self.handler({'type': 'http', 'work': work}, None, None))
+
+    def test_requests_avoid_a_busy_thread(self):
+        started, release = threading.Event(), threading.Event()
+        slow_thread, quick_thread = [], []
+
+        def slow():
+            slow_thread.append(threading.current_thread())
+            started.set()
+            release.wait(5)
+
+        def quick():
+            quick_thread.append(threading.current_thread())
+
+        async def run():
+            waiting = asyncio.Event()
+            slow_request = self.request(sync_to_async(slow))
+            await asyncio.to_thread(started.wait, 5)
+            # In flight on the other thread, but awaiting rather than running sync code
+            idle_request = self.request(waiting.wait)
+            await asyncio.sleep(0)
+            try:
+                await asyncio.wait_for(self.request(sync_to_async(quick)), timeout=2)
+            finally:
+                release.set()
+                waiting.set()
+                await asyncio.gather(slow_request, idle_request)
+
+        asyncio.run(run())
+        self.assertNotEqual(quick_thread, slow_thread)
+        self.assertEqual(self.handler.in_flight, [0, 0])
+        self.assertEqual([executor.pending for executor in self.handler.executors], [0, 0])
+
+    def test_requests_on_a_thread_share_it(self):
+        threads = []
+
+        async def run():
+            await asyncio.gather(*(
+                self.request(sync_to_async(lambda: threads.append(threading.current_thread()))) for _ in range(4)
+            ))
+
+        asyncio.run(run())
+        self.assertEqual(len(set(threads)), 2)
@@ -1,12 +1,21 @@
 # urls.py
+from django.conf import settings
 from django.urls import path
 from users.views import (UserViewSet,LecturerProfileViewSet,StudentProfileViewSet,CustomTokenObtainPairView,CustomTokenRefreshView)
-from core.views import ChatBotViewSet, CourseViewSet, AssignmentViewSet, QuizQuestionViewSet, QuizViewSet
+from users.async_views import token_obtain, token_refresh
+from core import async_views
+from apis.views import prometheus_metrics_view, request_metrics_view
+from core.views import chatbot_stream, ChatBotViewSet, CourseViewSet, AssignmentViewSet, AssignmentSubmissionViewSet, QuizQuestionViewSet, QuizViewSet, QuizAttemptViewSet
+
+
+def hot(sync_view, async_view):
+    """Under ASGI (settings.ASYNC_VIEWS) the hot I/O-bound endpoints are served by async views."""
+    return async_view if settings.ASYNC_VIEWS else sync_view
 
 urlpatterns = [
     # Token endpoints
-    path('token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('token/refresh/', CustomTokenRefreshView.as_view(), name='token_refresh'),
+    path('token/', hot(CustomTokenObtainPairView.as_view(), token_obtain), name='token_obtain_pair'),
+    path('token/refresh/', hot(CustomTokenRefreshView.as_view(), token_refresh), name='token_refresh'),
     
     # User CRUD
     path('users/', UserViewSet.as_view({
@@ -20,6 +29,7 @@ urlpatterns = [
         'delete': 'destroy'
     }), name='user-detail'),
     path('register/', UserViewSet.as_view({'post': 'register'}), name='register'),
+    path('users/import/', UserViewSet.as_view({'post': 'import_roster'}), name='user-import'),
     
     # Lecturer Profile CRUD
     path('lecturers/', LecturerProfileViewSet.as_view({
@@ -49,19 +59,38 @@ urlpatterns = [
     # Course CRUD
     path('courses/', CourseViewSet.as_view({'get': 'list', 'post': 'create'}), name='course-list'),
     path('courses/<int:pk>/', CourseViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}), name='course-detail'),
+    path('courses/<int:pk>/student-performance/', CourseViewSet.as_view({'get': 'student_performance'}), name='course-student-performance'),
 
     # Assignment CRUD
     path('assignments/', AssignmentViewSet.as_view({'get': 'list', 'post': 'create'}), name='assignment-list'),
     path('assignments/<int:pk>/', AssignmentViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}), name='assignment-detail'),
 
+    # Assignment Submissions
+    path('submissions/', AssignmentSubmissionViewSet.as_view({'get': 'list', 'post': 'create'}), name='assignment-submission-list'),
+    path('submissions/<int:pk>/', AssignmentSubmissionViewSet.as_view({'get': 'retrieve'}), name='assignment-submission-detail'),
+
     # Quiz CRUD
     path('quizzes/', QuizViewSet.as_view({'get': 'list', 'post': 'create'}), name='quiz-list'),
     path('quizzes/<int:pk>/', QuizViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}), name='quiz-detail'),
+    path('quizzes/<int:pk>/bundle/', hot(QuizViewSet.as_view({'get': 'bundle'}), async_views.quiz_bundle), name='quiz-bundle'),
     path('quizzes/<int:pk>/marking-key/', QuizViewSet.as_view({'get': 'marking_key'}), name='quiz-marking-key'),
 
     # Quiz Questions CRUD
     path('quizzes/<int:quiz_id>/questions/', QuizQuestionViewSet.as_view({'get': 'list', 'post': 'create'}), name='quiz-question-list'),
+    path('quizzes/<int:quiz_id>/questions/bulk/', QuizQuestionViewSet.as_view({'post': 'bulk_upsert', 'delete': 'bulk_delete'}), name='quiz-question-bulk'),
+    path('quizzes/<int:quiz_id>/questions/reorder/', QuizQuestionViewSet.as_view({'post': 'reorder'}), name='quiz-question-reorder'),
     path('quizzes/<int:quiz_id>/questions/<int:pk>/', QuizQuestionViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}), name='quiz-question-detail'),
+
+    # Quiz Attempts
+    path('attempts/', hot(QuizAttemptViewSet.as_view({'get': 'list', 'post': 'create'}), async_views.quiz_attempts), name='quiz-attempt-list'),
+    path('attempts/<int:pk>/', QuizAttemptViewSet.as_view({'get': 'retrieve'}), name='quiz-attempt-detail'),
+
     # Chatbot
-    path('chatbot/', ChatBotViewSet.as_view({'post': 'create'}), name='chatbot'),
-]
\ No newline at end of file
+    path('chatbot/', hot(ChatBotViewSet.as_view({'post': 'create'}), async_views.chatbot), name='chatbot'),
+    path('chatbot/stream/', chatbot_stream, name='chatbot-stream'),
+    path('chatbot/cache-stats/', ChatBotViewSet.as_view({'get': 'cache_stats'}), name='chatbot-cache-stats'),
+
+    # Request metrics (apis.profiling)
+    path('metrics/', request_metrics_view, name='request-metrics'),
+    path('metrics/prometheus/', prometheus_metrics_view, name='request-metrics-prometheus'),
+]
@@ -1,3 +1,39 @@
-from django.shortcuts import render
+import hmac
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from .profiling import prometheus_exposition, request_metrics
 
-# Create your views here.
+
+class IsAdminOrScraper(permissions.BasePermission):
+    """
+    Staff users, or a metrics scraper sending `Authorization: Metrics <token>`
+    with REQUEST_PROFILING['SCRAPE_TOKEN']. JWT authentication ignores that
+    scheme, so a scraper needs no user account.
+    """
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        token = settings.REQUEST_PROFILING.get('SCRAPE_TOKEN')
+        scheme, _, credentials = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+        return bool(token) and scheme == 'Metrics' and hmac.compare_digest(credentials.encode(), token.encode())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminOrScraper])
+def request_metrics_view(request):
+    """Per-endpoint request metrics from apis.profiling, with the latest slow-request traces."""
+    if request_metrics is None:
+        return Response({"enabled": False})
+    return Response({"enabled": True, **request_metrics.snapshot()})
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminOrScraper])
+def prometheus_metrics_view(request):
+    """The same metrics in the Prometheus text exposition format."""
+    text = prometheus_exposition(request_metrics.snapshot()) if request_metrics is not None else ''
+    return HttpResponse(text, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,7 +1,8 @@
 from django.contrib import admin
 from .models import (
-    Course, Assignment, Quiz, ChatMessage,
-    QuizQuestion, QuizAttempt, QuizAnswer
+    Course, Assignment, AssignmentSubmission, Quiz, ChatMessage,
+    QuizQuestion, QuizAttempt, QuizAnswer,
+    QuizScoreRollup, CourseStudentRollup
 )
 
 @admin.register(Course)
@@ -16,6 +17,12 @@ class AssignmentAdmin(admin.ModelAdmin):
     search_fields = ('title', 'course__name')
     list_filter = ('course',)
 
+@admin.register(AssignmentSubmission)
+class AssignmentSubmissionAdmin(admin.ModelAdmin):
+    list_display = ('assignment', 'student', 'status', 'score', 'submitted_at', 'marked_at')
+    search_fields = ('assignment__title', 'student__email')
+    list_filter = ('status', 'assignment')
+
 @admin.register(Quiz)
 class QuizAdmin(admin.ModelAdmin):
     list_display = ('title', 'course', 'created_at')
@@ -45,3 +52,14 @@ class ChatMessageAdmin(admin.ModelAdmin):
     list_display = ('user', 'user_message', 'created_at')
     search_fields = ('user__email', 'user_message')
     list_filter = ('user',)
+
+@admin.register(QuizScoreRollup)
+class QuizScoreRollupAdmin(admin.ModelAdmin):
+    list_display = ('quiz', 'attempts', 'min_score', 'max_score', 'latest_score')
+    search_fields = ('quiz__title',)
+
+@admin.register(CourseStudentRollup)
+class CourseStudentRollupAdmin(admin.ModelAdmin):
+    list_display = ('course', 'student', 'attempts', 'min_score', 'max_score', 'latest_score')
+    search_fields = ('course__name', 'student__email')
+    list_filter = ('course',)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Registers the version bump signals behind HTTP caching and the
+        # rollup refresh after attempts are deleted
+        from . import http_cache, rollups  # noqa: F401
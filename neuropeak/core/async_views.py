@@ -0,0 +1,72 @@
+"""
+Async variants of the hot I/O-bound endpoints, routed in place of the DRF
+views when the project is served through asgi.py (settings.ASYNC_VIEWS).
+
+While a request waits for the inference worker it holds no thread, so one
+ASGI process serves many slow chatbot requests at once. Queries use the
+async ORM; Django still runs each of them in its sync thread, but only for
+the query itself. Responses match the DRF views they replace.
+"""
+from django.http import HttpResponse
+from rest_framework import serializers, status
+from apis.async_support import async_api_view, json_body, json_response
+from .chat_history import arecent_turns, build_prompt, remember_turn
+from .chat_log import chat_log
+from .grading import agrade_attempt
+from .http_cache import aconditional
+from .inference import InferenceUnavailable, agenerate_reply
+from .models import Quiz
+from .quiz_bundle import quiz_bundles
+from .serializers import QuizAttemptSerializer, QuizAttemptSubmissionSerializer
+from .views import QuizAttemptViewSet, _acache_scope, _cache_reply, _cached_reply
+
+
+@async_api_view(['POST'])
+async def chatbot(request):
+    """POST /chatbot/ (ChatBotViewSet.create)."""
+    data = json_body(request)
+    user_message = data.get('message')
+    if not user_message:
+        return json_response({"reply": "Please provide a message."}, status=status.HTTP_400_BAD_REQUEST)
+    turns = await arecent_turns(request.user.id)
+    shared = not turns
+    scope = await _acache_scope(request.user, data.get('course')) if shared else None
+    reply = _cached_reply(user_message, scope) if shared else None
+    if reply is None:
+        try:
+            reply = await agenerate_reply(build_prompt(turns, user_message))
+        except InferenceUnavailable:
+            return json_response({"reply": "The chatbot is currently unavailable."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        if reply and shared:
+            _cache_reply(user_message, reply, scope)
+        elif not reply:
+            reply = "Sorry, I didn't understand."
+
+    await chat_log.alog(request.user.id, user_message, reply)
+    remember_turn(request.user.id, user_message, reply)
+    return json_response({"reply": reply})
+
+
+@async_api_view(['GET'])
+async def quiz_bundle(request, pk):
+    """GET /quizzes/<pk>/bundle/ (QuizViewSet.bundle), with the same ETags."""
+    async def build(current):
+        _, body = await quiz_bundles.aget(pk, current)
+        return HttpResponse(body, content_type='application/json')
+    return await aconditional(request, Quiz, pk, build)
+
+
+@async_api_view(['POST'], fallback=QuizAttemptViewSet.as_view({'get': 'list', 'post': 'create'}))
+async def quiz_attempts(request):
+    """POST /attempts/ (QuizAttemptViewSet.create); listing stays with the DRF view."""
+    submission = QuizAttemptSubmissionSerializer(data=json_body(request))
+    submission.is_valid(raise_exception=True)
+    quiz_id = submission.validated_data['quiz']
+    # course_id is read by the rollups
+    quiz = await Quiz.objects.only('id', 'version', 'course_id').filter(pk=quiz_id).afirst()
+    if quiz is None:
+        raise serializers.ValidationError({"quiz": [f'Invalid pk "{quiz_id}" - object does not exist.']})
+
+    attempt, wrong_answers = await agrade_attempt(quiz, request.user, submission.validated_data['answers'])
+    attempt.wrong_answers = wrong_answers
+    return json_response(QuizAttemptSerializer(attempt).data, status=status.HTTP_201_CREATED)
@@ -0,0 +1,24 @@
+"""Shared plumbing for the bench_* management commands."""
+import os
+import tempfile
+from contextlib import contextmanager
+from django.db import connection
+
+
+@contextmanager
+def throwaway_database():
+    """Run the block against a freshly migrated test database that is destroyed afterwards."""
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    tmpdir = None
+    if connection.vendor == 'sqlite':
+        # Concurrent connections need a shared on-disk database, not :memory:
+        tmpdir = tempfile.mkdtemp(prefix='neuropeak-bench-')
+        test_settings['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        if tmpdir:
+            os.rmdir(tmpdir)
@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from django.conf import settings
+from .inference.prompt import cut_reply, format_prompt
+from .models import ChatMessage
+
+
+def _config(key, default):
+    return settings.CHATBOT.get(key, default)
+
+
+class ConversationCache:
+    """
+    Per-process LRU cache of each user's most recent chat turns. Entries
+    expire after `ttl` seconds so turns served by another process are
+    picked up from the database before long.
+    """
+
+    def __init__(self, max_users=1000, turns=6, ttl=300):
+        self.max_users = max_users
+        self.turns = turns
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # user_id -> (loaded_at, deque of turns)
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.entries.pop(user_id, None)
+                return None
+            self.entries.move_to_end(user_id)
+            return list(entry[1])
+
+    def set(self, user_id, turns):
+        with self.lock:
+            self.entries[user_id] = (time.monotonic(), deque(turns, maxlen=self.turns))
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_users:
+                self.entries.popitem(last=False)
+
+    def append(self, user_id, user_message, bot_reply):
+        # Only extend cached histories; a missing entry is loaded on next use
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None:
+                entry[1].append((user_message, bot_reply))
+                self.entries.move_to_end(user_id)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+conversation_cache = ConversationCache(
+    max_users=_config('HISTORY_CACHE_USERS', 1000),
+    turns=_config('HISTORY_TURNS', 6),
+    ttl=_config('HISTORY_CACHE_TTL', 300),
+)
+
+
+def _recent_queryset(user_id):
+    # Served by the (user, created_at) index; only the last K rows are read
+    return (
+        ChatMessage.objects.filter(user_id=user_id)
+        .order_by('-created_at', '-id')
+        .values_list('user_message', 'bot_reply')[:conversation_cache.turns]
+    )
+
+
+def recent_turns(user_id):
+    turns = conversation_cache.get(user_id)
+    if turns is None:
+        turns = list(reversed(_recent_queryset(user_id)))
+        conversation_cache.set(user_id, turns)
+    return turns
+
+
+async def arecent_turns(user_id):
+    turns = conversation_cache.get(user_id)
+    if turns is None:
+        turns = [turn async for turn in _recent_queryset(user_id)]
+        turns.reverse()
+        conversation_cache.set(user_id, turns)
+    return turns
+
+
+def count_tokens(text):
+    # Whitespace tokens are a cheap, tokenizer-free upper bound proxy
+    return len(text.split())
+
+
+def _tail(text, budget):
+    words = text.split()
+    return " ".join(words[-budget:]) if budget > 0 else ""
+
+
+def fit_to_budget(turns, message, budget=None):
+    """
+    Keep the newest turns that fit the token budget. The oldest turn that
+    only partly fits is truncated to its tail; anything older is dropped.
+    The new message always survives, truncated to the budget if needed.
+    """
+    budget = _config('CONTEXT_TOKENS', 512) if budget is None else budget
+    message = _tail(message, budget) if count_tokens(message) > budget else message
+    remaining = budget - count_tokens(message)
+
+    kept = []
+    for user_message, bot_reply in reversed(turns):
+        cost = count_tokens(user_message) + count_tokens(bot_reply)
+        if cost <= remaining:
+            kept.append((user_message, bot_reply))
+            remaining -= cost
+            continue
+        if remaining > 1:
+            # Split what is left so neither side of the turn is emptied
+            user_budget = min(count_tokens(user_message), max(remaining // 2, remaining - count_tokens(bot_reply)))
+            kept.append((_tail(user_message, user_budget), _tail(bot_reply, remaining - user_budget)))
+        break
+    kept.reverse()
+    return kept, message
+
+
+def build_prompt(turns, message):
+    # Replies stored before generation stopped at the next turn may still carry one
+    turns = [(user_message, cut_reply(bot_reply)) for user_message, bot_reply in turns]
+    return format_prompt(*fit_to_budget(turns, message))
+
+
+def remember_turn(user_id, user_message, bot_reply):
+    conversation_cache.append(user_id, user_message, bot_reply)
@@ -0,0 +1,154 @@
+"""
+Buffered, retrying persistence of chatbot conversations.
+
+Requests hand their ChatMessage to `chat_log.log()`, which only enqueues it;
+a background thread writes queued messages with one bulk_create once
+BATCH_SIZE have accumulated or FLUSH_INTERVAL seconds have passed, retrying
+on "database is locked" style OperationalErrors with exponential backoff.
+Any other error drops the batch it came from, logged, and the writer moves
+on; should the thread die anyway, the next `log()` starts a new one.
+
+Durability: messages live only in process memory until flushed. A crash or
+SIGKILL loses at most the queued messages, which is bounded by MAX_PENDING
+plus one in-flight batch of BATCH_SIZE; under normal load that is roughly
+FLUSH_INTERVAL seconds of chat. When the queue is full, `log()` writes
+synchronously rather than dropping. A batch that still fails after
+MAX_RETRIES attempts is logged and discarded. Pending messages are flushed
+on clean interpreter exit. `created_at` is stamped at flush time, so it
+may trail the reply by up to FLUSH_INTERVAL.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import OperationalError, close_old_connections
+from .models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+
+class ChatLogWriter:
+    def __init__(self, batch_size=100, flush_interval=1.0, max_pending=1000, max_retries=5, retry_backoff=0.05):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.flush_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._start_lock:
+                if self._thread is None:
+                    atexit.register(self.flush)
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='chat-log-writer', daemon=True)
+                    self._thread.start()
+
+    def log(self, user_id, user_message, bot_reply):
+        message = ChatMessage(user_id=user_id, user_message=user_message, bot_reply=bot_reply)
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            # Backpressure: never drop a message because the writer fell behind
+            self.write([message])
+
+    async def alog(self, user_id, user_message, bot_reply):
+        """log() for async views; a backpressure write runs off the event loop."""
+        message = ChatMessage(user_id=user_id, user_message=user_message, bot_reply=bot_reply)
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            await sync_to_async(self.write)([message])
+
+    def _drain(self, first=None, deadline=None):
+        batch = [] if first is None else [first]
+        while len(batch) < self.batch_size:
+            try:
+                if deadline is None:
+                    batch.append(self.queue.get_nowait())
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def write(self, batch):
+        for attempt in range(self.max_retries):
+            try:
+                ChatMessage.objects.bulk_create(batch)
+                return True
+            except OperationalError as exc:
+                if attempt == self.max_retries - 1:
+                    logger.error("Dropping %d chat messages after %d attempts: %s", len(batch), self.max_retries, exc)
+                    return False
+                time.sleep(self.retry_backoff * 2 ** attempt)
+            except Exception:
+                logger.exception("Dropping %d chat messages", len(batch))
+                return False
+        return False
+
+    def flush(self):
+        """Synchronously write everything queued so far."""
+        with self.flush_lock:
+            while True:
+                batch = self._drain()
+                if not batch:
+                    return
+                self.write(batch)
+
+    def _run(self):
+        while True:
+            first = self.queue.get()
+            batch = self._drain(first, deadline=time.monotonic() + self.flush_interval)
+            try:
+                with self.flush_lock:
+                    close_old_connections()
+                    self.write(batch)
+            except Exception:
+                # Keep the writer alive; close_old_connections() can fail too
+                logger.exception("Chat log writer failed on a batch of %d messages", len(batch))
+
+    @property
+    def pending(self):
+        return self.queue.qsize()
+
+
+class SyncChatLog:
+    """Writes each message immediately; used when buffering is disabled."""
+
+    def log(self, user_id, user_message, bot_reply):
+        ChatMessage.objects.create(user_id=user_id, user_message=user_message, bot_reply=bot_reply)
+
+    async def alog(self, user_id, user_message, bot_reply):
+        await ChatMessage.objects.acreate(user_id=user_id, user_message=user_message, bot_reply=bot_reply)
+
+    def flush(self):
+        pass
+
+    pending = 0
+
+
+def _build_chat_log():
+    config = settings.CHATBOT.get('MESSAGE_LOG', {})
+    if not config.get('BUFFERED', True):
+        return SyncChatLog()
+    return ChatLogWriter(
+        batch_size=config.get('BATCH_SIZE', 100),
+        flush_interval=config.get('FLUSH_INTERVAL', 1.0),
+        max_pending=config.get('MAX_PENDING', 1000),
+        max_retries=config.get('MAX_RETRIES', 5),
+    )
+
+
+chat_log = _build_chat_log()
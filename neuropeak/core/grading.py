@@ -0,0 +1,186 @@
+import string
+import threading
+from collections import OrderedDict, namedtuple
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from rest_framework import serializers
+from .models import QuizAttempt, QuizAnswer, QuizQuestion
+from .rollups import record_attempt
+
+LETTERS = string.ascii_lowercase
+
+# codes maps every accepted spelling of an answer to its option index
+AnswerKeyEntry = namedtuple('AnswerKeyEntry', ['question_text', 'correct_option', 'correct_label', 'codes'])
+
+
+def normalize_answer(value):
+    return str(value).strip().lower()
+
+
+def option_label(question_type, options, index):
+    """How a correct answer is shown to students: its letter, or its text for true/false questions."""
+    if question_type == 'TF' and index < len(options):
+        return options[index]
+    return LETTERS[index].upper() if index < len(LETTERS) else str(index)
+
+
+def answer_codes(options):
+    """
+    Every spelling a student may use for an option, lower-cased: its letter
+    ('a') or its text ('paris'). Letters win over option texts that look like
+    letters. Indexes are not accepted: with numeric options such as
+    ['1', '2'] the answer '2' means the option reading 2.
+    """
+    codes = {}
+    for index, text in enumerate(options):
+        codes.setdefault(normalize_answer(text), index)
+    for index in range(min(len(options), len(LETTERS))):
+        codes[LETTERS[index]] = index
+    return codes
+
+
+def compile_answer_key(rows):
+    return {
+        qid: AnswerKeyEntry(text, correct, option_label(question_type, options, correct), answer_codes(options))
+        for qid, text, question_type, options, correct in rows
+    }
+
+
+class AnswerKeyCache:
+    """Compiled answer keys keyed by (quiz id, quiz version); any question edit bumps the version."""
+
+    def __init__(self, max_quizzes=256):
+        self.max_quizzes = max_quizzes
+        self.lock = threading.Lock()
+        self.keys = OrderedDict()
+
+    def get(self, quiz):
+        answer_key = self._cached(quiz)
+        if answer_key is None:
+            answer_key = self._store(quiz, compile_answer_key(self._rows(quiz)))
+        return answer_key
+
+    async def aget(self, quiz):
+        """get() for async views."""
+        answer_key = self._cached(quiz)
+        if answer_key is None:
+            answer_key = self._store(quiz, compile_answer_key([row async for row in self._rows(quiz)]))
+        return answer_key
+
+    def _rows(self, quiz):
+        return QuizQuestion.objects.filter(quiz=quiz).values_list(
+            'id', 'question_text', 'question_type', 'options', 'correct_option'
+        )
+
+    def _cached(self, quiz):
+        key = (quiz.pk, quiz.version)
+        with self.lock:
+            answer_key = self.keys.get(key)
+            if answer_key is not None:
+                self.keys.move_to_end(key)
+            return answer_key
+
+    def _store(self, quiz, answer_key):
+        with self.lock:
+            self.keys[(quiz.pk, quiz.version)] = answer_key
+            while len(self.keys) > self.max_quizzes:
+                self.keys.popitem(last=False)
+        return answer_key
+
+    def clear(self):
+        with self.lock:
+            self.keys.clear()
+
+
+answer_keys = AnswerKeyCache()
+
+
+def load_answer_key(quiz):
+    """Every question of the quiz keyed by id; one query per quiz version, then cached."""
+    return answer_keys.get(quiz)
+
+
+def _coerce_question_ids(answers):
+    # JSON object keys always arrive as strings
+    coerced = {}
+    for qid, ans in answers.items():
+        try:
+            coerced[int(qid)] = ans
+        except (TypeError, ValueError):
+            raise serializers.ValidationError({"answers": f"Invalid question id: {qid}."})
+    return coerced
+
+
+def grade_answers(answer_key, answers):
+    """
+    Grade submitted answers in memory against a preloaded answer key by
+    comparing option indexes. Returns (results, correct_count, wrong_answers)
+    where results is a list of (question_id, student_answer, is_correct).
+    """
+    results = []
+    correct_count = 0
+    wrong_answers = []
+
+    for qid, ans in answers.items():
+        entry = answer_key[qid]
+        is_correct = entry.codes.get(normalize_answer(ans)) == entry.correct_option
+        results.append((qid, ans, is_correct))
+        if is_correct:
+            correct_count += 1
+        else:
+            wrong_answers.append({
+                "question": entry.question_text,
+                "your_answer": ans,
+                "correct_answer": entry.correct_label
+            })
+    return results, correct_count, wrong_answers
+
+
+def _check_answers(answers):
+    if not answers:
+        raise serializers.ValidationError({"answers": "At least one answer is required."})
+    return _coerce_question_ids(answers)
+
+
+def _grade(quiz, answer_key, answers):
+    foreign = sorted(set(answers) - set(answer_key))
+    if foreign:
+        raise serializers.ValidationError({
+            "answers": f"Questions {foreign} do not belong to quiz {quiz.pk}."
+        })
+    return grade_answers(answer_key, answers)
+
+
+def save_attempt(quiz, student, results, correct_count):
+    """Persist graded results: the attempt, all of its answers and the rollups, in one transaction."""
+    with transaction.atomic():
+        attempt = QuizAttempt.objects.create(quiz=quiz, student=student, score=correct_count / len(results))
+        QuizAnswer.objects.bulk_create([
+            QuizAnswer(attempt=attempt, question_id=qid, student_answer=ans, is_correct=is_correct)
+            for qid, ans, is_correct in results
+        ])
+        record_attempt(attempt)
+    return attempt
+
+
+def grade_attempt(quiz, student, answers):
+    """
+    Grade and persist a quiz attempt with a constant number of queries:
+    at most one to load the answer key, one insert for the attempt, one
+    bulk insert for all of its answers and a fixed number to update the
+    score rollups.
+    """
+    answers = _check_answers(answers)
+    results, correct_count, wrong_answers = _grade(quiz, load_answer_key(quiz), answers)
+    return save_attempt(quiz, student, results, correct_count), wrong_answers
+
+
+async def agrade_attempt(quiz, student, answers):
+    """
+    grade_attempt() for async views. Grading happens on the event loop;
+    the writes still run in a thread, because Django transactions are not
+    available to async code.
+    """
+    answers = _check_answers(answers)
+    results, correct_count, wrong_answers = _grade(quiz, await answer_keys.aget(quiz), answers)
+    return await sync_to_async(save_attempt)(quiz, student, results, correct_count), wrong_answers
@@ -0,0 +1,234 @@
+"""
+Conditional GET and a shared response cache for versioned resources.
+
+Course and Quiz rows carry a `version` bumped on every save (see
+models.Versioned); saving or deleting a question bumps its quiz. A view's
+ETag is derived from that version, so a client revalidating an unchanged
+resource gets a 304 without the resource being queried or serialized.
+
+Rendered 200 bodies are kept in a Django cache (settings.HTTP_CACHE) under a
+key that includes the version, so an edit makes the old entries
+unreachable at once. With a cache shared between processes (e.g. Redis)
+the current versions are cached too and replaced when the edit commits, so
+every process sees the new version immediately. A per-process cache could
+not see another process's edits, so then the version is read from the row
+by primary key on each request.
+"""
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+from .models import Course, Quiz, QuizQuestion
+from .single_flight import AsyncSingleFlight, SingleFlight
+
+
+def _config(key, default):
+    return getattr(settings, 'HTTP_CACHE', {}).get(key, default)
+
+
+def _cache():
+    return caches[_config('CACHE', 'default')]
+
+
+def _caches_versions(cache):
+    """Versions are only cached where every process sees the same entries."""
+    return not isinstance(cache, LocMemCache)
+
+
+def _read_version(model, pk):
+    return model.objects.filter(pk=pk).values_list('version', 'updated_at').first()
+
+
+def _version_key(model, pk):
+    return f'http-cache:version:{model._meta.label_lower}:{pk}'
+
+
+_version_loads = SingleFlight()
+_async_version_loads = AsyncSingleFlight()
+
+
+def resource_version(model, pk):
+    """(version, updated_at) of a row, from the cache when possible; None if it does not exist."""
+    if not _caches_versions(_cache()):
+        return _read_version(model, pk)
+    key = _version_key(model, pk)
+    current = _cache().get(key)
+    if current is None:
+        # Concurrent misses for the same row share one query
+        current, _ = _version_loads.do(key, lambda: _load_version(model, pk, key))
+    return current
+
+
+def _load_version(model, pk, key):
+    current = _read_version(model, pk)
+    if current is not None:
+        # add() rather than set(): never overwrite a newer version published by a commit
+        _cache().add(key, current, _config('VERSION_TTL', 60))
+    return current
+
+
+async def aresource_version(model, pk):
+    """resource_version() for async views."""
+    if not _caches_versions(_cache()):
+        return await model.objects.filter(pk=pk).values_list('version', 'updated_at').afirst()
+    key = _version_key(model, pk)
+    current = await _cache().aget(key)
+    if current is None:
+        current, _ = await _async_version_loads.do(key, lambda: _aload_version(model, pk, key))
+    return current
+
+
+async def _aload_version(model, pk, key):
+    current = await model.objects.filter(pk=pk).values_list('version', 'updated_at').afirst()
+    if current is not None:
+        await _cache().aadd(key, current, _config('VERSION_TTL', 60))
+    return current
+
+
+def validators(model, pk, current, variant):
+    """
+    (ETag, Last-Modified timestamp) for a representation of a row at its
+    `current` (version, updated_at); different variants (query strings,
+    media types) of one version get different ETags.
+    """
+    version, updated_at = current
+    digest = hashlib.sha1(variant.encode()).hexdigest()[:12]
+    return f'"{model._meta.model_name}-{pk}-v{version}-{digest}"', int(updated_at.timestamp())
+
+
+def with_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Authenticated data: browsers may keep it but must revalidate each time
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+async def aconditional(request, model, pk, build, media_type='application/json'):
+    """
+    Conditional GET for async views that render a single media type: a 304
+    when the client's copy is current, otherwise `await build(current)`
+    with the validators set. There is no shared response cache here.
+    """
+    current = await aresource_version(model, pk) if _config('ENABLED', True) else None
+    if current is None:
+        return await build(None)
+    etag, last_modified = validators(model, pk, current, f'{request.get_full_path()}|{media_type}')
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = await build(current)
+    return with_validators(response, etag, last_modified)
+
+
+def publish_version(model, pk):
+    """After a commit, replace the cached version of the row with the stored one."""
+    if not _caches_versions(_cache()):
+        return
+
+    def publish():
+        current = _read_version(model, pk)
+        if current is None:
+            _cache().delete(_version_key(model, pk))
+        else:
+            _cache().set(_version_key(model, pk), current, _config('VERSION_TTL', 60))
+    transaction.on_commit(publish)
+
+
+def bump_quiz(quiz_id):
+    """Invalidate every cached representation of the quiz and its questions."""
+    Quiz.bump_version(quiz_id)
+    publish_version(Quiz, quiz_id)
+
+
+_batched_quizzes = ContextVar('batched_quizzes', default=frozenset())
+
+
+@contextmanager
+def batched_question_edits(quiz_id):
+    """
+    Edit many questions of a quiz with a single version bump. Per-question
+    signals inside the block do not bump the quiz; it is bumped once when
+    the block exits cleanly. Bulk queries send no signals at all, so bulk
+    edits must run inside this block.
+    """
+    token = _batched_quizzes.set(_batched_quizzes.get() | {quiz_id})
+    try:
+        yield
+    finally:
+        _batched_quizzes.reset(token)
+    bump_quiz(quiz_id)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Quiz)
+def _publish_saved_version(sender, instance, **kwargs):
+    publish_version(sender, instance.pk)
+
+
+@receiver(post_save, sender=QuizQuestion)
+@receiver(post_delete, sender=QuizQuestion)
+def _bump_question_quiz(sender, instance, **kwargs):
+    if instance.quiz_id not in _batched_quizzes.get():
+        bump_quiz(instance.quiz_id)
+
+
+class ConditionalGetMixin:
+    """
+    ETag/Last-Modified validators and response caching for list/retrieve.
+    Views name the versioned row their response depends on in version_source().
+    Only for views whose representation is the same for every permitted user.
+    """
+
+    def version_source(self):
+        """Return (model, pk) of the row whose version covers this response, or None."""
+        raise NotImplementedError
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(request, lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs))
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs))
+
+    def conditional(self, request, build, shared=True):
+        """Answer 304 or a cached body when possible, otherwise build(); shared=False skips the response cache."""
+        source = self.version_source() if _config('ENABLED', True) else None
+        current = resource_version(*source) if source else None
+        if current is None:
+            return build()
+
+        model, pk = source
+        etag, last_modified = validators(model, pk, current, f'{request.get_full_path()}|{request.accepted_media_type}')
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return with_validators(not_modified, etag, last_modified)
+
+        # Only JSON bodies are shared: the browsable API page shows who is logged in
+        key = f'http-cache:response:{etag}' if shared and request.accepted_renderer.format == 'json' else None
+        cached = _cache().get(key) if key else None
+        if cached is not None:
+            content, content_type = cached
+            return with_validators(HttpResponse(content, content_type=content_type), etag, last_modified)
+
+        response = build()
+        if key and isinstance(response, Response) and response.status_code == 200:
+            self._cache_key = key
+        return with_validators(response, etag, last_modified)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(self, '_cache_key', None)
+        if key is not None and response.status_code == 200:
+            response.render()
+            _cache().set(key, (response.content, response['Content-Type']), _config('TTL', 300))
+        return response
@@ -0,0 +1,3 @@
+from .client import InferenceUnavailable, agenerate_reply, astream_reply, generate_reply, stream_reply
+
+__all__ = ['InferenceUnavailable', 'agenerate_reply', 'astream_reply', 'generate_reply', 'stream_reply']
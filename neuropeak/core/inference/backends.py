@@ -0,0 +1,104 @@
+"""
+Chat model backends. Only the inference worker instantiates these, so the
+heavy ML imports stay out of the web processes.
+"""
+import re
+import threading
+import time
+from .prompt import STOP_SEQUENCES, cut_reply, cut_stream, last_user_message
+
+
+class StubChatModel:
+    """
+    Deterministic model for offline development, tests and benchmarks;
+    echoes the newest user turn. latency_ms simulates generation time, paid
+    once per batch as on an accelerator; token_latency_ms is paid before
+    each streamed token.
+    """
+
+    def __init__(self, name='stub', latency_ms=0, token_latency_ms=0):
+        self.name = name
+        self.latency = latency_ms / 1000
+        self.token_latency = token_latency_ms / 1000
+
+    def reply(self, message):
+        return f"You said: {last_user_message(message).strip()}"
+
+    def generate(self, message):
+        return self.generate_batch([message])[0]
+
+    def generate_batch(self, messages):
+        if self.latency:
+            time.sleep(self.latency)
+        return [self.reply(message) for message in messages]
+
+    def stream(self, message):
+        for token in re.findall(r'\S+\s*', self.reply(message)):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            yield token
+
+
+class TransformersChatModel:
+    """
+    Hugging Face text-generation pipeline, loaded once per worker. Replies
+    end where the model starts another turn (prompt.STOP_SEQUENCES; the
+    stop_strings option needs transformers 4.39 or later).
+    """
+
+    def __init__(self, name, max_new_tokens=128):
+        # Imported here so only the worker process pays for torch/transformers
+        from transformers import pipeline
+
+        self.name = name
+        self.max_new_tokens = max_new_tokens
+        self.pipeline = pipeline('text-generation', model=name)
+        tokenizer = self.pipeline.tokenizer
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        # Decoder-only models must be left-padded for batched generation
+        tokenizer.padding_side = 'left'
+
+    def generate(self, message):
+        return self.generate_batch([message])[0]
+
+    def generate_batch(self, messages):
+        results = self.pipeline(
+            messages,
+            batch_size=len(messages),
+            max_new_tokens=self.max_new_tokens,
+            return_full_text=False,
+            pad_token_id=self.pipeline.tokenizer.pad_token_id,
+            stop_strings=list(STOP_SEQUENCES),
+            tokenizer=self.pipeline.tokenizer,
+        )
+        # Generation stops after a stop sequence; the sequence itself is cut here
+        return [cut_reply(result[0]['generated_text']).strip() for result in results]
+
+    def stream(self, message):
+        from transformers import TextIteratorStreamer
+
+        tokenizer = self.pipeline.tokenizer
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        inputs = tokenizer(message, return_tensors='pt').to(self.pipeline.model.device)
+        generation = threading.Thread(target=self.pipeline.model.generate, kwargs={
+            **inputs,
+            'streamer': streamer,
+            'max_new_tokens': self.max_new_tokens,
+            'pad_token_id': tokenizer.pad_token_id,
+            'stop_strings': list(STOP_SEQUENCES),
+            'tokenizer': tokenizer,
+        })
+        generation.start()
+        try:
+            for text in cut_stream(streamer):
+                if text:
+                    yield text
+        finally:
+            generation.join()
+
+
+def load_model(name, **options):
+    if name == 'stub':
+        return StubChatModel(latency_ms=options.get('latency_ms', 0), token_latency_ms=options.get('token_latency_ms', 0))
+    return TransformersChatModel(name, **options)
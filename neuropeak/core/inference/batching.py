@@ -0,0 +1,175 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from ..utils import percentile
+
+logger = logging.getLogger(__name__)
+
+# A queued request. `sink` is a Future for plain generations and a token
+# queue for streamed ones.
+Job = namedtuple('Job', ['message', 'sink', 'enqueued', 'stream'])
+
+STREAM_END = None
+
+# Queued by close(): the batcher stops once the requests before it are done
+_CLOSE = object()
+
+
+class BatchMetrics:
+    """Rolling counters for tuning batch size and window against tail latency."""
+
+    def __init__(self, window=1024):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.batch_sizes = deque(maxlen=window)
+        self.latencies_ms = deque(maxlen=window)
+        self.ttft_ms = deque(maxlen=window)
+        self.queue_depths = deque(maxlen=window)
+
+    def record_batch(self, size, queue_depth):
+        with self.lock:
+            self.batches += 1
+            self.batch_sizes.append(size)
+            self.queue_depths.append(queue_depth)
+
+    def record_latency(self, seconds):
+        with self.lock:
+            self.requests += 1
+            self.latencies_ms.append(seconds * 1000)
+
+    def record_first_token(self, seconds):
+        with self.lock:
+            self.ttft_ms.append(seconds * 1000)
+
+    def snapshot(self, queue_depth):
+        with self.lock:
+            sizes = list(self.batch_sizes)
+            latencies = list(self.latencies_ms)
+            ttft = list(self.ttft_ms)
+            depths = list(self.queue_depths)
+            return {
+                'requests': self.requests,
+                'batches': self.batches,
+                'queue_depth': queue_depth,
+                'max_queue_depth': max(depths, default=0),
+                'mean_batch_size': sum(sizes) / len(sizes) if sizes else None,
+                'max_batch_size': max(sizes, default=0),
+                'latency_ms': {
+                    'p50': percentile(latencies, 0.50),
+                    'p95': percentile(latencies, 0.95),
+                    'p99': percentile(latencies, 0.99),
+                },
+                'time_to_first_token_ms': {
+                    'p50': percentile(ttft, 0.50),
+                    'p95': percentile(ttft, 0.95),
+                    'p99': percentile(ttft, 0.99),
+                },
+            }
+
+
+class MicroBatcher:
+    """
+    Collects concurrent generation requests and runs them through the model
+    as a single padded batch. A batch is dispatched once it reaches
+    max_batch_size or max_wait_ms after its first request arrived,
+    whichever comes first.
+
+    Streams skip the batch queue: each runs on one of max_streams stream
+    threads, so concurrent streams produce tokens side by side and batched
+    generations never wait behind them. Time to first token only grows
+    once more than max_streams streams are active.
+    """
+
+    def __init__(self, model, max_batch_size=8, max_wait_ms=10, max_streams=8):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        self.metrics = BatchMetrics()
+        self.streams = ThreadPoolExecutor(max_workers=max_streams, thread_name_prefix='inference-stream')
+        self._thread = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, message):
+        future = Future()
+        self.queue.put(Job(message, future, time.perf_counter(), stream=False))
+        return future
+
+    def submit_stream(self, message):
+        """
+        Queue a streamed generation. Returns a queue that receives each token
+        as it is produced, then STREAM_END; a failure is delivered as the
+        exception instance.
+        """
+        tokens = queue.Queue()
+        self.streams.submit(self._run_stream, Job(message, tokens, time.perf_counter(), stream=True))
+        return tokens
+
+    def generate(self, message, timeout=None):
+        return self.submit(message).result(timeout)
+
+    def stats(self):
+        return self.metrics.snapshot(self.queue.qsize())
+
+    def close(self):
+        """Finish the requests already submitted, then stop the batcher and stream threads."""
+        self.queue.put(_CLOSE)
+        self._thread.join()
+        self.streams.shutdown()
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size and batch[-1] is not _CLOSE:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            closing = batch[-1] is _CLOSE
+            if closing:
+                batch.pop()
+            if batch:
+                self.metrics.record_batch(len(batch), self.queue.qsize())
+                self._run_batch(batch)
+            if closing:
+                return
+
+    def _run_batch(self, jobs):
+        try:
+            replies = self.model.generate_batch([job.message for job in jobs])
+        except Exception as exc:
+            logger.exception("Batch of %d generations failed", len(jobs))
+            for job in jobs:
+                job.sink.set_exception(exc)
+            return
+        finished = time.perf_counter()
+        for job, reply in zip(jobs, replies):
+            self.metrics.record_latency(finished - job.enqueued)
+            job.sink.set_result(reply)
+
+    def _run_stream(self, job):
+        first = True
+        try:
+            for token in self.model.stream(job.message):
+                if first:
+                    self.metrics.record_first_token(time.perf_counter() - job.enqueued)
+                    first = False
+                job.sink.put(token)
+        except Exception as exc:
+            logger.exception("Streamed generation failed")
+            job.sink.put(exc)
+            return
+        self.metrics.record_latency(time.perf_counter() - job.enqueued)
+        job.sink.put(STREAM_END)
@@ -0,0 +1,251 @@
+import asyncio
+import itertools
+import threading
+import weakref
+from multiprocessing.connection import Client
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+_local = threading.local()
+_connections = weakref.WeakKeyDictionary()  # event loop -> MultiplexedConnection
+
+
+class InferenceUnavailable(Exception):
+    """The inference worker could not be reached or failed to answer."""
+
+
+def _connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        config = settings.CHATBOT
+        conn = Client(tuple(config['ADDRESS']), authkey=config['AUTHKEY'].encode())
+        _local.conn = conn
+    return conn
+
+
+def _reset():
+    conn = getattr(_local, 'conn', None)
+    _local.conn = None
+    if conn is not None:
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+
+def request(payload):
+    """Send one request to the worker over this thread's persistent connection."""
+    timeout = settings.CHATBOT['TIMEOUT']
+    # A stale connection (worker restarted) is retried once on a fresh socket
+    for retry in (True, False):
+        try:
+            conn = _connection()
+            conn.send(payload)
+            if not conn.poll(timeout):
+                _reset()
+                raise InferenceUnavailable("Timed out waiting for the inference worker.")
+            response = conn.recv()
+            break
+        except (OSError, EOFError) as exc:
+            _reset()
+            if not retry:
+                raise InferenceUnavailable(f"Inference worker is unreachable: {exc}") from exc
+
+    if 'error' in response:
+        raise InferenceUnavailable(response['error'])
+    return response
+
+
+def generate_reply(message):
+    return request({'op': 'generate', 'message': message})['reply']
+
+
+def worker_stats():
+    return request({'op': 'stats'})
+
+
+def stream_reply(message):
+    """
+    Yield reply tokens as the worker produces them. Streams use a dedicated
+    connection so they never interleave with the thread's request socket.
+    """
+    config = settings.CHATBOT
+    try:
+        conn = Client(tuple(config['ADDRESS']), authkey=config['AUTHKEY'].encode())
+    except OSError as exc:
+        raise InferenceUnavailable(f"Inference worker is unreachable: {exc}") from exc
+
+    with conn:
+        try:
+            conn.send({'op': 'stream', 'message': message})
+            while True:
+                if not conn.poll(config['TIMEOUT']):
+                    raise InferenceUnavailable("Timed out waiting for the inference worker.")
+                chunk = conn.recv()
+                if 'error' in chunk:
+                    raise InferenceUnavailable(chunk['error'])
+                if chunk.get('done'):
+                    return
+                yield chunk['token']
+        except (OSError, EOFError) as exc:
+            raise InferenceUnavailable(f"Inference worker connection lost: {exc}") from exc
+
+
+def _close(conn):
+    try:
+        conn.close()
+    except OSError:
+        pass
+
+
+async def _connect():
+    """Open a worker connection; only the handshake runs in a thread."""
+    config = settings.CHATBOT
+    try:
+        return await sync_to_async(Client, thread_sensitive=False)(
+            tuple(config['ADDRESS']), authkey=config['AUTHKEY'].encode()
+        )
+    except OSError as exc:
+        raise InferenceUnavailable(f"Inference worker is unreachable: {exc}") from exc
+
+
+async def _readable(conn, timeout):
+    """Wait on the event loop, not in a thread, until the worker has answered; False on timeout."""
+    loop = asyncio.get_running_loop()
+    if conn.poll(0):
+        return True
+    ready = loop.create_future()
+    try:
+        loop.add_reader(conn.fileno(), lambda: ready.done() or ready.set_result(True))
+    except NotImplementedError:
+        # Event loops without add_reader (Windows' proactor): wait in a thread
+        return await sync_to_async(conn.poll, thread_sensitive=False)(timeout)
+    try:
+        return await asyncio.wait_for(ready, timeout)
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        loop.remove_reader(conn.fileno())
+
+
+class MultiplexedConnection:
+    """
+    One worker connection shared by every coroutine of an event loop. Each
+    request is tagged with an id and the worker answers it as soon as its
+    batch is done, so any number of generations are in flight at once and
+    none of them holds a thread or a socket of its own. A reader on the
+    loop's selector hands each reply to the coroutine waiting for it; if the
+    connection breaks, every waiting request fails and the next one
+    reconnects.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.conn = self.fd = None
+        self.connecting = asyncio.Lock()
+        self.pending = {}
+        self.ids = itertools.count()
+
+    async def _connection(self):
+        if self.conn is None:
+            async with self.connecting:
+                if self.conn is None:
+                    conn = await _connect()
+                    try:
+                        self.loop.add_reader(conn.fileno(), self._receive)
+                    except NotImplementedError:
+                        _close(conn)
+                        raise
+                    self.conn, self.fd = conn, conn.fileno()
+        return self.conn
+
+    def _receive(self):
+        try:
+            # Replies are small and written in one piece: once readable, recv() returns at once
+            while self.conn is not None and self.conn.poll(0):
+                response = self.conn.recv()
+                waiter = self.pending.pop(response.get('id'), None)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(response)
+        except (OSError, EOFError) as exc:
+            self.drop(exc)
+
+    def drop(self, exc):
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            self.loop.remove_reader(self.fd)
+            _close(conn)
+        pending, self.pending = self.pending, {}
+        for waiter in pending.values():
+            if not waiter.done():
+                waiter.set_exception(exc)
+
+    async def request(self, payload, timeout):
+        conn = await self._connection()
+        request_id = next(self.ids)
+        waiter = self.pending[request_id] = self.loop.create_future()
+        try:
+            try:
+                conn.send({**payload, 'id': request_id})
+            except OSError as exc:
+                del self.pending[request_id]
+                self.drop(exc)
+                raise
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            raise InferenceUnavailable("Timed out waiting for the inference worker.")
+        finally:
+            self.pending.pop(request_id, None)
+
+
+def _multiplexed():
+    loop = asyncio.get_running_loop()
+    connection = _connections.get(loop)
+    if connection is None:
+        connection = _connections[loop] = MultiplexedConnection(loop)
+    return connection
+
+
+async def arequest(payload):
+    """request() for async views: no thread is held while the worker generates."""
+    timeout = settings.CHATBOT['TIMEOUT']
+    # A stale connection (worker restarted) is retried once on a fresh socket
+    for retry in (True, False):
+        try:
+            response = await _multiplexed().request(payload, timeout)
+            break
+        except NotImplementedError:
+            # Event loops without add_reader (Windows' proactor)
+            return await sync_to_async(request, thread_sensitive=False)(payload)
+        except (OSError, EOFError) as exc:
+            if not retry:
+                raise InferenceUnavailable(f"Inference worker is unreachable: {exc}") from exc
+
+    if 'error' in response:
+        raise InferenceUnavailable(response['error'])
+    return response
+
+
+async def agenerate_reply(message):
+    return (await arequest({'op': 'generate', 'message': message}))['reply']
+
+
+async def astream_reply(message):
+    """stream_reply() for async views: a dedicated connection, awaited on the event loop."""
+    timeout = settings.CHATBOT['TIMEOUT']
+    conn = await _connect()
+    try:
+        conn.send({'op': 'stream', 'message': message})
+        while True:
+            if not await _readable(conn, timeout):
+                raise InferenceUnavailable("Timed out waiting for the inference worker.")
+            chunk = conn.recv()
+            if 'error' in chunk:
+                raise InferenceUnavailable(chunk['error'])
+            if chunk.get('done'):
+                return
+            yield chunk['token']
+    except (OSError, EOFError) as exc:
+        raise InferenceUnavailable(f"Inference worker connection lost: {exc}") from exc
+    finally:
+        _close(conn)
@@ -0,0 +1,62 @@
+"""Prompt layout shared by the web workers that build prompts and the backends that read them."""
+
+USER_PREFIX = 'User: '
+BOT_PREFIX = 'Bot: '
+# Where a generated reply ends: the model has started writing the next turn itself
+STOP_SEQUENCES = tuple(f"\n{prefix.rstrip()}" for prefix in (USER_PREFIX, BOT_PREFIX))
+
+
+def _one_line(text):
+    # A line of its own could start with a role prefix and pass for another turn
+    return " ".join(str(text).splitlines())
+
+
+def format_prompt(turns, message):
+    """Render (user_message, bot_reply) turns followed by the new message, one line per turn."""
+    lines = []
+    for user_message, bot_reply in turns:
+        lines.append(f"{USER_PREFIX}{_one_line(user_message)}")
+        lines.append(f"{BOT_PREFIX}{_one_line(bot_reply)}")
+    lines.append(f"{USER_PREFIX}{_one_line(message)}")
+    lines.append(BOT_PREFIX.rstrip())
+    return "\n".join(lines)
+
+
+def cut_reply(text):
+    """A generated continuation up to the first of the STOP_SEQUENCES."""
+    ends = [end for end in (text.find(stop) for stop in STOP_SEQUENCES) if end >= 0]
+    return text[:min(ends)] if ends else text
+
+
+def _held_back(text):
+    # The longest tail of `text` that a stop sequence starts with
+    for size in range(min(len(text), max(map(len, STOP_SEQUENCES)) - 1), 0, -1):
+        if any(stop.startswith(text[-size:]) for stop in STOP_SEQUENCES):
+            return size
+    return 0
+
+
+def cut_stream(chunks):
+    """cut_reply() over streamed text, holding back what may be the start of a stop sequence."""
+    pending = ''
+    for chunk in chunks:
+        pending += chunk
+        reply = cut_reply(pending)
+        if len(reply) < len(pending):
+            if reply:
+                yield reply
+            return
+        ready = len(pending) - _held_back(pending)
+        if ready:
+            yield pending[:ready]
+            pending = pending[ready:]
+    if pending:
+        yield pending
+
+
+def last_user_message(prompt):
+    """The newest user turn of a prompt, or the prompt itself if it is plain text."""
+    for line in reversed(prompt.splitlines()):
+        if line.startswith(USER_PREFIX):
+            return line[len(USER_PREFIX):]
+    return prompt
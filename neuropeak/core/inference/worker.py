@@ -0,0 +1,128 @@
+import logging
+import threading
+from functools import partial
+from multiprocessing.connection import Listener
+from .backends import load_model
+from .batching import STREAM_END, MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceWorker:
+    """
+    Long-lived process that keeps one warm model in memory and serves the web
+    workers over a local socket. Each client connection gets its own thread;
+    generation requests from all of them are funnelled through a single
+    micro-batcher, and streams run side by side on its stream threads.
+
+    A generate request that carries an 'id' is answered, with that id, as
+    soon as its batch finishes, so a client may keep any number in flight on
+    one connection; the async web workers multiplex all their chatbot
+    requests this way. Untagged requests are answered in order, as before.
+    """
+
+    def __init__(self, model, address, authkey, max_batch_size=8, batch_window_ms=10, max_streams=8):
+        self.model = model
+        self.address = tuple(address)
+        self.authkey = authkey.encode()
+        self.batcher = MicroBatcher(
+            model, max_batch_size=max_batch_size, max_wait_ms=batch_window_ms, max_streams=max_streams
+        )
+        self.listener = None
+
+    @classmethod
+    def from_settings(cls, config):
+        return cls(
+            load_model(config['MODEL'], **config.get('MODEL_OPTIONS', {})),
+            config['ADDRESS'],
+            config['AUTHKEY'],
+            max_batch_size=config.get('MAX_BATCH_SIZE', 8),
+            batch_window_ms=config.get('BATCH_WINDOW_MS', 10),
+            max_streams=config.get('MAX_STREAMS', 8),
+        )
+
+    def handle(self, payload):
+        op = payload.get('op')
+        if op == 'generate':
+            return {'reply': self.batcher.generate(payload['message'])}
+        if op == 'stats':
+            return {'model': self.model.name, **self.batcher.stats()}
+        if op == 'ping':
+            return {'model': self.model.name}
+        return {'error': f"Unknown operation: {op}"}
+
+    def handle_stream(self, send, payload):
+        """Relay tokens to the client as they are produced, then a final 'done'."""
+        tokens = self.batcher.submit_stream(payload['message'])
+        while True:
+            token = tokens.get()
+            if token is STREAM_END:
+                send({'done': True})
+                return
+            if isinstance(token, Exception):
+                send({'error': str(token)})
+                return
+            send({'token': token})
+
+    def _answer(self, send, request_id, future):
+        # Runs on the batcher thread when the request's batch is done
+        try:
+            response = {'id': request_id, 'reply': future.result()}
+        except Exception as exc:
+            response = {'id': request_id, 'error': str(exc)}
+        try:
+            send(response)
+        except OSError:
+            pass  # The client went away; its connection thread cleans up
+
+    def _serve_connection(self, conn):
+        lock = threading.Lock()
+
+        def send(response):
+            # Tagged replies are written from the batcher thread
+            with lock:
+                conn.send(response)
+
+        with conn:
+            while True:
+                try:
+                    payload = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if payload.get('op') == 'stream':
+                        self.handle_stream(send, payload)
+                        continue
+                    if payload.get('op') == 'generate' and 'id' in payload:
+                        future = self.batcher.submit(payload['message'])
+                        future.add_done_callback(partial(self._answer, send, payload['id']))
+                        continue
+                    response = self.handle(payload)
+                except Exception as exc:
+                    logger.exception("Inference request failed")
+                    response = {'error': str(exc)}
+                try:
+                    send(response)
+                except OSError:
+                    return
+
+    def serve_forever(self):
+        self.listener = Listener(self.address, backlog=128, authkey=self.authkey)
+        logger.info("Inference worker listening on %s:%s", *self.address)
+        try:
+            while True:
+                try:
+                    conn = self.listener.accept()
+                except OSError:
+                    if self.listener is None:
+                        return
+                    logger.exception("Rejected inference client")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            self.close()
+
+    def close(self):
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.close()
@@ -0,0 +1,276 @@
+import asyncio
+import io
+import json
+import multiprocessing
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from core.benchmarks import throwaway_database
+from core.utils import percentile
+
+ENDPOINTS = ('chatbot', 'bundle', 'attempt', 'refresh')
+HOST = 'localhost'
+
+
+def _peak_rss_mb():
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _request(endpoint, index, fixtures):
+    """(method, path, body, bearer token) of the index-th request to an endpoint."""
+    student = index % len(fixtures['access'])
+    token = fixtures['access'][student]
+    if endpoint == 'chatbot':
+        body = {"message": f"Question {index}: what does chlorophyll absorb?"}
+        return 'POST', '/api/v1/test/chatbot/', body, token
+    if endpoint == 'bundle':
+        return 'GET', f"/api/v1/test/quizzes/{fixtures['quiz']}/bundle/", None, token
+    if endpoint == 'attempt':
+        body = {"quiz": fixtures['quiz'], "answers": {str(qid): 'a' for qid in fixtures['questions']}}
+        return 'POST', '/api/v1/test/attempts/', body, token
+    return 'POST', '/api/v1/test/token/refresh/', {"refresh": fixtures['refresh'][index]}, None
+
+
+def _wsgi_client(threads):
+    """Requests are handled by a WSGI worker with `threads` threads: one request per thread at a time."""
+    from django.core.handlers.wsgi import WSGIHandler
+
+    handler = WSGIHandler()
+    pool = ThreadPoolExecutor(max_workers=threads)
+
+    def call(method, path, body, token):
+        environ = {
+            'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+            'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(body), 'CONTENT_LENGTH': str(len(body)),
+            'CONTENT_TYPE': 'application/json',
+        }
+        if token:
+            environ['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        statuses = []
+        response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            b''.join(response)
+        finally:
+            response.close()
+        return int(statuses[0][:3])
+
+    async def send(method, path, body, token):
+        return await asyncio.get_running_loop().run_in_executor(pool, call, method, path, body, token)
+    return send, pool.shutdown
+
+
+def _asgi_client():
+    """Requests are handled by one ASGI worker, as served by asgi.py: every request is a task on its event loop."""
+    from apis.asgi import ASGIHandler
+
+    handler = ASGIHandler(settings.ASGI_SYNC_THREADS)
+
+    async def send(method, path, body, token):
+        headers = [(b'host', HOST.encode()), (b'content-type', b'application/json'),
+                   (b'content-length', str(len(body)).encode())]
+        if token:
+            headers.append((b'authorization', f'Bearer {token}'.encode()))
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+            'method': method, 'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': b'',
+            'headers': headers, 'server': (HOST, 80), 'client': ('127.0.0.1', 50000),
+        }
+        pending = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        finished = asyncio.Event()
+        statuses = []
+
+        async def receive():
+            if pending:
+                return pending.pop()
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send_message(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+            elif not message.get('more_body'):
+                finished.set()
+
+        await handler(scope, receive, send_message)
+        finished.set()
+        return statuses[0]
+    return send, lambda: None
+
+
+def run_load(mode, endpoint, fixtures, options):
+    """
+    Entry point of a spawned benchmark process: serve `requests` requests
+    from `clients` concurrent clients with one WSGI or ASGI worker.
+    """
+    import django
+
+    settings.DATABASES['default']['NAME'] = fixtures['database']
+    settings.ASYNC_VIEWS = mode == 'asgi'
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = [HOST]
+    settings.CHATBOT['ADDRESS'] = fixtures['inference']
+    # Every message should reach the model
+    settings.CHATBOT['RESPONSE_CACHE'] = {**settings.CHATBOT.get('RESPONSE_CACHE', {}), 'ENABLED': False}
+    django.setup()
+
+    async def main():
+        send, close = _wsgi_client(options['wsgi_threads']) if mode == 'wsgi' else _asgi_client()
+        requests = [_request(endpoint, index, fixtures) for index in range(options['requests'])]
+        requests = [
+            (method, path, json.dumps(body).encode() if body is not None else b'', token)
+            for method, path, body, token in requests
+        ]
+        # Warm up: URLconf, middleware and first connections are not part of the run
+        await send('GET', f"/api/v1/test/quizzes/{fixtures['quiz']}/bundle/", b'', fixtures['access'][0])
+        baseline_rss = _peak_rss_mb()
+
+        samples = []
+        statuses = {}
+        peak_threads = threading.active_count()
+        queue = iter(requests)
+
+        async def client():
+            nonlocal peak_threads
+            for request in queue:
+                started = time.perf_counter()
+                try:
+                    status = await send(*request)
+                except Exception as exc:
+                    status = type(exc).__name__
+                samples.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+                peak_threads = max(peak_threads, threading.active_count())
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options['clients'])))
+        elapsed = time.perf_counter() - started
+        close()
+        ok = sum(count for status, count in statuses.items() if status in (200, 201))
+        return {
+            'mode': mode,
+            'endpoint': endpoint,
+            'clients': options['clients'],
+            'requests': len(requests),
+            'ok': ok,
+            'errors': {str(status): count for status, count in statuses.items() if status not in (200, 201)},
+            'seconds': elapsed,
+            'throughput': ok / elapsed if elapsed else 0.0,
+            'p50_ms': (percentile(samples, 0.50) or 0) * 1000,
+            'p99_ms': (percentile(samples, 0.99) or 0) * 1000,
+            'peak_threads': peak_threads,
+            'baseline_rss_mb': baseline_rss,
+            'peak_rss_mb': _peak_rss_mb(),
+        }
+    return asyncio.run(main())
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare one WSGI worker (a fixed pool of request threads) with one ASGI "
+        "worker (async views on an event loop) under many concurrent clients: "
+        "requests/sec, latency, threads and peak memory per endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=1000, help="Concurrent clients.")
+        parser.add_argument('--requests', type=int, default=3000, help="Requests per endpoint and mode.")
+        parser.add_argument('--endpoints', nargs='+', default=list(ENDPOINTS), choices=ENDPOINTS)
+        parser.add_argument('--modes', nargs='+', default=['wsgi', 'asgi'], choices=['wsgi', 'asgi'])
+        parser.add_argument('--wsgi-threads', type=int, default=64, help="Request threads of the WSGI worker.")
+        parser.add_argument('--inference-latency-ms', type=int, default=100, help="Simulated generation time per batch.")
+        parser.add_argument('--inference-batch-size', type=int, default=128, help="Inference micro-batch size.")
+        parser.add_argument('--json', action='store_true', help="Print the results as a JSON list.")
+
+    def handle(self, *args, **options):
+        results = []
+        worker = self.start_inference_worker(options)
+        try:
+            with throwaway_database():
+                fixtures = self.create_fixtures(options['clients'], worker.address)
+                # Each run gets a fresh interpreter, so its peak memory is its own
+                context = multiprocessing.get_context('spawn')
+                for endpoint in options['endpoints']:
+                    for mode in options['modes']:
+                        if endpoint == 'refresh':
+                            # Rotation revokes every refresh token it accepts
+                            fixtures['refresh'] = self.refresh_tokens(options['requests'])
+                        with context.Pool(1) as pool:
+                            results.append(pool.apply(run_load, (mode, endpoint, fixtures, options)))
+        finally:
+            worker.close()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(
+            f"{'endpoint':<8} {'mode':<5} {'clients':>7} {'ok':>6} {'errors':>6} {'req/s':>7} "
+            f"{'p50 ms':>8} {'p99 ms':>8} {'threads':>7} {'RSS MB':>7} {'growth':>7}"
+        )
+        for r in results:
+            self.stdout.write(
+                f"{r['endpoint']:<8} {r['mode']:<5} {r['clients']:>7} {r['ok']:>6} {sum(r['errors'].values()):>6} "
+                f"{r['throughput']:>7.0f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['peak_threads']:>7} "
+                f"{r['peak_rss_mb']:>7.1f} {r['peak_rss_mb'] - r['baseline_rss_mb']:>7.1f}"
+            )
+            if r['errors']:
+                self.stderr.write(f"{r['endpoint']} {r['mode']}: {r['errors']}")
+
+    def start_inference_worker(self, options):
+        from core.inference.backends import StubChatModel
+        from core.inference.worker import InferenceWorker
+
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            address = probe.getsockname()
+        worker = InferenceWorker(
+            StubChatModel(latency_ms=options['inference_latency_ms']), address, settings.CHATBOT['AUTHKEY'],
+            max_batch_size=options['inference_batch_size'],
+        )
+        threading.Thread(target=worker.serve_forever, name='bench-inference-worker', daemon=True).start()
+        return worker
+
+    def create_fixtures(self, students, inference_address):
+        from core.models import Course, Quiz, QuizQuestion
+        from users.models import User
+        from users.serializers import CustomTokenObtainPairSerializer
+
+        lecturer = User.objects.create(email='bench-lecturer@example.com', user_type=User.UserType.LECTURER)
+        User.objects.bulk_create([
+            User(email=f'bench-student-{i}@example.com', user_type=User.UserType.STUDENT) for i in range(students)
+        ])
+        self.students = list(User.objects.filter(user_type=User.UserType.STUDENT).order_by('id'))
+        course = Course.objects.create(course_code='BENCH', name='Benchmark', lecturer=lecturer)
+        quiz = Quiz.objects.create(course=course, title='Benchmark quiz', marking_key={})
+        questions = QuizQuestion.objects.bulk_create([
+            QuizQuestion(
+                quiz=quiz, question_text=f'Question {i}: which option is correct?',
+                options=['first', 'second', 'third', 'fourth'], correct_option=i % 4, position=i,
+            )
+            for i in range(20)
+        ])
+        return {
+            'database': connection.settings_dict['NAME'],
+            'inference': inference_address,
+            'quiz': quiz.pk,
+            'questions': [question.pk for question in questions],
+            'access': [str(CustomTokenObtainPairSerializer.get_token(s).access_token) for s in self.students],
+            'refresh': [],
+        }
+
+    def refresh_tokens(self, count):
+        from users.serializers import CustomTokenObtainPairSerializer
+
+        return [str(CustomTokenObtainPairSerializer.get_token(self.students[i % len(self.students)])) for i in range(count)]
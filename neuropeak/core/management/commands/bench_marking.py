@@ -0,0 +1,77 @@
+import json
+import random
+from django.core.management.base import BaseCommand
+from core.benchmarks import throwaway_database
+from core.utils import usable_cores
+
+VOCABULARY = (
+    'plants convert light energy into chemical energy stored as glucose chlorophyll in the chloroplasts '
+    'absorbs red and blue light water is split releasing oxygen carbon dioxide is fixed in the calvin cycle '
+    'stomata regulate gas exchange temperature and light intensity limit the rate of the reaction enzymes '
+    'such as rubisco catalyse fixation the products feed respiration growth and the wider food chain'
+).split()
+
+RUBRIC = {"criteria": [
+    {"name": "Energy conversion", "points": 2, "keywords": ["light energy", "chemical energy", "glucose"], "min_matches": 2},
+    {"name": "Pigments", "points": 1, "keywords": ["chlorophyll", "chloroplast"]},
+    {"name": "Inputs and outputs", "points": 2, "keywords": ["water", "carbon dioxide", "oxygen"], "min_matches": 3},
+    {"name": "Calvin cycle", "points": 1, "keywords": ["calvin cycle", "rubisco"]},
+    {"name": "Limiting factors", "points": 1, "keywords": ["temperature", "light intensity", "limiting"]},
+]}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark a cohort of free-text submissions with different numbers of worker "
+        "processes and report throughput and speed-up over one worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=1000, help="Submissions in the cohort.")
+        parser.add_argument('--words', type=int, default=400, help="Words per submission.")
+        parser.add_argument('--workers', type=int, nargs='+', help="Worker counts to compare (default: 1 and all cores).")
+        parser.add_argument('--json', action='store_true', help="Print the results as a JSON list.")
+
+    def handle(self, *args, **options):
+        worker_counts = options['workers'] or sorted({1, usable_cores()})
+        with throwaway_database():
+            self.create_fixtures(options['submissions'], options['words'])
+            results = [self.run_benchmark(workers) for workers in worker_counts]
+
+        baseline = results[0]['per_second'] or 1
+        for r in results:
+            r['speedup'] = r['per_second'] / baseline
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(f"{usable_cores()} usable cores")
+        self.stdout.write(f"{'workers':>7} {'marked':>7} {'seconds':>8} {'subs/s':>8} {'speedup':>8}")
+        for r in results:
+            self.stdout.write(
+                f"{r['workers']:>7} {r['marked']:>7} {r['seconds']:>8.2f} {r['per_second']:>8.0f} {r['speedup']:>7.2f}x"
+            )
+
+    def create_fixtures(self, submissions, words):
+        from core.models import Assignment, AssignmentSubmission, Course
+        from users.models import User
+
+        lecturer = User.objects.create(email='bench-lecturer@example.com', user_type=User.UserType.LECTURER)
+        student = User.objects.create(email='bench-student@example.com', user_type=User.UserType.STUDENT)
+        course = Course.objects.create(course_code='BENCH', name='Benchmark', lecturer=lecturer)
+        assignment = Assignment.objects.create(course=course, title='Photosynthesis essay', marking_key=RUBRIC)
+        rng = random.Random(0)
+        AssignmentSubmission.objects.bulk_create([
+            AssignmentSubmission(
+                assignment=assignment, student=student,
+                answer_text=' '.join(rng.choice(VOCABULARY) for _ in range(words)),
+            )
+            for _ in range(submissions)
+        ], batch_size=500)
+
+    def run_benchmark(self, workers):
+        from core.marking_pipeline import mark_submissions
+        from core.models import AssignmentSubmission
+
+        AssignmentSubmission.objects.update(status=AssignmentSubmission.Status.PENDING, score=None, feedback=None)
+        report = mark_submissions(workers=workers)
+        return {'workers': workers, **report.as_dict()}
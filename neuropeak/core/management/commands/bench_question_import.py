@@ -0,0 +1,83 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from core.benchmarks import throwaway_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a question bank into a quiz: in one bulk request (JSON array or "
+        "JSON Lines) or one POST per question, and report time and queries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=200, help="Questions in the bank.")
+        parser.add_argument(
+            '--modes', nargs='+', default=['json', 'jsonl', 'single'], choices=['json', 'jsonl', 'single'],
+            help="json/jsonl: POST .../questions/bulk/; single: POST .../questions/ per question.",
+        )
+        parser.add_argument('--json', action='store_true', help="Print the results as a JSON list.")
+
+    def handle(self, *args, **options):
+        # Lets the test client's 'testserver' host through ALLOWED_HOSTS
+        setup_test_environment()
+        try:
+            with throwaway_database():
+                lecturer, course = self.create_fixtures()
+                results = [self.run_benchmark(mode, lecturer, course, options['questions']) for mode in options['modes']]
+        finally:
+            teardown_test_environment()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(f"{'mode':<7} {'questions':>9} {'requests':>9} {'queries':>8} {'seconds':>8}")
+        for r in results:
+            self.stdout.write(
+                f"{r['mode']:<7} {r['questions']:>9} {r['requests']:>9} {r['queries']:>8} {r['seconds']:>8.3f}"
+            )
+
+    def create_fixtures(self):
+        from core.models import Course
+        from users.models import User
+
+        lecturer = User.objects.create(email='bench-lecturer@example.com', user_type=User.UserType.LECTURER)
+        course = Course.objects.create(course_code='BENCH', name='Benchmark', lecturer=lecturer)
+        return lecturer, course
+
+    def run_benchmark(self, mode, lecturer, course, questions):
+        from rest_framework.test import APIClient
+        from core.models import Quiz
+
+        quiz = Quiz.objects.create(course=course, title=f'Benchmark quiz ({mode})', marking_key={})
+        bank = [
+            {'question_text': f'Question {i}: which option is correct?',
+             'options': ['first', 'second', 'third', 'fourth'], 'correct_option': i % 4}
+            for i in range(questions)
+        ]
+        url = f'/api/v1/test/quizzes/{quiz.pk}/questions/'
+        client = APIClient()
+        client.force_authenticate(lecturer)
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            if mode == 'json':
+                statuses = [client.post(url + 'bulk/', bank, format='json').status_code]
+            elif mode == 'jsonl':
+                body = ''.join(json.dumps(item) + '\n' for item in bank)
+                statuses = [client.post(url + 'bulk/', body, content_type='application/x-ndjson').status_code]
+            else:
+                statuses = [client.post(url, {**item, 'quiz': quiz.pk}, format='json').status_code for item in bank]
+            elapsed = time.perf_counter() - started
+
+        if any(status not in (200, 201) for status in statuses) or quiz.questions.count() != questions:
+            self.stderr.write(f"{mode}: import failed with statuses {sorted(set(statuses))}")
+        return {
+            'mode': mode,
+            'questions': questions,
+            'requests': len(statuses),
+            'queries': len(queries),
+            'seconds': elapsed,
+        }
@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from core.benchmarks import throwaway_database
+from core.utils import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate a class opening a quiz at the same moment: every client starts cold "
+        "together and fetches either the quiz bundle or the quiz plus its question list."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--opens', type=int, default=2000, help="Simultaneous quiz opens.")
+        parser.add_argument('--questions', type=int, default=30, help="Questions in the quiz.")
+        parser.add_argument(
+            '--modes', nargs='+', default=['bundle', 'separate'], choices=['bundle', 'separate'],
+            help="bundle: GET /quizzes/<pk>/bundle/; separate: GET /quizzes/<pk>/ and its questions.",
+        )
+        parser.add_argument('--json', action='store_true', help="Print the results as a JSON list.")
+
+    def handle(self, *args, **options):
+        # Thousands of threads each need a stack, but the request path is shallow
+        threading.stack_size(512 * 1024)
+        # Lets the test client's 'testserver' host through ALLOWED_HOSTS
+        setup_test_environment()
+        try:
+            with throwaway_database():
+                quiz, token = self.create_fixtures(options['questions'])
+                results = [self.run_benchmark(mode, quiz, token, options['opens']) for mode in options['modes']]
+        finally:
+            teardown_test_environment()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(
+            f"{'mode':<9} {'opens':>6} {'ok':>6} {'builds':>7} {'queries':>8} "
+            f"{'opens/s':>8} {'p50 ms':>8} {'p99 ms':>8}"
+        )
+        for r in results:
+            self.stdout.write(
+                f"{r['mode']:<9} {r['opens']:>6} {r['ok']:>6} {r['builds'] if r['builds'] is not None else '-':>7} {r['queries']:>8} "
+                f"{r['throughput']:>8.0f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f}"
+            )
+
+    def create_fixtures(self, questions):
+        from core.models import Course, Quiz, QuizQuestion
+        from users.models import User
+        from users.authentication import user_cache
+        from users.serializers import CustomTokenObtainPairSerializer
+
+        lecturer = User.objects.create(email='bench-lecturer@example.com', user_type=User.UserType.LECTURER)
+        student = User.objects.create(email='bench-student@example.com', user_type=User.UserType.STUDENT)
+        course = Course.objects.create(course_code='BENCH', name='Benchmark', lecturer=lecturer)
+        quiz = Quiz.objects.create(course=course, title='Benchmark quiz', marking_key={})
+        QuizQuestion.objects.bulk_create([
+            QuizQuestion(
+                quiz=quiz, question_text=f'Question {i}: which option is correct?',
+                options=['first', 'second', 'third', 'fourth'], correct_option=0,
+            )
+            for i in range(questions)
+        ])
+        # Creating the student marked it as changed in this process; a server would trust its token
+        user_cache.clear()
+        return quiz, str(CustomTokenObtainPairSerializer.get_token(student).access_token)
+
+    def run_benchmark(self, mode, quiz, token, opens):
+        from django.test import Client
+        from core.quiz_bundle import quiz_bundles
+
+        # Start cold: no cached versions, responses or bundles
+        caches['default'].clear()
+        quiz_bundles.clear()
+        if mode == 'bundle':
+            urls = [f'/api/v1/test/quizzes/{quiz.pk}/bundle/']
+        else:
+            urls = [f'/api/v1/test/quizzes/{quiz.pk}/', f'/api/v1/test/quizzes/{quiz.pk}/questions/']
+
+        samples = []
+        failures = [0]
+        queries = [0]
+        lock = threading.Lock()
+        barrier = threading.Barrier(opens + 1)
+
+        def count_query(execute, sql, params, many, context):
+            with lock:
+                queries[0] += 1
+            return execute(sql, params, many, context)
+
+        def student():
+            client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+            try:
+                with connection.execute_wrapper(count_query):
+                    barrier.wait()
+                    started = time.perf_counter()
+                    ok = all(client.get(url).status_code == 200 for url in urls)
+                    elapsed = time.perf_counter() - started
+                with lock:
+                    if ok:
+                        samples.append(elapsed)
+                    else:
+                        failures[0] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=student) for _ in range(opens)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            'mode': mode,
+            'opens': opens,
+            'ok': len(samples),
+            'failed': failures[0],
+            'builds': quiz_bundles.stats()['builds'] if mode == 'bundle' else None,
+            'queries': queries[0],
+            'seconds': elapsed,
+            'throughput': len(samples) / elapsed if elapsed else 0.0,
+            'p50_ms': (percentile(samples, 0.50) or 0) * 1000,
+            'p99_ms': (percentile(samples, 0.99) or 0) * 1000,
+        }
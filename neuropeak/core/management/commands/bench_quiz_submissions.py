@@ -0,0 +1,137 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from core.benchmarks import throwaway_database
+from core.utils import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent quiz-submission throughput against a throwaway test "
+        "database built with the active NEUROPEAK_DB_PROFILE, or compare profiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help="Concurrent submitters.")
+        parser.add_argument('--submissions', type=int, default=400, help="Total attempts to submit.")
+        parser.add_argument('--questions', type=int, default=20, help="Questions per quiz.")
+        parser.add_argument(
+            '--compare', nargs='+', metavar='PROFILE',
+            help="Run the benchmark once per database profile (e.g. sqlite sqlite-wal postgres) and tabulate.",
+        )
+        parser.add_argument('--json', action='store_true', help="Print the result as one JSON object.")
+
+    def handle(self, *args, **options):
+        if options['compare']:
+            return self.compare(options)
+
+        result = self.run_benchmark(options['threads'], options['submissions'], options['questions'])
+        if options['json']:
+            self.stdout.write(json.dumps(result))
+        else:
+            self.write_table([result])
+
+    def compare(self, options):
+        results = []
+        for profile in options['compare']:
+            command = [
+                sys.executable, sys.argv[0], 'bench_quiz_submissions', '--json',
+                '--threads', str(options['threads']),
+                '--submissions', str(options['submissions']),
+                '--questions', str(options['questions']),
+            ]
+            env = {**os.environ, 'NEUROPEAK_DB_PROFILE': profile}
+            proc = subprocess.run(command, env=env, capture_output=True, text=True)
+            if proc.returncode != 0:
+                self.stderr.write(f"{profile}: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'failed'}")
+                continue
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+        if not results:
+            raise CommandError("No profile completed the benchmark.")
+        self.write_table(results)
+
+    def write_table(self, results):
+        self.stdout.write(f"{'profile':<12} {'threads':>7} {'ok':>6} {'errors':>6} {'subs/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+        for r in results:
+            self.stdout.write(
+                f"{r['profile']:<12} {r['threads']:>7} {r['ok']:>6} {r['errors']:>6} "
+                f"{r['throughput']:>9.1f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}"
+            )
+
+    def run_benchmark(self, threads, submissions, questions):
+        with throwaway_database():
+            quiz, students, answers = self.create_fixtures(submissions, questions)
+            elapsed, samples, errors = self.submit_concurrently(quiz, students, answers, threads)
+
+        return {
+            'profile': settings.DB_PROFILE,
+            'threads': threads,
+            'ok': len(samples),
+            'errors': errors,
+            'seconds': elapsed,
+            'throughput': len(samples) / elapsed if elapsed else 0.0,
+            'p50_ms': (percentile(samples, 0.50) or 0) * 1000,
+            'p99_ms': (percentile(samples, 0.99) or 0) * 1000,
+        }
+
+    def create_fixtures(self, submissions, questions):
+        from core.models import Course, Quiz, QuizQuestion
+        from users.models import User
+
+        lecturer = User.objects.create(email='bench-lecturer@example.com', user_type=User.UserType.LECTURER)
+        course = Course.objects.create(course_code='BENCH', name='Benchmark', lecturer=lecturer)
+        quiz = Quiz.objects.create(course=course, title='Benchmark quiz', marking_key={})
+        QuizQuestion.objects.bulk_create([
+            QuizQuestion(quiz=quiz, question_text=f'Question {i}', options=['yes', 'no'], correct_option=0)
+            for i in range(questions)
+        ])
+        # bulk_create skips password hashing and profile signals, neither of which is measured here
+        User.objects.bulk_create([
+            User(email=f'bench-student-{i}@example.com', user_type=User.UserType.STUDENT)
+            for i in range(submissions)
+        ])
+        students = list(User.objects.filter(user_type=User.UserType.STUDENT).order_by('id'))
+        answers = {qid: ('A' if qid % 2 else 'B') for qid in quiz.questions.values_list('id', flat=True)}
+        return quiz, students, answers
+
+    def submit_concurrently(self, quiz, students, answers, threads):
+        from core.grading import grade_attempt
+
+        samples = []
+        errors = [0]
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads + 1)
+
+        def submitter(chunk):
+            try:
+                barrier.wait()
+                for student in chunk:
+                    started = time.perf_counter()
+                    try:
+                        grade_attempt(quiz, student, answers)
+                    except DatabaseError:
+                        with lock:
+                            errors[0] += 1
+                        continue
+                    with lock:
+                        samples.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=submitter, args=(students[i::threads],))
+            for i in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for worker in workers:
+            worker.join()
+        return time.perf_counter() - started, samples, errors[0]
@@ -0,0 +1,90 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from apis.fastpath import compile_row_plan
+from apis.renderers import FastJSONRenderer
+from core.benchmarks import throwaway_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare objects/sec for listing quiz questions and student profiles through "
+        "DRF ModelSerializers and JSONRenderer versus values() row plans and FastJSONRenderer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--objects', type=int, default=2000, help="Rows per listing.")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per path; the best is reported.")
+        parser.add_argument('--json', action='store_true', help="Print the results as a JSON list.")
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            targets = self.create_fixtures(options['objects'])
+            results = []
+            for name, queryset, serializer_class in targets:
+                drf = self.measure(options['repeat'], lambda: JSONRenderer().render(
+                    serializer_class(queryset.all(), many=True).data
+                ))
+                plan = compile_row_plan(serializer_class())
+                fast = self.measure(options['repeat'], lambda: FastJSONRenderer().render(
+                    plan.serialize(queryset.all())
+                ))
+                results.append({
+                    'listing': name,
+                    'objects': options['objects'],
+                    'drf_per_sec': options['objects'] / drf,
+                    'fast_per_sec': options['objects'] / fast,
+                    'speedup': drf / fast,
+                })
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(f"{'listing':<16} {'objects':>8} {'DRF obj/s':>11} {'fast obj/s':>11} {'speedup':>8}")
+        for r in results:
+            self.stdout.write(
+                f"{r['listing']:<16} {r['objects']:>8} {r['drf_per_sec']:>11.0f} "
+                f"{r['fast_per_sec']:>11.0f} {r['speedup']:>7.1f}x"
+            )
+
+    def measure(self, repeat, render):
+        render()  # warm up querysets, field construction and imports
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            render()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def create_fixtures(self, count):
+        from core.models import Course, Quiz, QuizQuestion
+        from core.serializers import QuizQuestionSerializer
+        from users.models import StudentProfile, User
+        from users.serializers import StudentProfileSerializer
+
+        lecturer = User.objects.create(email='bench-lecturer@example.com', user_type=User.UserType.LECTURER)
+        course = Course.objects.create(course_code='BENCH', name='Benchmark', lecturer=lecturer)
+        quiz = Quiz.objects.create(course=course, title='Benchmark quiz', marking_key={})
+        QuizQuestion.objects.bulk_create([
+            QuizQuestion(
+                quiz=quiz, question_text=f'Question {i}: which option is correct?',
+                options=['first', 'second', 'third', 'fourth'], correct_option=0,
+            )
+            for i in range(count)
+        ])
+        # bulk_create skips the profile signal, so the profiles are created explicitly
+        students = User.objects.bulk_create([
+            User(email=f'bench-student-{i}@example.com', first_name='Bench', last_name=f'Student {i}',
+                 user_type=User.UserType.STUDENT)
+            for i in range(count)
+        ])
+        StudentProfile.objects.bulk_create([
+            StudentProfile(user=student, program='Computer Science', year_of_study=1 + i % 4)
+            for i, student in enumerate(students)
+        ])
+        return [
+            ('quiz questions', QuizQuestion.objects.filter(quiz=quiz).order_by('id'), QuizQuestionSerializer),
+            ('student profiles', StudentProfile.objects.select_related('user').order_by('id'), StudentProfileSerializer),
+        ]
@@ -0,0 +1,15 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from core.inference import InferenceUnavailable
+from core.inference.client import worker_stats
+
+
+class Command(BaseCommand):
+    help = "Print queue depth, batch size and latency metrics from the running inference worker."
+
+    def handle(self, *args, **options):
+        try:
+            stats = worker_stats()
+        except InferenceUnavailable as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(json.dumps(stats, indent=2))
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core.marking_pipeline import mark_submissions, requeue
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark pending assignment submissions against their marking keys. Progress is "
+        "committed chunk by chunk, so an interrupted run can simply be started again."
+    )
+
+    def add_arguments(self, parser):
+        config = getattr(settings, 'MARKING', {})
+        parser.add_argument('--assignment', type=int, help="Only mark submissions of this assignment.")
+        parser.add_argument('--workers', type=int, default=config.get('WORKERS'),
+                            help="Marking processes (default: one per usable core).")
+        parser.add_argument('--chunk-size', type=int, default=config.get('CHUNK_SIZE', 50),
+                            help="Submissions claimed and committed together.")
+        parser.add_argument('--lease', type=int, default=config.get('LEASE_SECONDS', 600),
+                            help="Seconds after which another run's claims are taken back.")
+        parser.add_argument('--limit', type=int, help="Stop after marking this many submissions.")
+        parser.add_argument('--requeue', action='store_true',
+                            help="Mark every submission of --assignment again, e.g. after its rubric changed.")
+
+    def handle(self, *args, **options):
+        if options['requeue']:
+            if options['assignment'] is None:
+                raise CommandError("--requeue needs --assignment.")
+            self.stdout.write(f"Requeued {requeue(options['assignment'])} submissions.")
+
+        try:
+            report = mark_submissions(
+                assignment_id=options['assignment'],
+                workers=options['workers'],
+                chunk_size=options['chunk_size'],
+                lease=options['lease'],
+                limit=options['limit'],
+            )
+        except KeyboardInterrupt:
+            self.stderr.write("Interrupted; marked submissions are saved and the rest are back in the queue.")
+            return
+        r = report.as_dict()
+        self.stdout.write(
+            f"Marked {r['marked']} submissions, {r['failed']} failed, "
+            f"in {r['seconds']:.1f}s ({r['per_second']:.0f}/s)."
+        )
+        if r['lost']:
+            self.stderr.write(f"{r['lost']} submissions were claimed by another marker before their marks were saved.")
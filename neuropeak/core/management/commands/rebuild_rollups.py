@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from core.rollups import compute_rollups, find_mismatches, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the quiz and course/student score rollups from raw quiz attempts and verify them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Only compare the stored rollups with the raw attempts; do not rewrite them.",
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            mismatches = find_mismatches()
+        else:
+            with transaction.atomic():
+                expected = compute_rollups()
+                count = rebuild_rollups(expected)
+                mismatches = find_mismatches(expected)
+            self.stdout.write(f"Rebuilt {count} rollups.")
+
+        if mismatches:
+            for line in mismatches:
+                self.stderr.write(line)
+            raise CommandError(f"{len(mismatches)} rollup mismatches found.")
+        self.stdout.write(self.style.SUCCESS("Rollups match the raw quiz attempts."))
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.inference.worker import InferenceWorker
+
+
+class Command(BaseCommand):
+    help = "Load the chatbot model once and serve inference requests from the web workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', help="Override CHATBOT['MODEL'], e.g. 'stub' for offline use.")
+        parser.add_argument('--max-batch-size', type=int, help="Override CHATBOT['MAX_BATCH_SIZE'].")
+        parser.add_argument('--batch-window-ms', type=int, help="Override CHATBOT['BATCH_WINDOW_MS'].")
+
+    def handle(self, *args, **options):
+        config = dict(settings.CHATBOT)
+        if options['model']:
+            config['MODEL'] = options['model']
+        if options['max_batch_size']:
+            config['MAX_BATCH_SIZE'] = options['max_batch_size']
+        if options['batch_window_ms'] is not None:
+            config['BATCH_WINDOW_MS'] = options['batch_window_ms']
+        worker = InferenceWorker.from_settings(config)
+        host, port = worker.address
+        self.stdout.write(f"Serving {worker.model.name} on {host}:{port}")
+        try:
+            worker.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,159 @@
+"""
+Rubric matching for free-text assignment submissions.
+
+An assignment's marking_key is compiled once into weighted criteria, each
+evidenced by key phrases. A submission earns a criterion's points when it
+contains at least `min_matches` of its phrases (partial credit below that),
+after lower-casing and light suffix stripping, so 'reflected light'
+matches 'reflects light'. Accepted marking keys:
+
+    {"criteria": [{"name": "Light reactions", "points": 2,
+                   "keywords": ["chlorophyll", "light energy"], "min_matches": 1}]}
+    {"Light reactions": ["chlorophyll", "light energy"], ...}
+    "Free text, one criterion per line or ';'-separated item"
+
+This module must not import Django at import time: spawned marker
+processes unpickle init_worker before Django is configured.
+"""
+import json
+import math
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+Criterion = namedtuple('Criterion', ['name', 'points', 'keywords', 'phrases', 'min_matches'])
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+_SUFFIXES = ('ising', 'izing', 'ation', 'ing', 'ies', 'es', 'ed', 's')
+_STOPWORDS = frozenset(
+    'a an and are as at be by for from has have in into is it its of on or that the their this to was '
+    'were which with should must will would can could students student answer explain describe'.split()
+)
+
+
+@lru_cache(maxsize=65536)
+def _stem(token):
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text):
+    return [_stem(token) for token in _TOKEN.findall(str(text).lower())]
+
+
+def _criterion(name, keywords, points=1, min_matches=1):
+    keywords = [str(keyword) for keyword in keywords if str(keyword).strip()]
+    phrases = tuple(tuple(tokenize(keyword)) for keyword in keywords)
+    keywords = [keyword for keyword, phrase in zip(keywords, phrases) if phrase]
+    phrases = tuple(phrase for phrase in phrases if phrase)
+    if not phrases:
+        raise ValueError(f"Criterion {name!r} has no keywords.")
+    points = float(points)
+    if points <= 0:
+        raise ValueError(f"Criterion {name!r} must be worth more than 0 points.")
+    return Criterion(str(name), points, tuple(keywords), phrases, max(1, min(int(min_matches), len(phrases))))
+
+
+def _free_text_criteria(text):
+    criteria = []
+    for item in re.split(r'[\n;]+', text):
+        words = [word for word in re.findall(r'[A-Za-z0-9]+', item) if word.lower() not in _STOPWORDS and len(word) > 2]
+        if words:
+            # A free-text item is met when it shares at least half of its content words
+            criteria.append(_criterion(item.strip(), words, min_matches=math.ceil(len(words) / 2)))
+    return criteria
+
+
+def compile_rubric(marking_key):
+    """Compile a marking key (already parsed from JSON) into a tuple of Criterion; ValueError if unusable."""
+    if isinstance(marking_key, str):
+        criteria = _free_text_criteria(marking_key)
+    elif isinstance(marking_key, dict) and 'criteria' in marking_key:
+        criteria = [
+            _criterion(
+                item.get('name', f'Criterion {number}'),
+                item.get('keywords', []),
+                item.get('points', 1),
+                item.get('min_matches', 1),
+            )
+            for number, item in enumerate(marking_key['criteria'], start=1)
+        ]
+    elif isinstance(marking_key, dict):
+        criteria = []
+        for name, value in marking_key.items():
+            if isinstance(value, dict):
+                criteria.append(_criterion(name, value.get('keywords', []), value.get('points', 1), value.get('min_matches', 1)))
+            elif isinstance(value, str):
+                criteria.append(_criterion(name, re.split(r'\s*[,;]\s*', value)))
+            else:
+                criteria.append(_criterion(name, value or []))
+    else:
+        raise ValueError("The marking key must be an object or text.")
+    if not criteria:
+        raise ValueError("The marking key has no criteria.")
+    return tuple(criteria)
+
+
+def _ngrams(tokens, lengths):
+    grams = set()
+    for n in lengths:
+        grams.update(tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+    return grams
+
+
+def mark(rubric, text):
+    """Score text against a compiled rubric: (score between 0 and 1, feedback dict)."""
+    lengths = {len(phrase) for criterion in rubric for phrase in criterion.phrases}
+    grams = _ngrams(tokenize(text), lengths)
+
+    total = awarded_total = 0.0
+    results = []
+    for criterion in rubric:
+        matched = [keyword for keyword, phrase in zip(criterion.keywords, criterion.phrases) if phrase in grams]
+        awarded = criterion.points * min(1.0, len(matched) / criterion.min_matches)
+        total += criterion.points
+        awarded_total += awarded
+        result = {"criterion": criterion.name, "points": criterion.points, "awarded": round(awarded, 2), "matched": matched}
+        if awarded < criterion.points:
+            result["missing"] = [keyword for keyword in criterion.keywords if keyword not in matched]
+        results.append(result)
+    return awarded_total / total, {"criteria": results, "points": round(awarded_total, 2), "max_points": total}
+
+
+def init_worker(database_name):
+    """Configure Django in a spawned marker process, on the same database as its parent."""
+    import django
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = database_name
+    django.setup()
+
+
+@lru_cache(maxsize=64)
+def _cached_rubric(marking_key_json):
+    return compile_rubric(json.loads(marking_key_json))
+
+
+def mark_batch(marking_key_json, submissions):
+    """
+    Worker entry point: mark [(id, text), ...] against one assignment's
+    marking key, given as JSON text so each worker compiles it only once.
+    Returns [(id, score, feedback)], with a None score and an "error" in
+    the feedback for submissions that could not be marked.
+    """
+    try:
+        rubric = _cached_rubric(marking_key_json)
+    except (AttributeError, TypeError, ValueError) as exc:
+        return [(pk, None, {"error": f"Unusable marking key: {exc}"}) for pk, _ in submissions]
+
+    results = []
+    for pk, text in submissions:
+        try:
+            score, feedback = mark(rubric, text or '')
+        except Exception as exc:
+            results.append((pk, None, {"error": str(exc)}))
+        else:
+            results.append((pk, score, feedback))
+    return results
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_chatmessage_user_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='quizanswer',
+            index=models.Index(fields=['question', 'is_correct'], name='answer_question_correct_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizanswer',
+            index=models.Index(condition=models.Q(('is_correct', False)), fields=['question'], name='answer_question_wrong_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['quiz', 'student', 'attempted_at'], name='attempt_quiz_student_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['student', 'attempted_at'], name='attempt_student_at_idx'),
+        ),
+    ]
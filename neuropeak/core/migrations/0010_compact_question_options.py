@@ -0,0 +1,119 @@
+from django.db import migrations, models
+
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+BATCH_SIZE = 2000
+
+
+def _batches(queryset):
+    # Range scans by primary key: SQLite cannot safely write to a table while iterating it
+    last = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last).order_by('pk')[:BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1].pk
+
+
+def _encode(question):
+    """(options, correct_option) for a row stored with option_a..option_d and correct_answer."""
+    columns = [question.option_a, question.option_b, question.option_c, question.option_d]
+    while columns and not columns[-1]:
+        columns.pop()
+    options = [text or '' for text in columns]
+    if not options and question.question_type == 'TF':
+        options = ['True', 'False']
+
+    answer = (question.correct_answer or '').strip().lower()
+    if len(answer) == 1 and answer in LETTERS and LETTERS.index(answer) < len(options):
+        return options, LETTERS.index(answer)
+    for index, text in enumerate(options):
+        if text.strip().lower() == answer:
+            return options, index
+    return options, None
+
+
+def encode_options(apps, schema_editor):
+    QuizQuestion = apps.get_model('core', 'QuizQuestion')
+    unmapped = []
+    for batch in _batches(QuizQuestion.objects.all()):
+        for question in batch:
+            question.options, question.correct_option = _encode(question)
+            if question.correct_option is None:
+                unmapped.append(question.pk)
+        QuizQuestion.objects.bulk_update(batch, ['options', 'correct_option'])
+    if unmapped:
+        raise RuntimeError(
+            f"correct_answer matches none of the options of questions {unmapped[:50]}; "
+            "correct them and run the migration again."
+        )
+
+
+def decode_options(apps, schema_editor):
+    QuizQuestion = apps.get_model('core', 'QuizQuestion')
+    for batch in _batches(QuizQuestion.objects.all()):
+        for question in batch:
+            if len(question.options) > 4:
+                raise RuntimeError(f"Question {question.pk} has more than four options.")
+            columns = question.options + [None] * (4 - len(question.options))
+            question.option_a, question.option_b, question.option_c, question.option_d = columns
+            text = question.options[question.correct_option]
+            if question.question_type == 'TF' and len(text) <= 10:
+                question.correct_answer = text
+            else:
+                question.correct_answer = LETTERS[question.correct_option].upper()
+        QuizQuestion.objects.bulk_update(
+            batch, ['option_a', 'option_b', 'option_c', 'option_d', 'correct_answer']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_resource_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizquestion',
+            name='options',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='quizquestion',
+            name='correct_option',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        # Nullable so that reversing can re-add it to a populated table and then fill it
+        migrations.AlterField(
+            model_name='quizquestion',
+            name='correct_answer',
+            field=models.CharField(max_length=10, null=True),
+        ),
+        migrations.RunPython(encode_options, decode_options),
+        migrations.RemoveField(
+            model_name='quizquestion',
+            name='option_a',
+        ),
+        migrations.RemoveField(
+            model_name='quizquestion',
+            name='option_b',
+        ),
+        migrations.RemoveField(
+            model_name='quizquestion',
+            name='option_c',
+        ),
+        migrations.RemoveField(
+            model_name='quizquestion',
+            name='option_d',
+        ),
+        migrations.RemoveField(
+            model_name='quizquestion',
+            name='correct_answer',
+        ),
+        migrations.AlterField(
+            model_name='quizquestion',
+            name='correct_option',
+            field=models.PositiveSmallIntegerField(),
+        ),
+    ]
@@ -0,0 +1,96 @@
+import json
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+MODELS = ('quiz', 'assignment')
+
+
+def _batches(queryset):
+    last = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last).order_by('pk')[:BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1].pk
+
+
+def parse_marking_keys(apps, schema_editor):
+    for name in MODELS:
+        model = apps.get_model('core', name)
+        for batch in _batches(model.objects.all()):
+            for row in batch:
+                try:
+                    row.marking_key_json = json.loads(row.marking_key)
+                except (TypeError, ValueError):
+                    # Free-text rubrics are kept as a JSON string
+                    row.marking_key_json = row.marking_key
+            model.objects.bulk_update(batch, ['marking_key_json'])
+
+
+def dump_marking_keys(apps, schema_editor):
+    for name in MODELS:
+        model = apps.get_model('core', name)
+        for batch in _batches(model.objects.all()):
+            for row in batch:
+                value = row.marking_key_json
+                row.marking_key = value if isinstance(value, str) else json.dumps(value)
+            model.objects.bulk_update(batch, ['marking_key'])
+
+
+class Migration(migrations.Migration):
+    """
+    Parse the marking keys once, here, instead of on every read. The data
+    is copied through a new column because PostgreSQL cannot cast free-text
+    rubrics to jsonb in place.
+    """
+
+    dependencies = [
+        ('core', '0010_compact_question_options'),
+    ]
+
+    operations = [
+        *[
+            migrations.AddField(
+                model_name=name,
+                name='marking_key_json',
+                field=models.JSONField(null=True),
+            )
+            for name in MODELS
+        ],
+        # Nullable so that reversing can re-add it to a populated table and then fill it
+        *[
+            migrations.AlterField(
+                model_name=name,
+                name='marking_key',
+                field=models.TextField(null=True),
+            )
+            for name in MODELS
+        ],
+        migrations.RunPython(parse_marking_keys, dump_marking_keys),
+        *[
+            migrations.RemoveField(
+                model_name=name,
+                name='marking_key',
+            )
+            for name in MODELS
+        ],
+        *[
+            migrations.RenameField(
+                model_name=name,
+                old_name='marking_key_json',
+                new_name='marking_key',
+            )
+            for name in MODELS
+        ],
+        migrations.AlterField(
+            model_name='quiz',
+            name='marking_key',
+            field=models.JSONField(help_text='Marking key or rubric for the quiz.'),
+        ),
+        migrations.AlterField(
+            model_name='assignment',
+            name='marking_key',
+            field=models.JSONField(help_text='Marking key or rubric for the assignment.'),
+        ),
+    ]
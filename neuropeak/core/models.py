@@ -1,7 +1,35 @@
 from django.db import models
+from django.utils import timezone
 from users.models import User
 
-class Course(models.Model):
+class Versioned(models.Model):
+    """
+    Row version for HTTP validators: `version` is incremented in the database
+    on every save(). QuerySet.update() and bulk_update() bypass it; call
+    bump_version() after using them.
+    """
+    version = models.PositiveIntegerField(default=1, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        bump = not self._state.adding and self.pk is not None
+        if bump:
+            # An F() expression so concurrent saves cannot both write the same version
+            self.version = models.F('version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version', 'updated_at'}
+        super().save(*args, **kwargs)
+        if bump:
+            self.refresh_from_db(fields=['version'])
+
+    @classmethod
+    def bump_version(cls, pk):
+        cls.objects.filter(pk=pk).update(version=models.F('version') + 1, updated_at=timezone.now())
+
+class Course(Versioned):
     course_code = models.CharField(max_length=10, unique=True)
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
@@ -15,17 +43,46 @@ class Assignment(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='assignments')
     title = models.CharField(max_length=100)
     description = models.TextField(blank=True)
-    marking_key = models.TextField(help_text="Marking key or rubric for the assignment.")
+    marking_key = models.JSONField(help_text="Marking key or rubric for the assignment.")
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return self.title
 
-class Quiz(models.Model):
+class AssignmentSubmission(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        MARKING = 'MARKING', 'Marking'
+        MARKED = 'MARKED', 'Marked'
+        FAILED = 'FAILED', 'Failed'
+
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='submissions')
+    student = models.ForeignKey('users.User', on_delete=models.CASCADE, limit_choices_to={'user_type': 'STUDENT'})
+    answer_text = models.TextField()
+    submitted_at = models.DateTimeField(auto_now_add=True)
+    # The marking queue: PENDING -> MARKING (by the marker claimed_by, at claimed_at) -> MARKED or FAILED
+    status = models.CharField(max_length=7, choices=Status.choices, default=Status.PENDING)
+    claimed_by = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    score = models.FloatField(null=True, blank=True)
+    feedback = models.JSONField(null=True, blank=True)
+    marked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Claiming the oldest pending submissions
+            models.Index(fields=['status', 'id'], name='submission_status_idx'),
+            models.Index(fields=['assignment', 'student'], name='submission_assign_student_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student} - {self.assignment}"
+
+class Quiz(Versioned):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='quizzes')
     title = models.CharField(max_length=100)
     description = models.TextField(blank=True)
-    marking_key = models.TextField(help_text="Marking key or rubric for the quiz.")
+    marking_key = models.JSONField(help_text="Marking key or rubric for the quiz.")
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -37,6 +94,11 @@ class ChatMessage(models.Model):
     bot_reply = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='chatmessage_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.email}: {self.user_message[:30]}"
 
@@ -48,11 +110,17 @@ class QuizQuestion(models.Model):
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='questions')
     question_text = models.TextField()
     question_type = models.CharField(max_length=3, choices=QUESTION_TYPE_CHOICES, default='MCQ')
-    option_a = models.CharField(max_length=255, blank=True, null=True)
-    option_b = models.CharField(max_length=255, blank=True, null=True)
-    option_c = models.CharField(max_length=255, blank=True, null=True)
-    option_d = models.CharField(max_length=255, blank=True, null=True)
-    correct_answer = models.CharField(max_length=10)  # e.g., 'A', 'B', 'C', 'D', 'True', 'False'
+    # Option texts in display order, e.g. ["True", "False"]; correct_option indexes
+    # into them (0 is option A)
+    options = models.JSONField(default=list)
+    correct_option = models.PositiveSmallIntegerField()
+    # Display order within the quiz; ties fall back to creation order
+    position = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['quiz', 'position', 'id'], name='question_quiz_position_idx'),
+        ]
 
     def __str__(self):
         return self.question_text
@@ -63,8 +131,86 @@ class QuizAttempt(models.Model):
     score = models.FloatField()
     attempted_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # A student's attempts at a quiz, newest first
+            models.Index(fields=['quiz', 'student', 'attempted_at'], name='attempt_quiz_student_at_idx'),
+            # "My attempts" listings
+            models.Index(fields=['student', 'attempted_at'], name='attempt_student_at_idx'),
+        ]
+
 class QuizAnswer(models.Model):
     attempt = models.ForeignKey(QuizAttempt, on_delete=models.CASCADE, related_name='answers')
     question = models.ForeignKey(QuizQuestion, on_delete=models.CASCADE)
     student_answer = models.TextField()
-    is_correct = models.BooleanField()
\ No newline at end of file
+    is_correct = models.BooleanField()
+
+    class Meta:
+        indexes = [
+            # Per-question correctness counts
+            models.Index(fields=['question', 'is_correct'], name='answer_question_correct_idx'),
+            # Most-missed questions only ever look at wrong answers
+            models.Index(fields=['question'], condition=models.Q(is_correct=False), name='answer_question_wrong_idx'),
+        ]
+
+class ScoreRollup(models.Model):
+    """Running score statistics, updated incrementally as attempts are graded."""
+    HISTOGRAM_BUCKETS = 10
+
+    attempts = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+    score_sum_sq = models.FloatField(default=0)
+    min_score = models.FloatField(null=True, blank=True)
+    max_score = models.FloatField(null=True, blank=True)
+    latest_score = models.FloatField(null=True, blank=True)
+    latest_at = models.DateTimeField(null=True, blank=True)
+    histogram = models.JSONField(default=list)  # attempt counts per score decile
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def bucket(cls, score):
+        return min(max(int(score * cls.HISTOGRAM_BUCKETS), 0), cls.HISTOGRAM_BUCKETS - 1)
+
+    def add_score(self, score, attempted_at):
+        self.attempts += 1
+        self.score_sum += score
+        self.score_sum_sq += score * score
+        self.min_score = score if self.min_score is None else min(self.min_score, score)
+        self.max_score = score if self.max_score is None else max(self.max_score, score)
+        if self.latest_at is None or attempted_at >= self.latest_at:
+            self.latest_score = score
+            self.latest_at = attempted_at
+        if len(self.histogram) != self.HISTOGRAM_BUCKETS:
+            self.histogram = [0] * self.HISTOGRAM_BUCKETS
+        self.histogram[self.bucket(score)] += 1
+
+    @property
+    def mean(self):
+        return self.score_sum / self.attempts if self.attempts else None
+
+    @property
+    def stddev(self):
+        if not self.attempts:
+            return None
+        variance = self.score_sum_sq / self.attempts - self.mean ** 2
+        return max(variance, 0) ** 0.5
+
+class QuizScoreRollup(ScoreRollup):
+    quiz = models.OneToOneField(Quiz, on_delete=models.CASCADE, related_name='rollup')
+
+    def __str__(self):
+        return f"{self.quiz}: {self.attempts} attempts"
+
+class CourseStudentRollup(ScoreRollup):
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='student_rollups')
+    student = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='course_rollups')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'student'], name='unique_course_student_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.course} / {self.student}: {self.attempts} attempts"
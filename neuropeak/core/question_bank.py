@@ -0,0 +1,101 @@
+"""
+Bulk authoring of a quiz's questions.
+
+Every operation takes input that was validated as a whole, then writes it
+in one transaction with batched queries and bumps the quiz version once,
+so cached quizzes, bundles and answer keys are rebuilt once per edit
+rather than once per question.
+"""
+from django.db import transaction
+from django.db.models import Max
+from django.shortcuts import get_object_or_404
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+from .http_cache import batched_question_edits
+from .models import Quiz, QuizQuestion
+
+BATCH_SIZE = 500
+UPSERT_FIELDS = ['question_text', 'question_type', 'options', 'correct_option', 'position']
+
+
+def _lock_quiz(quiz_id):
+    # Serializes concurrent bulk edits of one quiz; SQLite locks the whole database anyway
+    get_object_or_404(Quiz.objects.select_for_update().only('id'), pk=quiz_id)
+
+
+def next_position(quiz_id):
+    """The position after the quiz's last question."""
+    last = QuizQuestion.objects.filter(quiz_id=quiz_id).aggregate(last=Max('position'))['last']
+    return 0 if last is None else last + 1
+
+
+def upsert_questions(quiz_id, items):
+    """
+    Create or replace questions from validated bulk items. Items with an id
+    must already belong to the quiz and keep their position unless they give
+    one; new items without a position are appended in input order.
+    Returns (questions, created, updated).
+    """
+    with transaction.atomic():
+        _lock_quiz(quiz_id)
+        positions = dict(QuizQuestion.objects.filter(quiz_id=quiz_id).values_list('id', 'position'))
+        foreign = sorted({item['id'] for item in items if 'id' in item} - set(positions))
+        if foreign:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [f"Questions {foreign} do not belong to quiz {quiz_id}."]
+            })
+
+        position = max(positions.values(), default=-1) + 1
+        questions = []
+        for item in items:
+            item = dict(item)
+            if 'position' not in item and 'id' in item:
+                item['position'] = positions[item['id']]
+            elif 'position' not in item:
+                item['position'] = position
+                position += 1
+            questions.append(QuizQuestion(quiz_id=quiz_id, **item))
+
+        with batched_question_edits(quiz_id):
+            QuizQuestion.objects.bulk_create(
+                questions,
+                batch_size=BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['id'],
+                update_fields=UPSERT_FIELDS,
+            )
+
+    updated = sum(1 for item in items if 'id' in item)
+    return questions, len(items) - updated, updated
+
+
+def delete_questions(quiz_id, ids):
+    """Delete the given questions of the quiz, with their answers; all must belong to it."""
+    with transaction.atomic():
+        _lock_quiz(quiz_id)
+        questions = QuizQuestion.objects.filter(quiz_id=quiz_id, pk__in=ids)
+        foreign = sorted(set(ids) - set(questions.values_list('id', flat=True)))
+        if foreign:
+            raise serializers.ValidationError({"ids": f"Questions {foreign} do not belong to quiz {quiz_id}."})
+        with batched_question_edits(quiz_id):
+            questions.delete()
+    return len(ids)
+
+
+def reorder_questions(quiz_id, ids):
+    """Renumber the quiz's questions in the given order, which must list every one of them."""
+    with transaction.atomic():
+        _lock_quiz(quiz_id)
+        existing = set(QuizQuestion.objects.filter(quiz_id=quiz_id).values_list('id', flat=True))
+        if set(ids) != existing:
+            raise serializers.ValidationError({
+                "ids": f"Must list every question of quiz {quiz_id} exactly once; "
+                       f"missing {sorted(existing - set(ids))}, unknown {sorted(set(ids) - existing)}."
+            })
+        with batched_question_edits(quiz_id):
+            QuizQuestion.objects.bulk_update(
+                [QuizQuestion(pk=qid, position=position) for position, qid in enumerate(ids)],
+                ['position'],
+                batch_size=BATCH_SIZE,
+            )
+    return len(ids)
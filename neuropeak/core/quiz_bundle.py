@@ -0,0 +1,132 @@
+"""
+Pre-rendered quiz bundles for exam start.
+
+A bundle is the JSON a student needs to sit a quiz: the quiz and all of
+its questions, without correct answers or the marking key. It is built
+once per quiz version and kept as immutable bytes in a per-process LRU.
+Concurrent cold misses for the same version are coalesced (single flight):
+one request builds while the others wait for its result, so a class
+opening a quiz together costs one build per process instead of one per
+student.
+"""
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.http import Http404
+from apis.renderers import FastJSONRenderer
+from .http_cache import aresource_version, resource_version
+from .models import Quiz, QuizQuestion
+from .single_flight import AsyncSingleFlight, SingleFlight
+
+QUIZ_FIELDS = ('id', 'course_id', 'title', 'description', 'version', 'updated_at')
+QUESTION_FIELDS = ('id', 'question_text', 'question_type', 'options')
+
+
+def _questions(quiz_id):
+    return QuizQuestion.objects.filter(quiz_id=quiz_id).order_by('position', 'id').values(*QUESTION_FIELDS)
+
+
+def _quiz(quiz_id):
+    return Quiz.objects.filter(pk=quiz_id).values(*QUIZ_FIELDS)
+
+
+def _render(quiz, questions):
+    quiz['course'] = quiz.pop('course_id')
+    quiz['questions'] = questions
+    return quiz['version'], FastJSONRenderer().render(quiz)
+
+
+def build_bundle(quiz_id):
+    """Return (version, JSON bytes) for the quiz as currently stored; two queries."""
+    quiz = _quiz(quiz_id).first()
+    if quiz is None:
+        raise Http404("No Quiz matches the given query.")
+    return _render(quiz, list(_questions(quiz_id)))
+
+
+async def abuild_bundle(quiz_id):
+    """build_bundle() with the async ORM."""
+    quiz = await _quiz(quiz_id).afirst()
+    if quiz is None:
+        raise Http404("No Quiz matches the given query.")
+    return _render(quiz, [question async for question in _questions(quiz_id)])
+
+
+class QuizBundleCache:
+    def __init__(self, max_quizzes=256):
+        self.max_quizzes = max_quizzes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # quiz_id -> (version, body)
+        self.flights = SingleFlight()  # keyed by (quiz_id, version)
+        self.async_flights = AsyncSingleFlight()
+        self.hits = 0
+        self.builds = 0
+        self.coalesced = 0
+
+    def get(self, quiz_id):
+        """Return (version, body) for the quiz's current version, building it at most once."""
+        version = self._version(resource_version(Quiz, quiz_id))
+        entry = self._cached(quiz_id, version)
+        if entry is None:
+            entry, shared = self.flights.do((quiz_id, version), lambda: self._store(quiz_id, build_bundle(quiz_id)))
+            self._count_shared(shared)
+        return entry
+
+    async def aget(self, quiz_id, current=None):
+        """get() for async views; `current` is the quiz's (version, updated_at) if already known."""
+        version = self._version(current or await aresource_version(Quiz, quiz_id))
+        entry = self._cached(quiz_id, version)
+        if entry is None:
+            async def build():
+                return self._store(quiz_id, await abuild_bundle(quiz_id))
+            entry, shared = await self.async_flights.do((quiz_id, version), build)
+            self._count_shared(shared)
+        return entry
+
+    def _version(self, current):
+        if current is None:
+            raise Http404("No Quiz matches the given query.")
+        return current[0]
+
+    def _cached(self, quiz_id, version):
+        with self.lock:
+            entry = self.entries.get(quiz_id)
+            if entry is not None and entry[0] >= version:
+                self.entries.move_to_end(quiz_id)
+                self.hits += 1
+                return entry
+        return None
+
+    def _count_shared(self, shared):
+        if shared:
+            with self.lock:
+                self.coalesced += 1
+
+    def _store(self, quiz_id, entry):
+        # The stored row may already be newer than the cached version; keep what was built
+        with self.lock:
+            self.builds += 1
+            previous = self.entries.get(quiz_id)
+            if previous is None or previous[0] <= entry[0]:
+                self.entries[quiz_id] = entry
+                self.entries.move_to_end(quiz_id)
+            while len(self.entries) > self.max_quizzes:
+                self.entries.popitem(last=False)
+        return entry
+
+    def stats(self):
+        with self.lock:
+            return {
+                'quizzes': len(self.entries),
+                'hits': self.hits,
+                'builds': self.builds,
+                'coalesced': self.coalesced,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.builds = self.coalesced = 0
+
+
+quiz_bundles = QuizBundleCache(max_quizzes=getattr(settings, 'QUIZ_BUNDLES', {}).get('MAX_QUIZZES', 256))
@@ -0,0 +1,36 @@
+from django.db.models import Avg, Count, Max, Min, OuterRef, Subquery
+from .models import QuizAttempt
+
+
+def course_attempts(course):
+    return QuizAttempt.objects.filter(quiz__course=course).order_by()
+
+
+def _latest_score(course, **outer):
+    """Subquery returning the most recent score in the course matching the outer refs."""
+    return Subquery(
+        course_attempts(course)
+        .filter(**{field: OuterRef(ref) for field, ref in outer.items()})
+        .order_by('-attempted_at', '-id')
+        .values('score')[:1]
+    )
+
+
+def _stats(queryset, course, **latest):
+    return queryset.annotate(
+        attempts=Count('id'),
+        mean_score=Avg('score'),
+        min_score=Min('score'),
+        max_score=Max('score'),
+        latest_score=_latest_score(course, **latest),
+    )
+
+
+def student_quiz_statistics(course, student_ids):
+    """Per-(student, quiz) statistics restricted to the given students, in one query."""
+    return _stats(
+        course_attempts(course).filter(student_id__in=student_ids).values('student_id', 'quiz_id', 'quiz__title'),
+        course,
+        quiz='quiz_id',
+        student='student_id',
+    ).order_by('student_id', 'quiz_id')
@@ -0,0 +1,202 @@
+import hashlib
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from django.conf import settings
+
+# Words, and every other non-space character as a token of its own: "2+2" and "2-2" differ
+_TOKEN = re.compile(r"[a-z0-9']+|[^\sa-z0-9']")
+# Sentence punctuation, which does not change what is asked
+_PUNCTUATION = frozenset('.,;:!?"')
+
+
+def normalize(text):
+    """Fold case and whitespace only, so trivially different spellings share a key."""
+    return " ".join(_TOKEN.findall(text.lower()))
+
+
+def _embedded_text(normalized):
+    # Similarity ignores sentence punctuation; exact keys keep it
+    return " ".join(token for token in normalized.split() if token not in _PUNCTUATION)
+
+
+def literals(normalized):
+    """
+    The numbers and symbols of a normalised message. Embeddings weigh them
+    like any word, so similar questions only match when these are equal.
+    """
+    return tuple(sorted(
+        token for token in normalized.split()
+        if token not in _PUNCTUATION and not token.replace("'", "").isalpha()
+    ))
+
+
+class HashingEmbedder:
+    """
+    Dependency-free sentence embedding: hashed word unigrams and bigrams,
+    L2-normalised and kept sparse. Good enough to match rephrasings of the
+    same question without loading a model into the web workers.
+    """
+
+    def __init__(self, dim=1 << 16):
+        self.dim = dim
+
+    def _bucket(self, feature):
+        return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'big') % self.dim
+
+    def embed(self, normalized):
+        words = normalized.split()
+        vector = {}
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            bucket = self._bucket(feature)
+            vector[bucket] = vector.get(bucket, 0.0) + 1.0
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        return {k: v / norm for k, v in vector.items()}
+
+
+def cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class ResponseCache:
+    """
+    Per-scope (course) cache of chatbot replies. Lookups try the normalised
+    message first and, when a similarity threshold is set, fall back to the
+    most similar cached question in the same scope with the same numbers and
+    symbols. Entries expire after
+    `ttl` seconds and the least recently used are evicted beyond
+    `max_entries` in total.
+
+    Similar questions are found through an inverted index from embedding
+    features to cached questions, so a lookup never scans the scope. Only
+    the `max_candidates` questions sharing the most features with the
+    message are scored, and features cached for more than `max_postings`
+    questions (common words) are not used to find candidates. A lookup
+    therefore costs the same however large the cache grows.
+    """
+
+    def __init__(self, max_entries=5000, ttl=3600, similarity_threshold=0.9, embedder=None,
+                 max_postings=64, max_candidates=32):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.embedder = embedder or HashingEmbedder()
+        self.max_postings = max_postings
+        self.max_candidates = max_candidates
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (scope, key) -> (reply, expires_at, vector, literals)
+        self.index = {}  # scope -> {feature: {key, ...}}
+        self.counters = {'hits': 0, 'semantic_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _remove(self, entry_key):
+        entry = self.entries.pop(entry_key, None)
+        if entry is None or entry[2] is None:
+            return
+        scope, key = entry_key
+        postings = self.index[scope]
+        for feature in entry[2]:
+            keys = postings[feature]
+            keys.discard(key)
+            if not keys:
+                del postings[feature]
+        if not postings:
+            del self.index[scope]
+
+    def _live(self, entry_key, now):
+        entry = self.entries.get(entry_key)
+        if entry is None:
+            return None
+        if entry[1] < now:
+            self._remove(entry_key)
+            return None
+        self.entries.move_to_end(entry_key)
+        return entry
+
+    def _most_similar(self, vector, exact, scope, now):
+        postings = self.index.get(scope)
+        if not postings:
+            return None
+        shared = Counter()
+        for feature in vector:
+            keys = postings.get(feature)
+            if keys and len(keys) <= self.max_postings:
+                shared.update(keys)
+        best, best_score = None, self.similarity_threshold
+        for other, _ in shared.most_common(self.max_candidates):
+            entry = self._live((scope, other), now)
+            if entry is None or entry[3] != exact:
+                continue
+            score = cosine(vector, entry[2])
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+    def get(self, message, scope=None):
+        key = normalize(message)
+        now = time.monotonic()
+        vector = self.embedder.embed(_embedded_text(key)) if self.similarity_threshold is not None else None
+        with self.lock:
+            entry = self._live((scope, key), now)
+            if entry is not None:
+                self.counters['hits'] += 1
+                return entry[0]
+
+            if vector is not None:
+                entry = self._most_similar(vector, literals(key), scope, now)
+                if entry is not None:
+                    self.counters['semantic_hits'] += 1
+                    return entry[0]
+
+            self.counters['misses'] += 1
+            return None
+
+    def set(self, message, reply, scope=None):
+        key = normalize(message)
+        if not key:
+            return
+        vector = self.embedder.embed(_embedded_text(key)) if self.similarity_threshold is not None else None
+        with self.lock:
+            self._remove((scope, key))
+            self.entries[(scope, key)] = (reply, time.monotonic() + self.ttl, vector, literals(key))
+            if vector is not None:
+                postings = self.index.setdefault(scope, {})
+                for feature in vector:
+                    postings.setdefault(feature, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+                self.counters['evictions'] += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.index.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters['hits'] + self.counters['semantic_hits'] + self.counters['misses']
+            hits = self.counters['hits'] + self.counters['semantic_hits']
+            return {
+                **self.counters,
+                'entries': len(self.entries),
+                'hit_rate': hits / lookups if lookups else None,
+            }
+
+
+def _build_cache():
+    config = settings.CHATBOT.get('RESPONSE_CACHE', {})
+    if not config.get('ENABLED', True):
+        return None
+    return ResponseCache(
+        max_entries=config.get('MAX_ENTRIES', 5000),
+        ttl=config.get('TTL', 3600),
+        similarity_threshold=config.get('SIMILARITY_THRESHOLD', 0.9),
+        max_postings=config.get('MAX_POSTINGS', 64),
+        max_candidates=config.get('MAX_CANDIDATES', 32),
+    )
+
+
+response_cache = _build_cache()
@@ -0,0 +1,135 @@
+import math
+import threading
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .models import QuizAttempt, QuizScoreRollup, CourseStudentRollup
+
+ROLLUP_KEYS = {
+    QuizScoreRollup: ('quiz_id',),
+    CourseStudentRollup: ('course_id', 'student_id'),
+}
+
+COMPARED_FIELDS = ['attempts', 'score_sum', 'score_sum_sq', 'min_score', 'max_score', 'latest_score', 'histogram']
+
+
+def _lookups(quiz_id, course_id, student_id):
+    values = {'quiz_id': quiz_id, 'course_id': course_id, 'student_id': student_id}
+    return [(model, {field: values[field] for field in fields}) for model, fields in ROLLUP_KEYS.items()]
+
+
+def _key(model, lookup):
+    return model, tuple(lookup[field] for field in ROLLUP_KEYS[model])
+
+
+def record_attempt(attempt):
+    """
+    Fold a freshly graded attempt into its quiz and (course, student) rollups.
+    Must run inside the transaction that created the attempt so the rollups
+    never drift from the raw rows.
+    """
+    for model, lookup in _lookups(attempt.quiz_id, attempt.quiz.course_id, attempt.student_id):
+        rollup, _ = model.objects.select_for_update().get_or_create(**lookup)
+        rollup.add_score(attempt.score, attempt.attempted_at)
+        rollup.save()
+
+
+def refresh_rollups(quiz_ids, student_ids):
+    """
+    Recompute the rollups of some quizzes and of some students' courses from
+    the attempts that remain. Deleting scores cannot be undone incrementally:
+    the minimum, maximum and latest score may have gone with them.
+    """
+    with transaction.atomic():
+        for model, field, ids in ((QuizScoreRollup, 'quiz_id', quiz_ids), (CourseStudentRollup, 'student_id', student_ids)):
+            expected = compute_rollups(QuizAttempt.objects.filter(**{f'{field}__in': ids}))
+            model.objects.filter(**{f'{field}__in': ids}).delete()
+            model.objects.bulk_create([r for (m, _), r in expected.items() if m is model])
+
+
+# Per thread, like the transactions the deletes run in
+_deleted = threading.local()
+
+
+def _refresh_deleted():
+    quiz_ids, student_ids = getattr(_deleted, 'quiz_ids', set()), getattr(_deleted, 'student_ids', set())
+    if quiz_ids or student_ids:
+        _deleted.quiz_ids, _deleted.student_ids = set(), set()
+        refresh_rollups(quiz_ids, student_ids)
+
+
+@receiver(post_delete, sender=QuizAttempt)
+def _attempt_deleted(sender, instance, **kwargs):
+    """
+    Attempts go one by one or with their quiz, course or student. Each delete
+    notes what it touched and the first callback after the commit refreshes
+    all of it; keys left over from a rolled back delete are refreshed too,
+    which changes nothing.
+    """
+    if not hasattr(_deleted, 'quiz_ids'):
+        _deleted.quiz_ids, _deleted.student_ids = set(), set()
+    _deleted.quiz_ids.add(instance.quiz_id)
+    _deleted.student_ids.add(instance.student_id)
+    transaction.on_commit(_refresh_deleted)
+
+
+def compute_rollups(attempts=None):
+    """
+    Recompute every rollup from the raw attempts in a single streamed pass.
+    Returns unsaved rollup instances keyed by (model, key values).
+    """
+    rollups = {}
+    attempts = (
+        (QuizAttempt.objects.all() if attempts is None else attempts)
+        .order_by('attempted_at', 'id')
+        .values_list('quiz_id', 'quiz__course_id', 'student_id', 'score', 'attempted_at')
+    )
+    for quiz_id, course_id, student_id, score, attempted_at in attempts.iterator(chunk_size=2000):
+        for model, lookup in _lookups(quiz_id, course_id, student_id):
+            key = _key(model, lookup)
+            if key not in rollups:
+                rollups[key] = model(**lookup)
+            rollups[key].add_score(score, attempted_at)
+    return rollups
+
+
+def _same(a, b):
+    if a is None or b is None or isinstance(a, list):
+        return a == b
+    return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+
+
+def find_mismatches(expected=None):
+    """
+    Compare stored rollups with a fresh computation from the raw attempts.
+    Returns a list of human readable differences, empty when consistent.
+    """
+    expected = compute_rollups() if expected is None else expected
+    stored = {}
+    for model in ROLLUP_KEYS:
+        for rollup in model.objects.all().iterator():
+            stored[_key(model, vars(rollup))] = rollup
+
+    mismatches = []
+    for key in sorted(expected.keys() | stored.keys(), key=lambda k: (k[0].__name__, k[1])):
+        label = f"{key[0].__name__}{key[1]}"
+        have, want = stored.get(key), expected.get(key)
+        if have is None:
+            mismatches.append(f"{label} is missing")
+        elif want is None:
+            if have.attempts:
+                mismatches.append(f"{label} stores {have.attempts} attempts but none exist")
+        else:
+            for field in COMPARED_FIELDS:
+                if not _same(getattr(have, field), getattr(want, field)):
+                    mismatches.append(f"{label}.{field} is {getattr(have, field)}, expected {getattr(want, field)}")
+    return mismatches
+
+
+def rebuild_rollups(expected=None):
+    """Replace every stored rollup with a fresh computation. Call inside a transaction."""
+    expected = compute_rollups() if expected is None else expected
+    for model in ROLLUP_KEYS:
+        model.objects.all().delete()
+        model.objects.bulk_create([r for (m, _), r in expected.items() if m is model], batch_size=1000)
+    return len(expected)
@@ -1,6 +1,8 @@
-from requests import Response
+import json
+from collections import Counter
 from rest_framework import serializers
-from .models import Course, Assignment, Quiz, QuizAttempt, QuizAnswer, QuizQuestion
+from .models import Course, Assignment, AssignmentSubmission, Quiz, QuizAttempt, QuizQuestion
+from .grading import grade_attempt
 
 class CourseSerializer(serializers.ModelSerializer):
     class Meta:
@@ -12,14 +14,19 @@ class AssignmentSerializer(serializers.ModelSerializer):
         model = Assignment
         fields = '__all__'
 
+class AssignmentSubmissionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AssignmentSubmission
+        fields = ['id', 'assignment', 'student', 'answer_text', 'submitted_at', 'status', 'score', 'feedback', 'marked_at']
+        read_only_fields = ['student', 'submitted_at', 'status', 'score', 'feedback', 'marked_at']
+
 class QuizSerializer(serializers.ModelSerializer):
     class Meta:
         model = Quiz
         fields = '__all__'
 
     def validate_marking_key(self, value):
-        # If using JSONField, value is already a dict; if TextField, parse it
-        import json
+        # JSON bodies send an object; form posts send it as text
         if isinstance(value, str):
             try:
                 value = json.loads(value)
@@ -38,42 +45,75 @@ class QuizSerializer(serializers.ModelSerializer):
         return value
 
 class QuizAttemptSerializer(serializers.ModelSerializer):
+    answers = serializers.DictField(child=serializers.CharField(allow_blank=True), write_only=True)
+
     class Meta:
         model = QuizAttempt
-        fields = '__all__'
+        fields = ['id', 'quiz', 'student', 'score', 'attempted_at', 'answers']
+        read_only_fields = ['student', 'score', 'attempted_at']
 
-    def create(self, request, *args, **kwargs):
-        quiz_id = request.data['quiz']
-        answers = request.data['answers']  # {question_id: answer, ...}
-        quiz = Quiz.objects.get(id=quiz_id)
-        student = request.user
-
-        attempt = QuizAttempt.objects.create(quiz=quiz, student=student, score=0)
-        correct_count = 0
-        wrong_answers = []
-
-        for qid, ans in answers.items():
-            question = QuizQuestion.objects.get(id=qid)
-            is_correct = (ans.strip().lower() == question.correct_answer.strip().lower())
-            QuizAnswer.objects.create(attempt=attempt, question=question, student_answer=ans, is_correct=is_correct)
-            if is_correct:
-                correct_count += 1
-            else:
-                wrong_answers.append({
-                    "question": question.question_text,
-                    "your_answer": ans,
-                    "correct_answer": question.correct_answer
-                })
-
-        attempt.score = correct_count / len(answers)
-        attempt.save()
-
-        return Response({
-            "score": attempt.score,
-            "wrong_answers": wrong_answers
-        })
+    def create(self, validated_data):
+        # {question_id: answer, ...}
+        attempt, wrong_answers = grade_attempt(
+            validated_data['quiz'],
+            self.context['request'].user,
+            validated_data['answers']
+        )
+        attempt.wrong_answers = wrong_answers
+        return attempt
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if hasattr(instance, 'wrong_answers'):
+            data['wrong_answers'] = instance.wrong_answers
+        return data
+
+class QuizAttemptSubmissionSerializer(serializers.Serializer):
+    """Input of the async attempt view, which looks the quiz up itself with the async ORM."""
+    quiz = serializers.IntegerField()
+    answers = serializers.DictField(child=serializers.CharField(allow_blank=True))
 
 class QuizQuestionSerializer(serializers.ModelSerializer):
+    options = serializers.ListField(child=serializers.CharField(max_length=255), required=False)
+
     class Meta:
         model = QuizQuestion
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+    def validate(self, attrs):
+        question_type = attrs.get('question_type', getattr(self.instance, 'question_type', 'MCQ'))
+        options = attrs.get('options', getattr(self.instance, 'options', None))
+        if not options and question_type == 'TF':
+            options = attrs['options'] = ['True', 'False']
+        if not options:
+            raise serializers.ValidationError({"options": "A question needs at least one option."})
+        correct_option = attrs.get('correct_option', getattr(self.instance, 'correct_option', None))
+        if correct_option is not None and correct_option >= len(options):
+            raise serializers.ValidationError(
+                {"correct_option": f"Must be the index of one of the {len(options)} options."}
+            )
+        return attrs
+
+class QuizQuestionBulkListSerializer(serializers.ListSerializer):
+    def validate(self, attrs):
+        counts = Counter(item['id'] for item in attrs if 'id' in item)
+        duplicates = sorted(qid for qid, count in counts.items() if count > 1)
+        if duplicates:
+            raise serializers.ValidationError(f"Questions {duplicates} appear more than once.")
+        return attrs
+
+class QuizQuestionBulkSerializer(QuizQuestionSerializer):
+    """An item of a bulk upsert: with an id it replaces that question, without one it is created."""
+    id = serializers.IntegerField(required=False, min_value=1)
+
+    class Meta(QuizQuestionSerializer.Meta):
+        fields = ['id', 'question_text', 'question_type', 'options', 'correct_option', 'position']
+        list_serializer_class = QuizQuestionBulkListSerializer
+
+class QuestionIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_ids(self, value):
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError("Question ids must be unique.")
+        return value
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import weakref
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the
+    function and every caller that arrives while it runs gets its result
+    (or exception) instead of running it again.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn):
+        """Return (result, shared) where shared is True if another caller computed it."""
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines: concurrent awaits of one key on an event
+    loop share one task. Tasks belong to their loop, so each loop keeps its
+    own table.
+    """
+
+    def __init__(self):
+        self.loops = weakref.WeakKeyDictionary()
+
+    async def do(self, key, fn):
+        """Await fn() once per key; return (result, shared) like SingleFlight.do()."""
+        calls = self.loops.setdefault(asyncio.get_running_loop(), {})
+        task = calls.get(key)
+        shared = task is not None
+        if not shared:
+            task = calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: calls.pop(key, None))
+        # A cancelled waiter must not cancel the call the others are waiting for
+        return await asyncio.shield(task), shared
@@ -0,0 +1,16 @@
+"""Small helpers shared by the web process, the workers and the bench_* commands."""
+import os
+
+
+def percentile(values, fraction):
+    """The `fraction` quantile of `values` by nearest rank, or None if there are none."""
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else None
+
+
+def usable_cores():
+    """CPUs this process may run on, which can be fewer than the machine has."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
@@ -1,54 +1,108 @@
 from django.shortcuts import render
+from django.db.models import Q
 from rest_framework import viewsets, permissions
-from .models import Course, Assignment, Quiz, QuizAttempt, QuizQuestion
-from .serializers import CourseSerializer, AssignmentSerializer, QuizSerializer, QuizQuestionSerializer
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+from .models import Course, Assignment, AssignmentSubmission, Quiz, QuizAttempt, QuizQuestion, QuizScoreRollup
+from .serializers import (CourseSerializer, AssignmentSerializer, AssignmentSubmissionSerializer, QuizSerializer,
+                          QuizQuestionSerializer, QuizAttemptSerializer, QuizQuestionBulkSerializer, QuestionIdsSerializer)
 from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework import viewsets, permissions, status
-from .models import ChatMessage
+from . import question_bank, reports
+from .http_cache import ConditionalGetMixin
+from .quiz_bundle import quiz_bundles
+from .chat_history import arecent_turns, build_prompt, recent_turns, remember_turn
+from .response_cache import response_cache
+from .chat_log import chat_log
+from .inference import InferenceUnavailable, astream_reply, generate_reply
+import json
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.exceptions import PermissionDenied
+from apis.async_support import async_api_view, json_body, json_response
+from apis.fastpath import FastListMixin
+from apis.fieldsets import SparseFieldsetMixin
+from apis.parsers import JSONLinesParser, JSONLParser
+from rest_framework.settings import api_settings
 
 
 
+class PerformancePagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+def _score_stats(row):
+    return {
+        "attempts": row['attempts'],
+        "mean": row['mean_score'],
+        "min": row['min_score'],
+        "max": row['max_score'],
+        "latest": row['latest_score']
+    }
+
+def _rollup_stats(rollup):
+    return {
+        "attempts": rollup.attempts,
+        "mean": rollup.mean,
+        "stddev": rollup.stddev,
+        "min": rollup.min_score,
+        "max": rollup.max_score,
+        "latest": rollup.latest_score
+    }
+
 class IsLecturer(permissions.BasePermission):
     def has_permission(self, request, view):
         return request.user.is_authenticated and request.user.user_type == 'LECTURER'
 
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(ConditionalGetMixin, FastListMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
 
+    def version_source(self):
+        return (Course, self.kwargs['pk']) if 'pk' in self.kwargs else None
+
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        # The URLconf maps actions by hand, so @action(permission_classes=...) would not apply
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'student_performance']:
             return [IsLecturer()]
         return [permissions.IsAuthenticated()]
 
     def perform_create(self, serializer):
         serializer.save(lecturer=self.request.user)
 
-    @action(detail=True, methods=['get'], permission_classes=[IsLecturer])
+    @action(detail=True, methods=['get'])
     def student_performance(self, request, pk=None):
         course = self.get_object()
-        quizzes = course.quizzes.all()
-        students = set()
-        performance = []
-
-        for quiz in quizzes:
-            attempts = QuizAttempt.objects.filter(quiz=quiz)
-            for attempt in attempts:
-                students.add(attempt.student)
-                performance.append({
-                    "student": attempt.student.full_name,
-                    "quiz": quiz.title,
-                    "score": attempt.score
-                })
+        paginator = PerformancePagination()
+        students = paginator.paginate_queryset(
+            course.student_rollups.select_related('student').order_by('student_id'), request, view=self
+        )
 
-        return Response({
-            "students": [s.full_name for s in students],
-            "performance": performance
-        })
+        quizzes_by_student = {}
+        for row in reports.student_quiz_statistics(course, [s.student_id for s in students]):
+            quizzes_by_student.setdefault(row['student_id'], []).append({
+                "quiz": row['quiz_id'],
+                "title": row['quiz__title'],
+                **_score_stats(row)
+            })
+
+        performance = [{
+            "student": s.student_id,
+            "name": s.student.full_name,
+            **_rollup_stats(s),
+            "quizzes": quizzes_by_student.get(s.student_id, [])
+        } for s in students]
 
-class AssignmentViewSet(viewsets.ModelViewSet):
+        response = paginator.get_paginated_response(performance)
+        response.data['quizzes'] = [{
+            "quiz": rollup.quiz_id,
+            "title": rollup.quiz.title,
+            **_rollup_stats(rollup),
+            "histogram": rollup.histogram
+        } for rollup in QuizScoreRollup.objects.filter(quiz__course=course).select_related('quiz').order_by('quiz_id')]
+        return response
+
+class AssignmentViewSet(FastListMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Assignment.objects.all()
     serializer_class = AssignmentSerializer
 
@@ -57,39 +111,194 @@ class AssignmentViewSet(viewsets.ModelViewSet):
             return [IsLecturer()]
         return [permissions.IsAuthenticated()]
 
-class QuizViewSet(viewsets.ModelViewSet):
+class AssignmentSubmissionViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
+    """Students submit answers; submissions are marked in batches by `manage.py mark_submissions`."""
+    queryset = AssignmentSubmission.objects.all()
+    serializer_class = AssignmentSubmissionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.is_superuser:
+            return self.queryset
+        if user.user_type == 'LECTURER':
+            return self.queryset.filter(assignment__course__lecturer=user)
+        return self.queryset.filter(student=user)
+
+    def perform_create(self, serializer):
+        if self.request.user.user_type != 'STUDENT':
+            raise PermissionDenied("Only students can submit assignments.")
+        serializer.save(student=self.request.user)
+
+class QuizViewSet(ConditionalGetMixin, FastListMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Quiz.objects.all()
     serializer_class = QuizSerializer
 
+    def version_source(self):
+        return (Quiz, self.kwargs['pk']) if 'pk' in self.kwargs else None
+
+    @action(detail=True, methods=['get'])
+    def bundle(self, request, pk=None):
+        """The quiz and its questions without answers, pre-rendered once per quiz version."""
+        def build():
+            _, body = quiz_bundles.get(int(pk))
+            return HttpResponse(body, content_type='application/json')
+        # The bundle cache is already in-process; skip the shared response cache
+        return self.conditional(request, build, shared=False)
+
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [IsLecturer()]
         return [permissions.IsAuthenticated()]
+
+class QuizAttemptViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
+    queryset = QuizAttempt.objects.all()
+    serializer_class = QuizAttemptSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        if not self.request.user.is_superuser:
+            return self.queryset.filter(student=self.request.user)
+        return self.queryset
     
+def _membership(user, course):
+    """
+    (course id, queryset that is non-empty when the user teaches the course or
+    has graded work in it); there is no enrolment table. (None, None) when
+    `course` is not an id.
+    """
+    try:
+        course_id = int(course)
+    except (TypeError, ValueError):
+        return None, None
+    return course_id, Course.objects.filter(Q(lecturer=user) | Q(student_rollups__student=user), pk=course_id)
+
+def _cache_scope(user, course):
+    """
+    Cached replies are shared per course, so a course is only used as the
+    scope by its own lecturer and students; everything else shares the
+    global scope.
+    """
+    course_id, membership = _membership(user, course)
+    return course_id if membership is not None and membership.exists() else None
+
+async def _acache_scope(user, course):
+    course_id, membership = _membership(user, course)
+    return course_id if membership is not None and await membership.aexists() else None
+
+def _cached_reply(user_message, scope):
+    return response_cache.get(user_message, scope) if response_cache is not None else None
+
+def _cache_reply(user_message, reply, scope):
+    if response_cache is not None:
+        response_cache.set(user_message, reply, scope)
+
 class ChatBotViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_permissions(self):
+        # The URLconf maps actions by hand, so @action(permission_classes=...) would not apply
+        if self.action == 'cache_stats':
+            return [permissions.IsAdminUser()]
+        return super().get_permissions()
+
     def create(self, request):
         user_message = request.data.get('message')
         if not user_message:
             return Response({"reply": "Please provide a message."}, status=status.HTTP_400_BAD_REQUEST)
-        from transformers import Conversation
-        conversation = Conversation(user_message)
-        result = chatbot(conversation)
-        reply = result.generated_responses[-1] if result.generated_responses else "Sorry, I didn't understand."
-
-        # Save to database
-        ChatMessage.objects.create(
-            user=request.user,
-            user_message=user_message,
-            bot_reply=reply
-        )
+        turns = recent_turns(request.user.id)
+        # Cached replies are shared, so only replies to the message alone are cached
+        shared = not turns
+        scope = _cache_scope(request.user, request.data.get('course')) if shared else None
+        reply = _cached_reply(user_message, scope) if shared else None
+        if reply is None:
+            try:
+                reply = generate_reply(build_prompt(turns, user_message))
+            except InferenceUnavailable:
+                return Response({"reply": "The chatbot is currently unavailable."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            if reply and shared:
+                _cache_reply(user_message, reply, scope)
+            elif not reply:
+                reply = "Sorry, I didn't understand."
+
+        # Persisted by the background writer so the response never waits on the database
+        chat_log.log(request.user.id, user_message, reply)
+        remember_turn(request.user.id, user_message, reply)
 
         return Response({"reply": reply})
 
-class QuizQuestionViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def cache_stats(self, request):
+        if response_cache is None:
+            return Response({"enabled": False})
+        return Response({"enabled": True, **response_cache.stats()})
+
+def _sse(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@async_api_view(['POST'])
+async def chatbot_stream(request):
+    """
+    Server-sent events variant of the chatbot. Served through asgi.py, tokens
+    reach the client as the worker produces them and the event loop is never
+    blocked while waiting; the ChatMessage is logged once the reply is complete.
+    """
+    user = request.user
+    payload = json_body(request)
+    user_message = payload.get('message')
+    if not user_message:
+        return json_response({"reply": "Please provide a message."}, status=status.HTTP_400_BAD_REQUEST)
+
+    turns = await arecent_turns(user.id)
+    shared = not turns
+    scope = await _acache_scope(user, payload.get('course')) if shared else None
+    cached = _cached_reply(user_message, scope) if shared else None
+    prompt = None if cached is not None else build_prompt(turns, user_message)
+
+    async def events():
+        if cached is not None:
+            reply = cached
+            yield _sse({"token": reply})
+        else:
+            tokens = []
+            try:
+                async for token in astream_reply(prompt):
+                    tokens.append(token)
+                    yield _sse({"token": token})
+            except InferenceUnavailable:
+                yield _sse({"reply": "The chatbot is currently unavailable."}, event='error')
+                return
+            reply = "".join(tokens).strip()
+            if reply and shared:
+                _cache_reply(user_message, reply, scope)
+            elif not reply:
+                reply = "Sorry, I didn't understand."
+        await chat_log.alog(user.id, user_message, reply)
+        remember_turn(user.id, user_message, reply)
+        yield _sse({"reply": reply}, event='done')
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+class QuizQuestionViewSet(ConditionalGetMixin, FastListMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = QuizQuestion.objects.all()
     serializer_class = QuizQuestionSerializer
+    ordering = ('position', 'id')
+    # Bulk uploads may also be sent as JSON Lines, one question per line
+    parser_classes = [*api_settings.DEFAULT_PARSER_CLASSES, JSONLinesParser, JSONLParser]
+    max_bulk_questions = 1000
+
+    def version_source(self):
+        # Saving or deleting a question bumps its quiz
+        return (Quiz, self.kwargs['quiz_id']) if 'quiz_id' in self.kwargs else None
+
+    def get_permissions(self):
+        if self.action in ['bulk_upsert', 'bulk_delete', 'reorder']:
+            return [IsLecturer()]
+        return super().get_permissions()
 
     def get_queryset(self):
         quiz_id = self.kwargs.get('quiz_id')
@@ -98,5 +307,32 @@ class QuizQuestionViewSet(viewsets.ModelViewSet):
         return self.queryset
 
     def perform_create(self, serializer):
-        quiz_id = self.kwargs.get('quiz_id')
-        serializer.save(quiz_id=quiz_id)
\ No newline at end of file
+        quiz_id = self.kwargs.get('quiz_id') or serializer.validated_data['quiz'].pk
+        if 'position' not in serializer.validated_data:
+            serializer.save(quiz_id=quiz_id, position=question_bank.next_position(quiz_id))
+        else:
+            serializer.save(quiz_id=quiz_id)
+
+    @action(detail=False, methods=['post'])
+    def bulk_upsert(self, request, quiz_id=None):
+        """Create or replace up to max_bulk_questions questions in one transaction."""
+        serializer = QuizQuestionBulkSerializer(data=request.data, many=True, max_length=self.max_bulk_questions)
+        serializer.is_valid(raise_exception=True)
+        questions, created, updated = question_bank.upsert_questions(quiz_id, serializer.validated_data)
+        return Response({
+            "created": created,
+            "updated": updated,
+            "questions": QuizQuestionSerializer(questions, many=True).data
+        })
+
+    @action(detail=False, methods=['delete'])
+    def bulk_delete(self, request, quiz_id=None):
+        serializer = QuestionIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({"deleted": question_bank.delete_questions(quiz_id, serializer.validated_data['ids'])})
+
+    @action(detail=False, methods=['post'])
+    def reorder(self, request, quiz_id=None):
+        serializer = QuestionIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({"reordered": question_bank.reorder_questions(quiz_id, serializer.validated_data['ids'])})
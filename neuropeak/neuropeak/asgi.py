@@ -9,8 +9,10 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+from apis.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'neuropeak.settings')
+# Route the hot endpoints to their async views (settings.ASYNC_VIEWS)
+os.environ.setdefault('NEUROPEAK_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
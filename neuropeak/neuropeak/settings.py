@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -36,15 +37,17 @@ INSTALLED_APPS = [
     'apis'
 ]
 
+# The stock middleware, but with hooks that run on the event loop under ASGI (see apis/middleware.py)
 MIDDLEWARE = [
-    'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'apis.profiling.ProfilingMiddleware',  # outermost, so its timings cover the whole stack
+    'apis.middleware.SecurityMiddleware',
+    'apis.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware should be placed here
-    'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apis.middleware.CommonMiddleware',
+    'apis.middleware.CsrfViewMiddleware',
+    'apis.middleware.AuthenticationMiddleware',
+    'apis.middleware.MessageMiddleware',
+    'apis.middleware.XFrameOptionsMiddleware',
 ]
 
 # CORS settings
@@ -79,11 +82,18 @@ CORS_ALLOW_HEADERS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
-    )
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'apis.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # List routes return {"next", "previous", "results"}; see apis/pagination.py
+    'DEFAULT_PAGINATION_CLASS': 'apis.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
 }
 
 ROOT_URLCONF = 'neuropeak.urls'
@@ -110,12 +120,65 @@ WSGI_APPLICATION = 'neuropeak.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# NEUROPEAK_DB_PROFILE selects the database setup:
+#   sqlite     - default journal, one connection per request (development)
+#   sqlite-wal - WAL journal and tuned pragmas for small single-host deployments
+#   postgres   - PostgreSQL with a psycopg connection pool (needs psycopg[pool]), or persistent
+#                connections when NEUROPEAK_DB_POOL=0 (e.g. behind pgbouncer)
+
+DB_PROFILE = os.environ.get('NEUROPEAK_DB_PROFILE', 'sqlite')
+
+if DB_PROFILE == 'postgres':
+    _db_pool = os.environ.get('NEUROPEAK_DB_POOL', '1') != '0'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('NEUROPEAK_DB_NAME', 'neuropeak'),
+            'USER': os.environ.get('NEUROPEAK_DB_USER', 'neuropeak'),
+            'PASSWORD': os.environ.get('NEUROPEAK_DB_PASSWORD', ''),
+            'HOST': os.environ.get('NEUROPEAK_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('NEUROPEAK_DB_PORT', '5432'),
+            # Pooled connections are returned to the pool after each request
+            'CONN_MAX_AGE': 0 if _db_pool else 600,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('NEUROPEAK_DB_POOL_MIN', 2)),
+                    'max_size': int(os.environ.get('NEUROPEAK_DB_POOL_MAX', 10)),
+                    'timeout': 10,
+                },
+            } if _db_pool else {},
+        }
+    }
+elif DB_PROFILE == 'sqlite-wal':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('NEUROPEAK_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': 600,
+            'OPTIONS': {
+                # Seconds to wait on a locked database (sets busy_timeout)
+                'timeout': 5,
+                # Take the write lock up front instead of failing on upgrade
+                'transaction_mode': 'IMMEDIATE',
+                # Applied on every new connection
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA mmap_size=134217728;'
+                    'PRAGMA temp_store=MEMORY;'
+                    'PRAGMA cache_size=-20000;'
+                ),
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('NEUROPEAK_DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
     }
-}
 
 
 # Password validation
@@ -137,6 +200,36 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing. New passwords, and existing ones on their next login, use
+# the preferred hasher (NEUROPEAK_PASSWORD_HASHER: scrypt, argon2 or pbkdf2;
+# argon2 needs argon2-cffi). The others remain listed to verify older hashes.
+PASSWORD_HASHER_CHOICES = {
+    'scrypt': 'users.hashers.ScryptPasswordHasher',
+    'argon2': 'users.hashers.Argon2PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PREFERRED_PASSWORD_HASHER = os.environ.get('NEUROPEAK_PASSWORD_HASHER', 'scrypt')
+PASSWORD_HASHERS = [PASSWORD_HASHER_CHOICES[PREFERRED_PASSWORD_HASHER]] + [
+    path for name, path in PASSWORD_HASHER_CHOICES.items() if name != PREFERRED_PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+# Hasher costs (raising one rehashes passwords on login) and the login
+# verification pool: POOL_SIZE threads (None = CPU count), refusing logins
+# with 429 once MAX_PENDING are queued.
+PASSWORD_HASHING = {
+    'SCRYPT_WORK_FACTOR': 2**14,
+    'SCRYPT_BLOCK_SIZE': 8,
+    'SCRYPT_PARALLELISM': 5,
+    'ARGON2_TIME_COST': 2,
+    'ARGON2_MEMORY_COST': 102400,
+    'ARGON2_PARALLELISM': 8,
+    'POOL_SIZE': None,
+    'MAX_PENDING': 64,
+}
+
+AUTHENTICATION_BACKENDS = ['users.backends.PooledModelBackend']
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -167,7 +260,8 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
-    'UPDATE_LAST_LOGIN': True,
+    # Recorded in batches by users.authentication.LastLoginRecorder instead
+    'UPDATE_LAST_LOGIN': False,
     
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
@@ -183,4 +277,126 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
     
     'JTI_CLAIM': 'jti',
-}
\ No newline at end of file
+}
+
+# Authenticated requests resolve users from token claims (STATELESS) or a
+# per-process cache of TTL seconds before falling back to the database.
+JWT_USER_CACHE = {
+    'STATELESS': True,
+    'TTL': 60,
+    'LAST_LOGIN_FLUSH_INTERVAL': 10,
+}
+
+# Revoked refresh tokens (users.blacklist). Purge expired rows periodically
+# with `python manage.py purge_revoked_tokens`.
+TOKEN_BLACKLIST = {
+    'BLOOM_CAPACITY': 1_000_000,
+    'BLOOM_ERROR_RATE': 0.001,
+    # Seconds between filter syncs; 0 syncs before every check
+    'SYNC_INTERVAL': 0,
+}
+
+
+# Shared cache for HTTP responses and resource versions. Set NEUROPEAK_REDIS_URL
+# so every server process sees the same entries.
+if os.environ.get('NEUROPEAK_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['NEUROPEAK_REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Conditional GET (ETag/Last-Modified) and cached bodies for courses, quizzes
+# and questions; see core/http_cache.py.
+HTTP_CACHE = {
+    'ENABLED': True,
+    'CACHE': 'default',
+    'TTL': 300,
+    # Lifetime of cached versions, which are only cached when CACHE is shared
+    # between processes (not LocMemCache)
+    'VERSION_TTL': 60,
+}
+
+# Per-process cache of pre-rendered quiz bundles (GET /quizzes/<pk>/bundle/)
+QUIZ_BUNDLES = {
+    'MAX_QUIZZES': 256,
+}
+
+# Serve the chatbot, quiz bundle, attempt submission and token refresh endpoints
+# with async views (core/async_views.py). asgi.py turns this on; under WSGI an
+# async view would need an event loop per request, so WSGI keeps the DRF views.
+ASYNC_VIEWS = os.environ.get('NEUROPEAK_ASYNC_VIEWS', '0') == '1'
+# Threads an ASGI process runs sync code on: middleware, the ORM, DRF views (see apis/asgi.py)
+ASGI_SYNC_THREADS = int(os.environ.get('NEUROPEAK_ASGI_SYNC_THREADS', 32))
+
+# Per-endpoint wall time, query count and time, serializer time and response size
+# (apis/profiling.py), served at metrics/ (JSON) and metrics/prometheus/ to staff
+# users or to `Authorization: Metrics <SCRAPE_TOKEN>`. Off unless
+# NEUROPEAK_REQUEST_PROFILING=1; disabled, the middleware drops out of the
+# stack. A PROFILE_SAMPLE_RATE share of requests run under cProfile; the last
+# MAX_PROFILES slower than SLOW_REQUEST_MS keep their trace.
+REQUEST_PROFILING = {
+    'ENABLED': os.environ.get('NEUROPEAK_REQUEST_PROFILING', '0') == '1',
+    'WINDOW': 1024,  # recent requests per endpoint for latency quantiles
+    'PROFILE_SAMPLE_RATE': 0.01,
+    'SLOW_REQUEST_MS': 500,
+    'MAX_PROFILES': 20,
+    'PROFILE_LINES': 40,
+    'SCRAPE_TOKEN': os.environ.get('NEUROPEAK_METRICS_SCRAPE_TOKEN'),
+}
+
+# Assignment marking (run with `python manage.py mark_submissions`)
+MARKING = {
+    'WORKERS': None,  # marking processes; None for one per usable core
+    'CHUNK_SIZE': 50,
+    # Claims older than this many seconds are assumed abandoned by a killed run
+    'LEASE_SECONDS': 600,
+}
+
+
+# Chatbot inference worker (run with `python manage.py run_inference_worker`)
+
+CHATBOT = {
+    'MODEL': os.environ.get('NEUROPEAK_CHATBOT_MODEL', 'microsoft/DialoGPT-medium'),  # 'stub' for offline use
+    'MODEL_OPTIONS': {},
+    'ADDRESS': (
+        os.environ.get('NEUROPEAK_INFERENCE_HOST', '127.0.0.1'),
+        int(os.environ.get('NEUROPEAK_INFERENCE_PORT', 8765)),
+    ),
+    'AUTHKEY': os.environ.get('NEUROPEAK_INFERENCE_AUTHKEY', SECRET_KEY),
+    'TIMEOUT': 30,
+    # Micro-batching: wait up to BATCH_WINDOW_MS for up to MAX_BATCH_SIZE messages
+    'MAX_BATCH_SIZE': 8,
+    'BATCH_WINDOW_MS': 10,
+    # Streamed replies generated at once; further streams wait for a free slot
+    'MAX_STREAMS': 8,
+    # Conversation context: last HISTORY_TURNS turns, trimmed to CONTEXT_TOKENS
+    'HISTORY_TURNS': 6,
+    'CONTEXT_TOKENS': 512,
+    'HISTORY_CACHE_USERS': 1000,
+    'HISTORY_CACHE_TTL': 300,
+    # Replies reused for repeated questions in the same course.
+    # SIMILARITY_THRESHOLD=None restricts matches to identical normalised text.
+    'RESPONSE_CACHE': {
+        'ENABLED': True,
+        'MAX_ENTRIES': 5000,
+        'TTL': 3600,
+        'SIMILARITY_THRESHOLD': 0.9,
+    },
+    # ChatMessage rows are written in the background with bulk_create.
+    # See core/chat_log.py for what a crash can lose; BUFFERED=False writes inline.
+    'MESSAGE_LOG': {
+        'BUFFERED': True,
+        'BATCH_SIZE': 100,
+        'FLUSH_INTERVAL': 1.0,
+        'MAX_PENDING': 1000,
+        'MAX_RETRIES': 5,
+    },
+}
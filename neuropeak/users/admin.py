@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django import forms
-from .models import User, LecturerProfile, StudentProfile
+from .models import User, LecturerProfile, StudentProfile, RevokedToken
 from django.utils.translation import gettext_lazy as _
 
 class UserChangeForm(forms.ModelForm):
@@ -56,7 +56,12 @@ class StudentProfileAdmin(admin.ModelAdmin):
             return qs
         return qs.filter(user=request.user)
 
+class RevokedTokenAdmin(admin.ModelAdmin):
+    list_display = ('jti', 'expires_bucket')
+    search_fields = ('jti',)
+
 # Register your models here
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(LecturerProfile, LecturerProfileAdmin)
-admin.site.register(StudentProfile, StudentProfileAdmin)
\ No newline at end of file
+admin.site.register(StudentProfile, StudentProfileAdmin)
+admin.site.register(RevokedToken, RevokedTokenAdmin)
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""Async variants of login and token refresh, routed when served through asgi.py (see core/async_views.py)."""
+from asgiref.sync import sync_to_async
+from django.contrib.auth import aauthenticate
+from rest_framework import serializers
+from rest_framework.exceptions import Throttled
+from rest_framework.fields import empty
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from apis.async_support import async_api_view, json_body, json_response
+from .authentication import aresolve_user
+from .hashing import HashingPoolFull
+from .serializers import CustomTokenObtainPairSerializer, CustomTokenRefreshSerializer
+
+
+@async_api_view(['POST'], authenticated=False)
+async def token_obtain(request):
+    """
+    POST /token/ (CustomTokenObtainPairView). The password is verified on
+    the hashing pool while the event loop, and every thread, stays free.
+    """
+    serializer = CustomTokenObtainPairSerializer()
+    attrs = serializer.to_internal_value(json_body(request))
+    try:
+        user = await aauthenticate(request, **attrs)
+    except HashingPoolFull:
+        raise Throttled(wait=1, detail="Too many logins in progress.")
+    if not api_settings.USER_AUTHENTICATION_RULE(user):
+        raise AuthenticationFailed(serializer.error_messages['no_active_account'], 'no_active_account')
+    return json_response(serializer.issue(user))
+
+
+@async_api_view(['POST'], authenticated=False)
+async def token_refresh(request):
+    """POST /token/refresh/ (CustomTokenRefreshView)."""
+    serializer = CustomTokenRefreshSerializer()
+    try:
+        raw_token = serializer.fields['refresh'].run_validation(json_body(request).get('refresh', empty))
+    except serializers.ValidationError as exc:
+        raise serializers.ValidationError({"refresh": exc.detail})
+
+    try:
+        refresh = serializer.token_class(raw_token)
+        user = await aresolve_user(refresh.payload, stateless=False)
+        # The blacklist check and the rotation write share one trip to the sync thread
+        data = await sync_to_async(serializer.rotate)(refresh, user)
+    except TokenError as exc:
+        raise InvalidToken(exc.args[0])
+    return json_response(data)
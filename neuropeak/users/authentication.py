@@ -0,0 +1,229 @@
+"""
+JWT authentication that avoids loading the user row on every request.
+
+Users are resolved, in order, from a short-TTL in-process cache, from the
+token's own claims (stateless mode, access tokens only) or from the
+database. Stateless users are trusted for the life of the access token;
+a refresh always reads the cached or stored user, so a deactivated
+account cannot mint new access tokens; a user saved or deleted in
+this process is always re-read from the database until tokens issued
+before the change have expired. Last-login timestamps are coalesced and
+written in one bulk update per flush interval instead of on every login.
+"""
+import atexit
+import copy
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+STATELESS_CLAIMS = ('email', 'user_type', 'is_staff', 'is_superuser')
+
+
+def _config(key, default):
+    return getattr(settings, 'JWT_USER_CACHE', {}).get(key, default)
+
+
+class UserCache:
+    """Thread-safe TTL cache of User rows keyed by id, with change tombstones."""
+
+    def __init__(self, ttl=60, tombstone_ttl=900):
+        self.ttl = ttl
+        self.tombstone_ttl = tombstone_ttl
+        self.lock = threading.Lock()
+        self.users = {}  # user_id -> (expires_at, user)
+        self.changed = {}  # user_id -> tombstone expiry
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.users.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.users[user_id]
+                return None
+            # Hand out copies so one request cannot mutate another's user
+            return copy.copy(entry[1])
+
+    def set(self, user):
+        with self.lock:
+            self.users[user.pk] = (time.monotonic() + self.ttl, copy.copy(user))
+
+    def invalidate(self, user_id):
+        now = time.monotonic()
+        with self.lock:
+            self.users.pop(user_id, None)
+            self.changed[user_id] = now + self.tombstone_ttl
+            if len(self.changed) > 10000:
+                self.changed = {k: v for k, v in self.changed.items() if v > now}
+
+    def recently_changed(self, user_id):
+        with self.lock:
+            expires = self.changed.get(user_id)
+            return expires is not None and expires > time.monotonic()
+
+    def clear(self):
+        with self.lock:
+            self.users.clear()
+            self.changed.clear()
+
+
+user_cache = UserCache(
+    ttl=_config('TTL', 60),
+    tombstone_ttl=api_settings.ACCESS_TOKEN_LIFETIME.total_seconds(),
+)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+
+
+def set_user_claims(token, user):
+    """Write the STATELESS_CLAIMS of `user` into a token, from the user as it is now."""
+    for claim in STATELESS_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+def user_from_claims(payload):
+    """An unsaved User carrying only what the token asserts; never call save() on it."""
+    user = User(
+        id=payload[api_settings.USER_ID_CLAIM],
+        email=payload['email'],
+        user_type=payload['user_type'],
+        is_staff=payload['is_staff'],
+        is_superuser=payload['is_superuser'],
+        is_active=True,
+    )
+    user._state.adding = False
+    user._state.db = 'default'
+    return user
+
+
+def _resolve_from_memory(payload, stateless):
+    """(user_id, user) from the cache or the token's claims; user is None when the row must be read."""
+    try:
+        user_id = payload[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    user = user_cache.get(user_id)
+    if (
+        user is None
+        and stateless
+        and _config('STATELESS', True)
+        and all(claim in payload for claim in STATELESS_CLAIMS)
+        and not user_cache.recently_changed(user_id)
+    ):
+        return user_id, user_from_claims(payload)
+    return user_id, user
+
+
+def _check_active(user):
+    if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+    return user
+
+
+def resolve_user(payload, stateless=True):
+    """
+    Return the user a token payload refers to, touching the database only
+    when needed. Pass stateless=False for anything but an access token.
+    """
+    user_id, user = _resolve_from_memory(payload, stateless)
+    if user is None:
+        try:
+            user = User.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        user_cache.set(user)
+    return _check_active(user)
+
+
+async def aresolve_user(payload, stateless=True):
+    """resolve_user() for async views; a cache miss is read with the async ORM."""
+    user_id, user = _resolve_from_memory(payload, stateless)
+    if user is None:
+        try:
+            user = await User.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        user_cache.set(user)
+    return _check_active(user)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        return resolve_user(validated_token.payload)
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views: the token is checked on the event loop."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await aresolve_user(validated_token.payload), validated_token
+
+
+class LastLoginRecorder:
+    """
+    Coalesces last_login updates: logins only record (user_id, timestamp) in
+    memory and a background thread writes the latest timestamp per user
+    with a single bulk_update every `flush_interval` seconds.
+    """
+
+    def __init__(self, flush_interval=10):
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.pending = {}
+        self._thread = None
+
+    def record(self, user):
+        with self.lock:
+            self.pending[user.pk] = timezone.now()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='last-login-recorder', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        try:
+            # bulk_update sends no signals, so cached users stay valid
+            User.objects.bulk_update(
+                [User(pk=user_id, last_login=at) for user_id, at in pending.items()],
+                ['last_login'],
+            )
+        except DatabaseError:
+            logger.exception("Could not record last login for %d users", len(pending))
+            with self.lock:
+                for user_id, at in pending.items():
+                    self.pending.setdefault(user_id, at)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            close_old_connections()
+            self.flush()
+
+
+last_login_recorder = LastLoginRecorder(flush_interval=_config('LAST_LOGIN_FLUSH_INTERVAL', 10))
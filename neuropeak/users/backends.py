@@ -0,0 +1,53 @@
+from django.contrib.auth.backends import ModelBackend
+from .hashing import hash_password, hashing_pool, verify_password
+from .models import User
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    ModelBackend that verifies passwords on the shared hashing pool and
+    transparently upgrades outdated hashes to the preferred hasher.
+    Database access stays on the calling thread; aauthenticate(), used by
+    the async login view, awaits the pool instead of blocking a thread.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return
+        try:
+            user = User._default_manager.get_by_natural_key(username)
+        except User.DoesNotExist:
+            # Hash anyway so unknown emails take as long as wrong passwords
+            hashing_pool().run(hash_password, password)
+            return
+        matches, upgraded = hashing_pool().run(verify_password, password, user.password)
+        if matches and upgraded:
+            self._upgrade(user, upgraded)
+        if matches and self.user_can_authenticate(user):
+            return user
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return
+        try:
+            user = await User._default_manager.aget_by_natural_key(username)
+        except User.DoesNotExist:
+            await hashing_pool().arun(hash_password, password)
+            return
+        matches, upgraded = await hashing_pool().arun(verify_password, password, user.password)
+        if matches and upgraded:
+            await self._aupgrade(user, upgraded)
+        if matches and self.user_can_authenticate(user):
+            return user
+
+    def _upgrade(self, user, encoded):
+        user.password = encoded
+        user.save(update_fields=['password'])
+
+    async def _aupgrade(self, user, encoded):
+        user.password = encoded
+        await user.asave(update_fields=['password'])
@@ -0,0 +1,114 @@
+"""
+Refresh-token revocation backed by the RevokedToken table.
+
+Each process keeps a Bloom filter of revoked JTIs. Before trusting it, the
+filter is brought up to date with rows added since its last sync (an
+indexed `id > cursor` read that is normally empty), so a negative answer
+is exact across processes and most refreshes never look up the JTI itself.
+Only filter hits are confirmed against the table's unique index.
+"""
+import hashlib
+import math
+import threading
+import time
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from .models import RevokedToken
+
+
+def _config(key, default):
+    return getattr(settings, 'TOKEN_BLACKLIST', {}).get(key, default)
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        a, b = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return ((a + i * b) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class TokenBlacklist:
+    def __init__(self, capacity=1_000_000, error_rate=0.001, sync_interval=0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.cursor = 0
+        self.synced_at = 0.0
+
+    def _rebuild(self):
+        # Start over from live rows; purged tokens drop out of the filter here
+        self.bloom = BloomFilter(self.capacity, self.error_rate)
+        self.cursor = 0
+        self._load(RevokedToken.objects.filter(expires_bucket__gt=RevokedToken.expired_bucket(time.time())))
+
+    def _load(self, queryset):
+        for pk, jti in queryset.filter(id__gt=self.cursor).order_by('id').values_list('id', 'jti').iterator():
+            self.bloom.add(jti)
+            self.cursor = pk
+
+    def sync(self, force=False):
+        with self.lock:
+            now = time.monotonic()
+            if self.bloom is None or self.bloom.count > self.capacity:
+                self._rebuild()
+            elif force or now - self.synced_at >= self.sync_interval:
+                self._load(RevokedToken.objects.all())
+            else:
+                return
+            self.synced_at = now
+
+    def is_revoked(self, jti):
+        self.sync()
+        if jti not in self.bloom:
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def revoke(self, jti, exp):
+        """
+        Revoke a token. Returns False if it was already revoked, which makes
+        revoke-on-rotation safe against two concurrent refreshes of one token.
+        """
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(jti=jti, expires_bucket=RevokedToken.bucket_for(exp))
+        except IntegrityError:
+            return False
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+        return True
+
+
+def purge_expired(batch_size=5000):
+    """Delete every revoked token whose expiry bucket has passed, in bounded batches."""
+    expired = RevokedToken.objects.filter(expires_bucket__lte=RevokedToken.expired_bucket(time.time()))
+    deleted = 0
+    while True:
+        ids = list(expired.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += RevokedToken.objects.filter(id__in=ids).delete()[0]
+
+
+token_blacklist = TokenBlacklist(
+    capacity=_config('BLOOM_CAPACITY', 1_000_000),
+    error_rate=_config('BLOOM_ERROR_RATE', 0.001),
+    sync_interval=_config('SYNC_INTERVAL', 0),
+)
@@ -0,0 +1,48 @@
+"""
+Password hashers whose cost is read from settings.PASSWORD_HASHING.
+
+They keep Django's algorithm names and encodings, so existing hashes stay
+valid. Changing a cost makes must_update() true for older hashes, and they
+are rehashed the next time their owner logs in.
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+def _cost(key, default):
+    return getattr(settings, 'PASSWORD_HASHING', {}).get(key, default)
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return _cost('SCRYPT_WORK_FACTOR', 2**14)
+
+    @property
+    def block_size(self):
+        return _cost('SCRYPT_BLOCK_SIZE', 8)
+
+    @property
+    def parallelism(self):
+        return _cost('SCRYPT_PARALLELISM', 5)
+
+    @property
+    def maxmem(self):
+        # OpenSSL refuses anything above 32 MiB by default; allow larger work factors
+        return 2 * 128 * self.work_factor * self.block_size
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Requires the optional argon2-cffi package."""
+
+    @property
+    def time_cost(self):
+        return _cost('ARGON2_TIME_COST', 2)
+
+    @property
+    def memory_cost(self):
+        return _cost('ARGON2_MEMORY_COST', 102400)
+
+    @property
+    def parallelism(self):
+        return _cost('ARGON2_PARALLELISM', 8)
@@ -0,0 +1,96 @@
+"""
+Password hashing off the request thread.
+
+Logins verify passwords on a bounded thread pool: hashlib's pbkdf2/scrypt
+and argon2-cffi release the GIL, so up to POOL_SIZE hashes run in parallel
+while a login burst cannot oversubscribe the CPU (or, for memory-hard
+hashers, RAM). Once MAX_PENDING verifications are queued further logins are
+refused with HashingPoolFull instead of waiting behind them. The async
+login view (users/async_views.py) awaits the verification, so under ASGI
+no thread waits on it; a synchronous login still blocks its own thread
+until the pool is done.
+
+This module must not import models: spawned roster-import workers unpickle
+its functions before Django is configured.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class HashingPoolFull(Exception):
+    pass
+
+
+def init_worker():
+    # Spawned workers start from a bare interpreter and need their own configured Django
+    import django
+    django.setup()
+
+
+def hash_password(password):
+    from django.contrib.auth.hashers import make_password
+    return make_password(password or None)
+
+
+def verify_password(password, encoded):
+    """
+    Return (matches, upgraded) where `upgraded` is a fresh hash from the
+    preferred hasher when the stored one is outdated, otherwise None.
+    """
+    from django.contrib.auth.hashers import check_password, make_password
+    upgraded = []
+    matches = check_password(password, encoded, setter=lambda raw: upgraded.append(make_password(raw)))
+    return matches, upgraded[0] if upgraded else None
+
+
+class HashingPool:
+    def __init__(self, size=None, max_pending=64):
+        self.size = size or os.cpu_count() or 1
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def executor(self):
+        # Created on first use so that forked server workers each get their own threads
+        with self.lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix='password-hasher')
+            return self._executor
+
+    def submit(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            raise HashingPoolFull()
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def run(self, fn, *args):
+        return self.submit(fn, *args).result()
+
+    async def arun(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+
+def _build_pool():
+    from django.conf import settings
+    config = getattr(settings, 'PASSWORD_HASHING', {})
+    return HashingPool(size=config.get('POOL_SIZE'), max_pending=config.get('MAX_PENDING', 64))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def hashing_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = _build_pool()
+        return _pool
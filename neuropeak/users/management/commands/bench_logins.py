@@ -0,0 +1,130 @@
+import importlib.util
+import json
+import threading
+import time
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from core.benchmarks import throwaway_database
+from core.utils import percentile, usable_cores
+from users.hashing import HashingPoolFull
+
+MODES = {
+    'direct': 'django.contrib.auth.backends.ModelBackend',
+    'pooled': 'users.backends.PooledModelBackend',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent login throughput (password check plus token issue) for "
+        "each password hasher, verifying on the request thread or on the hashing pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hashers', nargs='+', default=['pbkdf2', 'scrypt'],
+            choices=sorted(settings.PASSWORD_HASHER_CHOICES),
+        )
+        parser.add_argument('--modes', nargs='+', default=['direct', 'pooled'], choices=sorted(MODES))
+        parser.add_argument('--threads', type=int, default=8, help="Concurrent clients.")
+        parser.add_argument('--logins', type=int, default=64, help="Logins per hasher and mode.")
+        parser.add_argument('--json', action='store_true', help="Print the results as a JSON list.")
+
+    def handle(self, *args, **options):
+        results = []
+        with throwaway_database():
+            for hasher in options['hashers']:
+                if hasher == 'argon2' and importlib.util.find_spec('argon2') is None:
+                    self.stderr.write("argon2: skipped, argon2-cffi is not installed")
+                    continue
+                for mode in options['modes']:
+                    results.append(self.run_benchmark(hasher, mode, options['threads'], options['logins']))
+        if not results:
+            raise CommandError("No hasher could be benchmarked.")
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(
+            f"{'hasher':<8} {'mode':<7} {'threads':>7} {'ok':>5} {'429':>5} {'failed':>6} "
+            f"{'logins/s':>9} {'per core':>9} {'p50 ms':>8} {'p99 ms':>8}"
+        )
+        for r in results:
+            self.stdout.write(
+                f"{r['hasher']:<8} {r['mode']:<7} {r['threads']:>7} {r['ok']:>5} {r['throttled']:>5} {r['failed']:>6} "
+                f"{r['throughput']:>9.1f} {r['per_core']:>9.1f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f}"
+            )
+
+    def run_benchmark(self, hasher, mode, threads, logins):
+        from users.models import User
+        from users.serializers import CustomTokenObtainPairSerializer
+
+        preferred = settings.PASSWORD_HASHER_CHOICES[hasher]
+        hashers = [preferred] + [path for path in settings.PASSWORD_HASHERS if path != preferred]
+        with override_settings(PASSWORD_HASHERS=hashers, AUTHENTICATION_BACKENDS=[MODES[mode]]):
+            # One hash shared by every account; only verification is measured
+            encoded = make_password('bench-password')
+            prefix = f'bench-{hasher}-{mode}'
+            User.objects.bulk_create([
+                User(email=f'{prefix}-{i}@example.com', password=encoded, user_type=User.UserType.STUDENT)
+                for i in range(threads)
+            ])
+
+            samples = []
+            throttled = [0]
+            failed = [0]
+            lock = threading.Lock()
+            barrier = threading.Barrier(threads + 1)
+
+            def client(index, count):
+                email = f'{prefix}-{index}@example.com'
+                try:
+                    barrier.wait()
+                    for _ in range(count):
+                        started = time.perf_counter()
+                        try:
+                            user = authenticate(email=email, password='bench-password')
+                        except HashingPoolFull:
+                            with lock:
+                                throttled[0] += 1
+                            continue
+                        if user is None:
+                            with lock:
+                                failed[0] += 1
+                            continue
+                        str(CustomTokenObtainPairSerializer.get_token(user).access_token)
+                        with lock:
+                            samples.append(time.perf_counter() - started)
+                finally:
+                    connection.close()
+
+            workers = [
+                threading.Thread(target=client, args=(i, logins // threads + (i < logins % threads)))
+                for i in range(threads)
+            ]
+            for worker in workers:
+                worker.start()
+            barrier.wait()
+            started = time.perf_counter()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - started
+
+        throughput = len(samples) / elapsed if elapsed else 0.0
+        return {
+            'hasher': hasher,
+            'mode': mode,
+            'threads': threads,
+            'ok': len(samples),
+            'throttled': throttled[0],
+            'failed': failed[0],
+            'seconds': elapsed,
+            'throughput': throughput,
+            'per_core': throughput / usable_cores(),
+            'p50_ms': (percentile(samples, 0.50) or 0) * 1000,
+            'p99_ms': (percentile(samples, 0.99) or 0) * 1000,
+        }
@@ -0,0 +1,32 @@
+import io
+import json
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from users.roster import format_from_name, import_roster
+
+
+class Command(BaseCommand):
+    help = "Bulk-import users and their lecturer/student profiles from a CSV or JSONL roster ('-' reads stdin)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='file_format', choices=['csv', 'jsonl', 'ndjson'],
+                            help="Defaults to the file extension.")
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, help="Password hashing processes; defaults to the CPU count.")
+
+    def handle(self, *args, **options):
+        file_format = options['file_format'] or format_from_name(options['path'])
+        if not file_format:
+            raise CommandError("Cannot tell the roster format; pass --format.")
+
+        if options['path'] == '-':
+            stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig')
+        else:
+            stream = open(options['path'], encoding='utf-8-sig', newline='')
+        with stream:
+            report = import_roster(stream, file_format, chunk_size=options['chunk_size'], workers=options['workers'])
+
+        for error in report.errors:
+            self.stderr.write(json.dumps(error))
+        self.stdout.write(self.style.SUCCESS(f"Created {report.created} users; {len(report.errors)} rows failed."))
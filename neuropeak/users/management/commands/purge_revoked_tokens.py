@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from users.blacklist import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete revoked refresh tokens that have expired. Run periodically, e.g. hourly from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        deleted = purge_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired revoked tokens."))
@@ -60,6 +60,12 @@ class User(AbstractUser, PermissionsMixin):
     
     objects = UserManager()
 
+    class Meta(AbstractUser.Meta):
+        swappable = 'AUTH_USER_MODEL'
+        indexes = [
+            models.Index(fields=['user_type'], name='user_type_idx'),
+        ]
+
     # Add these to resolve the clashes
     groups = models.ManyToManyField(
         'auth.Group',
@@ -164,4 +170,28 @@ def create_user_profile(sender, instance, created, **kwargs):
                 # student_id=instance.student_id,
                 program=instance.program or '',
                 year_of_study=instance.year_of_study or 1
-            )
\ No newline at end of file
+            )
+
+class RevokedToken(models.Model):
+    """
+    A revoked refresh token. Rows are bucketed by the hour the token expires
+    in, so expired entries can be purged a whole bucket at a time; `id`
+    gives processes a cheap cursor for syncing their in-memory filters.
+    """
+    BUCKET_SECONDS = 3600
+
+    jti = models.CharField(max_length=64, unique=True)
+    expires_bucket = models.PositiveIntegerField(db_index=True)
+
+    @classmethod
+    def bucket_for(cls, exp):
+        # Tokens in bucket b all expire before b * BUCKET_SECONDS
+        return int(exp) // cls.BUCKET_SECONDS + 1
+
+    @classmethod
+    def expired_bucket(cls, now):
+        """The newest bucket whose tokens have all expired at `now`."""
+        return int(now) // cls.BUCKET_SECONDS
+
+    def __str__(self):
+        return self.jti
@@ -0,0 +1,193 @@
+"""
+Bulk roster import for CSV or JSONL streams.
+
+Rows are read lazily and processed in chunks: passwords are hashed in a
+process pool, then each chunk's users and their lecturer/student profiles
+are inserted with bulk_create inside one transaction. Invalid rows are
+reported with their line number and skipped; they never abort the import.
+"""
+import csv
+import json
+import os
+from itertools import islice
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from .hashing import hash_password, init_worker
+from .models import LecturerProfile, StudentProfile, User
+
+FIELDS = ['email', 'password', 'user_type', 'first_name', 'last_name',
+          'department', 'specialization', 'bio', 'program', 'year_of_study']
+
+
+class RosterReport:
+    def __init__(self):
+        self.created = 0
+        self.errors = []  # {'line': ..., 'error': ...}
+
+    def error(self, line, message):
+        self.errors.append({'line': line, 'error': message})
+
+    def as_dict(self):
+        return {'created': self.created, 'failed': len(self.errors), 'errors': self.errors}
+
+
+def read_rows(stream, file_format):
+    """Yield (line_number, row dict) from a text stream of CSV or JSONL."""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif file_format in ('jsonl', 'ndjson'):
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else {'__invalid__': 'Line is not a JSON object.'}
+    else:
+        raise ValueError(f"Unsupported roster format: {file_format}")
+
+
+def format_from_name(name):
+    extension = os.path.splitext(name or '')[1].lstrip('.').lower()
+    return extension if extension in ('csv', 'jsonl', 'ndjson') else None
+
+
+def clean_row(row):
+    """Validate one row and return keyword arguments for User, or raise ValidationError."""
+    if '__invalid__' in row:
+        raise ValidationError(row['__invalid__'])
+    data = {}
+    for field in FIELDS:
+        value = row.get(field)
+        data[field] = value.strip() if isinstance(value, str) else value
+
+    email = User.objects.normalize_email(data['email'] or '')
+    validate_email(email)
+    data['email'] = email
+
+    user_type = (data['user_type'] or User.UserType.STUDENT).upper()
+    if user_type not in (User.UserType.STUDENT, User.UserType.LECTURER):
+        raise ValidationError(f"Unsupported user_type: {user_type}")
+    data['user_type'] = user_type
+    if user_type == User.UserType.LECTURER and not data['department']:
+        raise ValidationError("Department is required for lecturers")
+
+    if data['year_of_study'] not in (None, ''):
+        try:
+            data['year_of_study'] = int(data['year_of_study'])
+        except (TypeError, ValueError):
+            raise ValidationError("year_of_study must be an integer")
+    else:
+        data['year_of_study'] = None
+
+    data = {key: value for key, value in data.items() if value not in (None, '')}
+    # Lengths and ranges too: SQLite would store an overlong value, other
+    # databases reject it and with it the whole chunk's bulk insert
+    for field in data.keys() - {'password'}:
+        try:
+            User._meta.get_field(field).clean(data[field], None)
+        except ValidationError as exc:
+            raise ValidationError([f"{field}: {message}" for message in exc.messages])
+    return data
+
+
+def _build_profiles(users):
+    lecturers, students = [], []
+    for user in users:
+        if user.user_type == User.UserType.LECTURER:
+            lecturers.append(LecturerProfile(
+                user=user,
+                department=user.department or '',
+                specialization=user.specialization or '',
+                bio=user.bio or ''
+            ))
+        elif user.user_type == User.UserType.STUDENT:
+            students.append(StudentProfile(
+                user=user,
+                program=user.program or '',
+                year_of_study=user.year_of_study or 1
+            ))
+    return lecturers, students
+
+
+def _insert(users):
+    """Insert users and their profiles; bulk_create skips the save signals, so mirror them here."""
+    for user in users:
+        user.clean_user_type_fields()
+    User.objects.bulk_create(users)
+    lecturers, students = _build_profiles(users)
+    LecturerProfile.objects.bulk_create(lecturers)
+    StudentProfile.objects.bulk_create(students)
+
+
+def _import_chunk(chunk, pool, report):
+    valid = []
+    for line, row in chunk:
+        try:
+            valid.append((line, clean_row(row)))
+        except ValidationError as exc:
+            report.error(line, "; ".join(exc.messages))
+
+    # One query per chunk to find emails that are already taken
+    seen = set(User.objects.filter(email__in=[data['email'] for _, data in valid]).values_list('email', flat=True))
+    unique = []
+    for line, data in valid:
+        if data['email'] in seen:
+            report.error(line, f"A user with email {data['email']} already exists.")
+            continue
+        seen.add(data['email'])
+        unique.append((line, data))
+    if not unique:
+        return
+
+    passwords = [data.pop('password', None) for _, data in unique]
+    hashes = pool.map(hash_password, passwords, chunksize=16) if pool else map(hash_password, passwords)
+    users = [(line, User(password=hashed, **data)) for (line, data), hashed in zip(unique, hashes)]
+
+    try:
+        with transaction.atomic():
+            _insert([user for _, user in users])
+        report.created += len(users)
+    except IntegrityError:
+        # Lost a race with a concurrent insert; isolate the offending rows
+        for line, user in users:
+            user.pk = None
+            try:
+                with transaction.atomic():
+                    _insert([user])
+                report.created += 1
+            except IntegrityError as exc:
+                report.error(line, str(exc))
+
+
+def import_roster(stream, file_format, chunk_size=500, workers=None):
+    """Import every row of `stream`, returning a RosterReport."""
+    report = RosterReport()
+    rows = read_rows(stream, file_format)
+    workers = os.cpu_count() if workers is None else workers
+    pool = None
+    if workers > 1:
+        # Imported here so process startup, which loads this module with the URLconf, skips them
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Forking a process that already runs background threads can deadlock the children
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+        )
+    try:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            _import_chunk(chunk, pool, report)
+    finally:
+        if pool:
+            pool.shutdown()
+    return report
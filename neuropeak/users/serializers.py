@@ -1,7 +1,13 @@
 from rest_framework import serializers
 # from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.serializers import (TokenObtainPairSerializer, TokenRefreshSerializer)
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.serializers import (TokenObtainPairSerializer, TokenObtainSerializer, TokenRefreshSerializer)
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import Throttled
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .authentication import last_login_recorder, resolve_user, set_user_claims
+from .blacklist import token_blacklist
+from .hashing import HashingPoolFull
 from .models import LecturerProfile, StudentProfile, User
 
 # User = get_user_model()
@@ -9,30 +15,58 @@ from .models import LecturerProfile, StudentProfile, User
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
-        token = super().get_token(user)
-        token['email'] = user.email
-        token['user_type'] = user.user_type
-        return token
+        # These claims let CachedJWTAuthentication skip loading the user
+        return set_user_claims(super().get_token(user), user)
 
     def validate(self, attrs):
-        data = super().validate(attrs)
-        refresh = self.get_token(self.user)
-        
-        data['refresh'] = str(refresh)
-        data['access'] = str(refresh.access_token)
-        data['user'] = {
-            'id': self.user.id,
-            'email': self.user.email,
-            'user_type': self.user.user_type
+        try:
+            # Only authenticates self.user; the tokens are issued below
+            TokenObtainSerializer.validate(self, attrs)
+        except HashingPoolFull:
+            raise Throttled(wait=1, detail="Too many logins in progress.")
+        return self.issue(self.user)
+
+    @classmethod
+    def issue(cls, user):
+        """The response to a successful login: a new token pair and who it is for."""
+        refresh = cls.get_token(user)
+        last_login_recorder.record(user)
+        return {
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+            'user': {
+                'id': user.id,
+                'email': user.email,
+                'user_type': user.user_type
+            }
         }
-        return data
 
 class CustomTokenRefreshSerializer(TokenRefreshSerializer):
     def validate(self, attrs):
-        data = super().validate(attrs)
-        refresh = RefreshToken(attrs['refresh'])
-        user = User.objects.get(id=refresh.payload.get('user_id'))
-        
+        refresh = self.token_class(attrs['refresh'])
+        return self.rotate(refresh, resolve_user(refresh.payload, stateless=False))
+
+    def rotate(self, refresh, user):
+        """Check the token is still usable by `user`, then issue the new access (and refresh) token."""
+        if not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+
+        jti = refresh.payload[api_settings.JTI_CLAIM]
+        if token_blacklist.is_revoked(jti):
+            raise InvalidToken(_("Token is blacklisted"))
+
+        # The new tokens carry the user as stored now, not the claims of the old refresh token
+        set_user_claims(refresh, user)
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION and not token_blacklist.revoke(jti, refresh.payload['exp']):
+                # Lost a race with a concurrent refresh of the same token
+                raise InvalidToken(_("Token is blacklisted"))
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+
         data['user'] = {
             'id': user.id,
             'email': user.email,
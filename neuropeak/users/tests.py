@@ -1,3 +1,165 @@
-from django.test import TestCase
+import io
+import time
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import make_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from . import views
+from .async_views import token_obtain
+from .authentication import aresolve_user, user_cache
+from .blacklist import BloomFilter, TokenBlacklist, purge_expired
+from .hashing import hash_password, hashing_pool, verify_password
+from .models import RevokedToken, User
+from .roster import import_roster
+from .serializers import CustomTokenObtainPairSerializer, CustomTokenRefreshSerializer
 
-# Create your tests here.
+
+class TokenRefreshTests(TestCase):
+    """
+    A refresh reads the user from the cache or the database rather than the
+    refresh token's claims, and the tokens it issues carry the stored user.
+    """
+
+    def setUp(self):
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        self.user = User.objects.create_user('student@example.com', 'pw', user_type=User.UserType.STUDENT)
+        self.refresh = CustomTokenObtainPairSerializer.get_token(self.user)
+        # Deactivated elsewhere: no signal reaches this process's user cache
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+    def test_refresh_rejects_a_deactivated_user(self):
+        serializer = CustomTokenRefreshSerializer(data={'refresh': str(self.refresh)})
+        with self.assertRaises(AuthenticationFailed):
+            serializer.is_valid()
+
+    def test_async_refresh_reads_the_user(self):
+        with self.assertRaises(AuthenticationFailed):
+            async_to_sync(aresolve_user)(self.refresh.payload, stateless=False)
+
+    def test_refresh_reissues_the_stored_claims(self):
+        staff = User.objects.create_user('staff@example.com', 'pw', user_type=User.UserType.LECTURER, is_staff=True)
+        refresh = CustomTokenObtainPairSerializer.get_token(staff)
+        User.objects.filter(pk=staff.pk).update(is_staff=False)
+
+        client = APIClient()
+        response = client.post('/api/v1/test/token/refresh/', {'refresh': str(refresh)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        # As served by another process: the access token's claims are all there is to go on
+        user_cache.clear()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.json()["access"]}')
+        self.assertEqual(client.get('/api/v1/test/chatbot/cache-stats/').status_code, 403)
+
+
+class RosterImportTests(TestCase):
+    def test_upload_is_imported_in_the_request_process(self):
+        admin = User.objects.create_superuser('admin@example.com', 'pw')
+        client = APIClient()
+        client.force_authenticate(admin)
+        roster = SimpleUploadedFile('roster.csv', b'email,password,user_type\nnew@example.com,pw,STUDENT\n')
+        with mock.patch.object(views, 'import_roster', wraps=views.import_roster) as import_roster:
+            response = client.post('/api/v1/test/users/import/', {'file': roster})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(import_roster.call_args.kwargs['workers'], 1)
+        self.assertTrue(User.objects.filter(email='new@example.com').exists())
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        roster = io.StringIO(
+            'email,password,user_type,first_name,year_of_study\n'
+            'good1@example.com,pw,STUDENT,Ann,1\n'
+            f'long@example.com,pw,STUDENT,{"x" * 31},1\n'
+            f'{"x" * 250}@example.com,pw,STUDENT,Bob,1\n'
+            'negative@example.com,pw,STUDENT,Cy,-1\n'
+            'good2@example.com,pw,STUDENT,Dee,2\n'
+        )
+        report = import_roster(roster, 'csv', workers=1)
+        self.assertEqual(report.created, 2)
+        self.assertEqual([error['line'] for error in report.errors], [3, 4, 5])
+        self.assertTrue(report.errors[0]['error'].startswith('first_name: '))
+        self.assertEqual(
+            set(User.objects.values_list('email', flat=True)), {'good1@example.com', 'good2@example.com'}
+        )
+
+
+class TokenBlacklistTests(TestCase):
+    def setUp(self):
+        self.exp = time.time() + 3600
+
+    def test_revoked_after_rebuild(self):
+        blacklist = TokenBlacklist(capacity=2)
+        blacklist.sync()
+        for jti in ('a', 'b', 'c'):
+            blacklist.revoke(jti, self.exp)
+        # Past capacity: the next check starts a new filter from the table
+        self.assertGreater(blacklist.bloom.count, blacklist.capacity)
+        self.assertTrue(blacklist.is_revoked('a'))
+        self.assertEqual(blacklist.bloom.count, 3)
+        self.assertFalse(blacklist.revoke('a', self.exp))
+
+    def test_false_positive_is_checked_against_the_table(self):
+        blacklist = TokenBlacklist()
+        blacklist.sync()
+        with mock.patch.object(BloomFilter, '__contains__', return_value=True):
+            with self.assertNumQueries(2):  # the sync and the jti lookup
+                self.assertFalse(blacklist.is_revoked('not-revoked'))
+        with self.assertNumQueries(1):
+            self.assertFalse(blacklist.is_revoked('not-revoked'))
+
+    def test_purge_expired(self):
+        blacklist = TokenBlacklist()
+        blacklist.revoke('expired', time.time() - 2 * RevokedToken.BUCKET_SECONDS)
+        blacklist.revoke('live', self.exp)
+        self.assertEqual(purge_expired(batch_size=1), 1)
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['live'])
+
+    def test_new_process_loads_the_table(self):
+        TokenBlacklist().revoke('a', self.exp)
+        restarted = TokenBlacklist()
+        self.assertTrue(restarted.is_revoked('a'))
+        # Revoked by another process after this one built its filter
+        TokenBlacklist().revoke('b', self.exp)
+        self.assertTrue(restarted.is_revoked('b'))
+        self.assertFalse(restarted.is_revoked('c'))
+
+
+class LoginTests(TestCase):
+    """Passwords are verified on the hashing pool and outdated hashes upgraded on login."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('student@example.com', 'pw', user_type=User.UserType.STUDENT)
+        # As stored before the preferred hasher changed
+        User.objects.filter(pk=self.user.pk).update(password=make_password('pw', hasher='pbkdf2_sha1'))
+
+    def test_hashing(self):
+        encoded = hashing_pool().run(hash_password, 'secret')
+        self.assertEqual(verify_password('secret', encoded), (True, None))
+        self.assertEqual(verify_password('wrong', encoded), (False, None))
+        matches, upgraded = verify_password('pw', make_password('pw', hasher='pbkdf2_sha1'))
+        self.assertTrue(matches)
+        self.assertEqual(verify_password('pw', upgraded), (True, None))
+
+    def assertUpgraded(self):
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.password.startswith('pbkdf2_sha1$'))
+        self.assertTrue(self.user.check_password('pw'))
+
+    def test_login_rehashes(self):
+        client = APIClient()
+        self.assertEqual(client.post('/api/v1/test/token/', {'email': self.user.email, 'password': 'no'}).status_code, 401)
+        response = client.post('/api/v1/test/token/', {'email': self.user.email, 'password': 'pw'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['id'], self.user.pk)
+        self.assertUpgraded()
+
+    def test_async_login_rehashes(self):
+        def login(password):
+            request = RequestFactory().post(
+                '/api/v1/test/token/', {'email': self.user.email, 'password': password}, content_type='application/json')
+            return async_to_sync(token_obtain)(request)
+
+        self.assertEqual(login('no').status_code, 401)
+        self.assertEqual(login('pw').status_code, 200)
+        self.assertUpgraded()
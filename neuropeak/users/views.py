@@ -7,6 +7,10 @@ from rest_framework_simplejwt.views import (TokenObtainPairView, TokenRefreshVie
 from .models import LecturerProfile, StudentProfile
 from .serializers import (UserSerializer, LecturerProfileSerializer, StudentProfileSerializer, CustomTokenObtainPairSerializer, CustomTokenRefreshSerializer)
 from .models import User
+from apis.fastpath import FastListMixin
+from apis.fieldsets import SparseFieldsetMixin
+from .roster import format_from_name, import_roster
+import io
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
@@ -14,17 +18,37 @@ class CustomTokenObtainPairView(TokenObtainPairView):
 class CustomTokenRefreshView(TokenRefreshView):
     serializer_class = CustomTokenRefreshSerializer
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(FastListMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     
     def get_permissions(self):
         if self.action in ['create', 'register']:
             return [permissions.AllowAny()]
+        if self.action == 'import_roster':
+            return [permissions.IsAdminUser()]
         return [permissions.IsAuthenticated()]
 
-class LecturerProfileViewSet(viewsets.ModelViewSet):
-    queryset = LecturerProfile.objects.all()
+    @action(detail=False, methods=['post'])
+    def import_roster(self, request):
+        """
+        Bulk-create users from an uploaded CSV or JSONL roster in the `file`
+        field. Imported in this process; rosters large enough to want worker
+        processes go through `manage.py import_roster`.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"detail": "Upload the roster in the 'file' field."}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('file_format') or format_from_name(upload.name)
+        if file_format not in ('csv', 'jsonl', 'ndjson'):
+            return Response({"detail": "file_format must be csv or jsonl."}, status=status.HTTP_400_BAD_REQUEST)
+
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        report = import_roster(stream, file_format, workers=1)
+        return Response(report.as_dict(), status=status.HTTP_201_CREATED if report.created else status.HTTP_200_OK)
+
+class LecturerProfileViewSet(FastListMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
+    queryset = LecturerProfile.objects.select_related('user')
     serializer_class = LecturerProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -37,8 +61,8 @@ class LecturerProfileViewSet(viewsets.ModelViewSet):
         if self.request.user.user_type == User.UserType.LECTURER:
             serializer.save(user=self.request.user)
 
-class StudentProfileViewSet(viewsets.ModelViewSet):
-    queryset = StudentProfile.objects.all()
+class StudentProfileViewSet(FastListMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
+    queryset = StudentProfile.objects.select_related('user')
     serializer_class = StudentProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
 